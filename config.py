@@ -6,7 +6,23 @@ import os
 IMAGE_WIDTH = 1080
 IMAGE_HEIGHT = 1350
 
+# Export formats laid out from the same wrapped text in one pass
+# "size" is (width, height); "bottom_inset" keeps reference/watermark clear of the story UI
+# "teaser": only the first page is rendered (stories can't be swiped) - no "Swipe →" or
+# trailing "...", a "Tap to view" note instead when the hadith continues in the post
+# Formats as wide as the feed reuse its wrapped lines; only pagination and positions change
+EXPORT_FORMATS = {
+    "feed": {"size": (IMAGE_WIDTH, IMAGE_HEIGHT)},  # 4:5 - posted to the feed
+    "square": {"size": (1080, 1080)},  # 1:1
+    "story": {"size": (1080, 1920), "bottom_inset": 220, "teaser": True},  # 9:16 - shared to the story
+}
+# Formats generate_post() renders (feed is always included)
+# Override per run: python3 create_post.py --formats feed,story,square
+OUTPUT_FORMATS = ["feed", "story"]
+
 # Theme configurations
+# "bg_colors" may list 2 or more colors for a multi-stop vertical gradient (top to bottom)
+# Optional "bg_stops" sets each color's position (0.0-1.0), e.g. [0.0, 0.6, 1.0]
 THEMES = {
     "warm_beige": {
         "name": "Warm Beige",
@@ -84,6 +100,10 @@ FONTS = {
     }
 }
 
+# Max number of loaded fonts kept in memory (per process, shared by all themes)
+# Each (font type, size, bold) combination counts as one entry
+FONT_CACHE_SIZE = 64
+
 # Font file paths (download Product Sans if needed)
 FONT_PATHS = {
     "product_sans_regular": "fonts/ProductSans-Regular.ttf",
@@ -136,10 +156,23 @@ CONTENT_LEFT_MARGIN = 80  # Left margin for content (for left-aligned text)
 CONTENT_RIGHT_MARGIN = 80  # Right margin for content
 MAX_TEXT_WIDTH = IMAGE_WIDTH - CONTENT_LEFT_MARGIN - CONTENT_RIGHT_MARGIN
 
+# Carousel pagination
+MAX_CAROUSEL_SLIDES = 10  # Instagram limit - hadiths needing more slides are skipped
+PAGE_FILL_RATIO = 0.85  # Share of the available text height a slide may fill
+
+# Auto-fit: shrink the main text (within AUTO_FIT_FONT_SIZES) until the hadith fits
+# in AUTO_FIT_MAX_SLIDES feed slides - fewer uploads, fewer long hadiths skipped
+AUTO_FIT_FONT = False  # Or per run: python3 create_post.py --auto-fit / --fit-slides 1
+AUTO_FIT_MAX_SLIDES = MAX_CAROUSEL_SLIDES
+AUTO_FIT_FONT_SIZES = (40, 54)  # (smallest, largest) main text size in px
+
 # Aesthetic enhancements
 HEADING_LETTER_SPACING = 2  # Add letter spacing for modern look
 SOURCE_LETTER_SPACING = 1
 TEXT_SHADOW = False  # Set to True for subtle shadow effect
+TEXT_SHADOW_OFFSET = (2, 2)  # Shadow offset (x, y) in px
+TEXT_SHADOW_BLUR = 0  # Gaussian blur radius for a soft shadow (0 = crisp)
+TEXT_SHADOW_COLOR = (0, 0, 0, 30)  # RGBA - alpha is real (the shadow is composited, not drawn)
 
 # ============================================================================
 # TEXT HIGHLIGHTING - Emphasize religious terms in content
@@ -183,6 +216,84 @@ WATERMARK_OPACITY = 100  # 0-255, lower is more subtle
 USE_IMAGES = True  # Enabled with local nature images
 IMAGE_HEIGHT_RATIO = 0.25  # Image takes 25% of top height (reduced from 0.30 for more content space)
 IMAGE_OPACITY = 0.95  # Higher opacity to make images clearly visible
+IMAGE_FADE_HEIGHT = 60  # Height (px) of the soft fade at the bottom of the image
+IMAGE_FADE_CURVE = "linear"  # Options: "linear", "smooth", "ease_in", "ease_out"
+
+# Prepared overlay cache - resized/faded image strips stored on disk
+# Rebuilt automatically when an image or the IMAGE_* settings above change
+# Precompute all: python3 overlay_cache.py --warm
+USE_OVERLAY_CACHE = True
+OVERLAY_CACHE_DIR = ".cache/overlays"
+
+# ============================================================================
+# RENDERING PERFORMANCE
+# ============================================================================
+
+# Processes used to render carousel slides in parallel (1 = serial, opt-in)
+# Override per run: python3 create_post.py --jobs 4
+RENDER_WORKERS = 1
+
+# Rendered slide chrome (background + image + reference + watermark + swipe) kept per generator
+CHROME_LAYER_CACHE_SIZE = 8
+# Pre-rendered text sprites (reference, watermark, swipe, headings) kept per generator
+TEXT_SPRITE_CACHE_SIZE = 64
+# Body text words rasterized once as coverage masks and composited in any theme color
+# (per process, shared by all themes - pays off most for theme samples and batches)
+USE_WORD_SPRITES = True
+WORD_SPRITE_CACHE_MB = 32  # Least recently used words are evicted beyond this
+
+# Slide file encoding, done once at render time
+# "png" (lossless), "jpeg" (upload-ready - Instagram stores JPEG anyway) or "webp" (compact archive)
+# In-memory renders (python3 create_post.py --in-memory) are always JPEG
+# Override per run: python3 create_post.py --image-format jpeg
+OUTPUT_IMAGE_FORMAT = "png"
+JPEG_QUALITY = 95
+JPEG_PROGRESSIVE = True
+JPEG_SUBSAMPLING = "4:2:0"  # What Instagram serves anyway; "4:4:4" keeps colored text edges crisper
+WEBP_QUALITY = 90
+# Optional per-slide size limit in KB for JPEG/WebP (None = fixed quality)
+# The highest quality that fits (down to MIN_ENCODE_QUALITY) is found by bisection
+# Override per run: python3 create_post.py --max-kb 350
+SLIDE_BYTE_BUDGET_KB = None
+MIN_ENCODE_QUALITY = 60
+
+# Preview tier (python3 create_post.py --preview, python3 generate_hadith_post.py --preview)
+# Same layout and pagination as the full render, rasterized smaller with cheap resampling
+# and a quick baseline JPEG - for theme sampling and dry runs
+PREVIEW_SCALE = 0.5
+PREVIEW_JPEG_QUALITY = 80
+
+# Finished slide cache - re-runs, posting retries and theme samples reuse unchanged slides
+# Keyed by hadith, theme, every setting in this file, font files and the overlay image
+# Inspect / reset: python3 render_cache.py --stats | --clear
+USE_RENDER_CACHE = True
+RENDER_CACHE_DIR = ".cache/renders"
+RENDER_CACHE_MAX_MB = 200  # Least recently used slides are evicted beyond this
+
+# Layout index - exact slide/line count of every hadith, used by --prefer-short selection
+# Keyed by the theme-independent layout settings and font files; only new or edited
+# hadiths are re-measured. Overflow report: python3 layout_index.py --audit
+LAYOUT_INDEX_FILE = ".cache/layout_index.json"
+LAYOUT_INDEX_WORKERS = None  # Processes used to (re)build the index (None = all cores)
+
+# Pre-rendered post backlog: python3 create_post.py --prerender N renders the next N
+# scheduled posts ahead of time; --post then uploads the next ready one without rendering
+# (posts rendered under other settings, theme or fonts are re-rendered live)
+BACKLOG_DIR = ".cache/backlog"
+BACKLOG_WORKERS = None  # Processes used to pre-render (None = all cores)
+
+# Theme samples: python3 generate_hadith_post.py [--samples N] [--preview]
+# Each sample hadith is laid out once and rasterized in every theme, plus a contact
+# sheet comparing the themes side by side (first slide of each sample per row)
+THEME_SAMPLE_WORKERS = None  # Processes rasterizing the samples (None = all cores)
+CONTACT_SHEET_THUMB_WIDTH = 270  # Width of each slide on the contact sheet
+
+# Warm render daemon: python3 render_daemon.py --serve keeps the corpus, fonts, overlays and
+# generators loaded and renders requests from a local Unix socket (render_daemon.py --render ...).
+# It restarts itself, after in-flight renders finish, when this file changes
+RENDER_DAEMON_SOCKET = ".cache/render.sock"
+RENDER_DAEMON_MAX_JOBS = 2  # Renders running at once
+RENDER_DAEMON_MAX_QUEUE = 8  # Requests waiting beyond that; more are refused as busy
 
 # Local image paths - stored in repository (nature/Islamic patterns only)
 # ROOT FIX: No external downloads = no timeouts, no inappropriate content
@@ -1,8 +1,11 @@
 """
 Easy-to-use script for generating daily hadith posts
 """
-from generate_hadith_post import HadithPostGenerator
-from config import DEFAULT_THEME, USE_IMAGES
+from generate_hadith_post import HadithPostGenerator, POST_BACKLOG
+from config import (
+    DEFAULT_THEME, USE_IMAGES, RENDER_WORKERS, BACKLOG_WORKERS, EXPORT_FORMATS, OUTPUT_FORMATS, USE_RENDER_CACHE,
+    OUTPUT_IMAGE_FORMAT, SLIDE_BYTE_BUDGET_KB, AUTO_FIT_FONT, AUTO_FIT_MAX_SLIDES, AUTO_FIT_FONT_SIZES,
+)
 from hadith_data import get_sahih_hadiths, get_hadith_stats
 import sys
 import os
@@ -27,6 +30,18 @@ def main():
     prefer_short = '--prefer-short' in sys.argv or '--short' in sys.argv
     theme = DEFAULT_THEME
     specific_index = None
+    workers = RENDER_WORKERS
+    save_layout = '--layout-json' in sys.argv
+    in_memory = '--in-memory' in sys.argv
+    archive = '--no-archive' not in sys.argv
+    use_cache = USE_RENDER_CACHE and '--no-cache' not in sys.argv
+    preview = '--preview' in sys.argv
+    auto_fit = AUTO_FIT_FONT or '--auto-fit' in sys.argv
+    max_slides = AUTO_FIT_MAX_SLIDES
+    prerender_count = 0
+    image_format = OUTPUT_IMAGE_FORMAT
+    budget_kb = SLIDE_BYTE_BUDGET_KB
+    formats = list(OUTPUT_FORMATS)
     
     # Parse arguments
     i = 1
@@ -34,11 +49,38 @@ def main():
         arg = sys.argv[i]
         if arg in ['--post', '-p']:
             pass
-        elif arg in ['--prefer-short', '--short']:
+        elif arg in ['--prefer-short', '--short', '--layout-json', '--in-memory', '--no-archive', '--no-cache',
+                     '--preview', '--auto-fit']:
             pass  # Already handled
         elif arg == '--index' and i + 1 < len(sys.argv):
             specific_index = int(sys.argv[i + 1])
             i += 1
+        elif arg == '--jobs' and i + 1 < len(sys.argv):
+            workers = max(1, int(sys.argv[i + 1]))
+            i += 1
+        elif arg == '--formats' and i + 1 < len(sys.argv):
+            formats = [name.strip() for name in sys.argv[i + 1].split(',') if name.strip()]
+            unknown = [name for name in formats if name not in EXPORT_FORMATS]
+            if unknown:
+                print(f"❌ Unknown format(s): {', '.join(unknown)} (choose from {', '.join(EXPORT_FORMATS)})")
+                sys.exit(1)
+            i += 1
+        elif arg == '--image-format' and i + 1 < len(sys.argv):
+            image_format = sys.argv[i + 1].lower().replace('jpg', 'jpeg')
+            if image_format not in ['png', 'jpeg', 'webp']:
+                print(f"❌ Unknown image format: {sys.argv[i + 1]} (choose from png, jpeg, webp)")
+                sys.exit(1)
+            i += 1
+        elif arg == '--prerender' and i + 1 < len(sys.argv):
+            prerender_count = max(1, int(sys.argv[i + 1]))
+            i += 1
+        elif arg == '--fit-slides' and i + 1 < len(sys.argv):
+            auto_fit = True
+            max_slides = max(1, int(sys.argv[i + 1]))
+            i += 1
+        elif arg == '--max-kb' and i + 1 < len(sys.argv):
+            budget_kb = max(1, int(sys.argv[i + 1]))
+            i += 1
         elif arg == '--auto-post' and i + 1 < len(sys.argv):
             auto_post = sys.argv[i + 1].lower() in ['true', 'yes', '1']
             i += 1
@@ -49,6 +91,12 @@ def main():
     if prefer_short:
         print(f"📊 Short mode: Preferring hadiths that fit in <=10 slides")
     
+    if preview:
+        if auto_post or in_memory:
+            print("⚠️  --preview is a dry run - nothing will be posted")
+            auto_post = in_memory = False
+        print(f"👀 Preview: reduced-scale JPEGs, same slides and line breaks as the full render")
+    
     # Generate post
     generator = HadithPostGenerator(theme)
     
@@ -57,14 +105,73 @@ def main():
     print(f"📱 Auto-post: {'Yes' if auto_post else 'No'}")
     if specific_index is not None:
         print(f"📍 Using hadith index: {specific_index}")
+    if workers > 1:
+        print(f"⚡ Parallel rendering: {workers} processes")
+    if save_layout:
+        print(f"🧩 Saving slide layouts as JSON next to the images")
+    if in_memory:
+        print(f"🧠 In-memory rendering: slides go straight to the uploader as JPEG bytes"
+              f"{' (archived to output/)' if archive else ''}")
+        if not archive and not auto_post:
+            print("⚠️  --no-archive without --post keeps nothing - slides will be archived anyway")
+            archive = True
+    if auto_fit:
+        print(f"🔠 Auto-fit: main text {AUTO_FIT_FONT_SIZES[0]}-{AUTO_FIT_FONT_SIZES[1]}px to fit <= {max_slides} slide(s)")
+    if not use_cache:
+        print(f"♻️  Render cache: Disabled (rendering every slide)")
+    if image_format != 'png' and not in_memory:
+        print(f"🗜️  Encoding: {image_format.upper()}{f' (max {budget_kb} KB per slide)' if budget_kb else ''}")
+    print(f"🖼️  Formats: {', '.join(['feed'] + [name for name in formats if name != 'feed'])}")
     print()
     
-    filenames, index, hadith = generator.generate_post(
-        specific_index=specific_index,
-        prefer_short=prefer_short
-    )
+    if prerender_count:
+        items = generator.prerender_posts(
+            prerender_count,
+            prefer_short=prefer_short,
+            workers=workers if workers > 1 else BACKLOG_WORKERS,
+            formats=formats,
+            image_format=image_format,
+            budget_kb=budget_kb,
+            auto_fit=auto_fit,
+            max_slides=max_slides,
+            in_memory=in_memory
+        )
+        print(f"✅ Backlog ready: {len(items)} post(s) in {POST_BACKLOG.backlog_dir}")
+        for position, item in enumerate(items, 1):
+            print(f"   {position}. {item['unique_id']} ({len(item['files']['feed'])} slide(s))")
+        print("📱 The next --post runs upload these without rendering")
+        return
+    
+    # Scheduled posting: upload the next pre-rendered post if one is ready
+    backlog_item = None
+    if auto_post and not preview and specific_index is None:
+        taken = generator.take_backlog_post(formats, image_format, budget_kb, auto_fit, max_slides, in_memory)
+        if taken:
+            backlog_item, filenames, index, hadith = taken
+            in_memory = False
+        elif POST_BACKLOG.load():
+            print("📦 No pre-rendered post ready for this theme and config - rendering live")
+    
+    if backlog_item is None:
+        filenames, index, hadith = generator.generate_post(
+            specific_index=specific_index,
+            prefer_short=prefer_short,
+            workers=workers,
+            save_layout=save_layout,
+            formats=formats,
+            in_memory=in_memory,
+            archive=archive,
+            use_cache=use_cache,
+            image_format=image_format,
+            budget_kb=budget_kb,
+            preview=preview,
+            auto_fit=auto_fit,
+            max_slides=max_slides
+        )
     
-    if len(filenames) == 1:
+    if in_memory:
+        print(f"✅ Rendered {len(filenames)} slide(s) in memory ({sum(len(data) for data in filenames) // 1024} KB)")
+    elif len(filenames) == 1:
         print(f"✅ Generated: {filenames[0]}")
     else:
         print(f"✅ Generated {len(filenames)} slides:")
@@ -107,10 +214,14 @@ def main():
             
             for attempt in range(max_retries):
                 try:
-                    poster.post_image(filenames, caption, hashtags, share_to_story=True)
+                    story_files = generator.exports.get('story')
+                    poster.post_image(filenames, caption, hashtags, share_to_story=True,
+                                      story_path=story_files[0] if story_files else None)
 
                     # SUCCESS: Commit the database changes
                     generator.commit_posted_hadith()
+                    if backlog_item:
+                        POST_BACKLOG.remove(backlog_item)
 
                     print()
                     print("🎉 POSTED TO INSTAGRAM SUCCESSFULLY!")
@@ -180,7 +291,7 @@ def main():
         print()
 
         # For manual posting, ask user to confirm successful posting before committing
-        if specific_index is None:  # Only for non-sample posts
+        if specific_index is None and not preview:  # Only for non-sample posts
             print("🔄 DATABASE STATUS:")
             print("   📝 Hadith staged for posting (not yet committed to database)")
             print("   ✅ After successful Instagram posting, run:")
@@ -6,24 +6,495 @@ Creates beautiful, consistent Instagram posts with Sahih hadiths
 ✅ Dynamic image selection to prevent repetition
 """
 
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageFont, ImageFilter
+import io
 import json
+import math
 import os
 import random
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from datetime import datetime
 import textwrap
 from config import *
 from hadith_data import get_sahih_hadiths, validate_hadith_authenticity
+from layout_index import LayoutIndex
+from post_backlog import PostBacklog
+from overlay_cache import OverlayCache
+from render_cache import RenderCache
+from text_layout import (
+    ACCENT, ARABIC_SYMBOL, BRACKETED_SYMBOL, SYMBOL, SYMBOL_SPACING, append_text, get_measurer,
+    ScaledRunMeasurer, get_run_measurer, get_tokenizer, line_text, paginate_lines,
+)
+
+
+# GeezaPro is the best font for ﷺ symbol on macOS
+# Noto fonts are best for Linux/GitHub Actions
+# Priority order based on availability and rendering quality
+SYMBOL_FONT_PATHS = [
+    '/System/Library/Fonts/GeezaPro.ttc',  # PRIMARY - Best rendering (macOS)
+    '/System/Library/Fonts/Supplemental/GeezaPro.ttc',
+    '/System/Library/Fonts/Supplemental/Baghdad.ttc',
+    '/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf',  # Linux/GitHub Actions
+    '/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf',
+    '/usr/share/fonts/noto/NotoSansArabic-Regular.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',
+]
+
+# Clean system fonts used when Product Sans is missing
+FALLBACK_FONT_PATHS = [
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    '/System/Library/Fonts/SFNS.ttf',  # San Francisco (macOS)
+    '/System/Library/Fonts/Helvetica.ttc',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Linux
+    'Arial.ttf',
+]
+
+
+class FontRegistry:
+    """
+    Process-wide font cache shared by every HadithPostGenerator and theme
+
+    - Fonts are keyed by (font_type, size, bold) and evicted least-recently-used
+    - The symbol-capable font path is probed ONCE per process (not per ﷺ)
+    - Text font paths (Product Sans or system fallback) are resolved once per weight
+    """
+
+    def __init__(self, max_size=FONT_CACHE_SIZE):
+        self.max_size = max_size
+        self._fonts = OrderedDict()
+        self._lock = threading.Lock()
+        self._symbol_path = None
+        self._symbol_resolved = False
+        self._text_paths = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_font(self, font_type, size, bold=False):
+        """Return a cached font, loading it on first use"""
+        key = (font_type, size, bold)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+
+        font = self._load_font(font_type, size, bold)
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.max_size:
+                self._fonts.popitem(last=False)
+        return font
+
+    def resolve_symbol_font_path(self):
+        """Find the first installed font that actually renders ﷺ (cached for the process)"""
+        if self._symbol_resolved:
+            return self._symbol_path
+
+        for font_path in SYMBOL_FONT_PATHS:
+            if not os.path.exists(font_path):
+                continue
+
+            try:
+                font = ImageFont.truetype(font_path, FONTS['symbol']['size'])
+                # Verify font can render the symbol
+                bbox = font.getbbox('ﷺ')
+                if bbox[2] - bbox[0] > 0:  # Has actual width
+                    self._symbol_path = font_path
+                    break
+            except Exception:
+                continue
+
+        if self._symbol_path is None:
+            # Fallback warning (printed once per process)
+            print("⚠️  WARNING: No suitable Arabic font found for ﷺ symbol!")
+            print("   Symbol may render as box. Install GeezaPro font.")
+
+        self._symbol_resolved = True
+        return self._symbol_path
+
+    def resolve_text_font_path(self, bold=False):
+        """Product Sans if present, otherwise the first available system font (cached)"""
+        if bold in self._text_paths:
+            return self._text_paths[bold]
+
+        product_sans_path = FONT_PATHS['product_sans_bold'] if bold else FONT_PATHS['product_sans_regular']
+        candidates = [product_sans_path] + FALLBACK_FONT_PATHS
+
+        resolved = None
+        for font_path in candidates:
+            try:
+                if os.path.exists(font_path):
+                    ImageFont.truetype(font_path, 12)
+                    resolved = font_path
+                    break
+            except Exception:
+                continue
+
+        self._text_paths[bold] = resolved
+        return resolved
+
+    def _load_font(self, font_type, size, bold):
+        # Special handling for Arabic/symbol fonts ONLY for 'symbol' type
+        if font_type == 'symbol':
+            symbol_path = self.resolve_symbol_font_path()
+            if symbol_path:
+                return ImageFont.truetype(symbol_path, size)
+
+        # For all other font types (heading, main_text, source), use Product Sans
+        text_path = self.resolve_text_font_path(bold)
+        if text_path:
+            return ImageFont.truetype(text_path, size)
+
+        # Last resort
+        return ImageFont.load_default()
+
+    def clear(self):
+        """Drop all cached fonts and resolved paths (e.g. after installing fonts)"""
+        with self._lock:
+            self._fonts.clear()
+            self._symbol_path = None
+            self._symbol_resolved = False
+            self._text_paths = {}
+
+
+FONT_REGISTRY = FontRegistry()
+
+# Prepared overlay strips on disk (see overlay_cache.py)
+OVERLAY_CACHE = OverlayCache()
+
+# Process-wide cache of finished slides (see render_cache.py)
+RENDER_CACHE = RenderCache()
+
+# Slide counts of the whole corpus for selection (see layout_index.py)
+LAYOUT_INDEX = LayoutIndex()
+
+# Auto-fitted slide counts, one index per slide target (see layout_index_for)
+_FIT_LAYOUT_INDEXES = {}
+
+# Posts rendered ahead of time (see post_backlog.py)
+POST_BACKLOG = PostBacklog()
+
+# Finished gradient backgrounds keyed by (colors, stops, width, height)
+_GRADIENT_CACHE = {}
+
+
+def build_gradient(colors, width, height, stops=None):
+    """
+    Build a vertical multi-stop gradient without per-pixel Python work
+
+    Args:
+        colors: List of RGB tuples (2 or more), top to bottom
+        width, height: Output size
+        stops: Optional positions (0.0-1.0) for each color, evenly spaced if omitted
+
+    Only one color per row is computed in Python; the 1px column is then
+    stretched across the full width in a single resize.
+    """
+    if len(colors) == 1:
+        return Image.new('RGB', (width, height), tuple(colors[0]))
+    
+    if not stops:
+        stops = [i / (len(colors) - 1) for i in range(len(colors))]
+    
+    column = bytearray()
+    segment = 0
+    for y in range(height):
+        # Calculate interpolation factor
+        factor = y / height
+        while segment < len(stops) - 2 and factor > stops[segment + 1]:
+            segment += 1
+        
+        start, end = stops[segment], stops[segment + 1]
+        local = (factor - start) / (end - start) if end > start else 0.0
+        local = min(max(local, 0.0), 1.0)
+        color1, color2 = colors[segment], colors[segment + 1]
+        
+        # Interpolate between colors
+        column.extend(int(color1[c] * (1 - local) + color2[c] * local) for c in range(3))
+    
+    return Image.frombytes('RGB', (1, height), bytes(column)).resize((width, height), Image.Resampling.NEAREST)
+
+
+# Fade curves map progress through the fade (0 = top, 1 = bottom edge) to how much is faded out
+FADE_CURVES = {
+    'linear': lambda p: p,
+    'smooth': lambda p: p * p * (3 - 2 * p),
+    'ease_in': lambda p: p * p,
+    'ease_out': lambda p: 1 - (1 - p) * (1 - p),
+}
+
+
+@lru_cache(maxsize=16)
+def build_fade_mask(width, height, opacity=IMAGE_OPACITY, fade_height=IMAGE_FADE_HEIGHT, curve=IMAGE_FADE_CURVE):
+    """
+    Build the overlay alpha mask: uniform opacity with a gradient fade at the bottom
+
+    Computed once per (size, opacity, fade settings) and applied with a single
+    putalpha/multiply instead of per-pixel getpixel/putpixel calls.
+    """
+    fade_curve = FADE_CURVES.get(curve, FADE_CURVES['linear'])
+    fade_height = max(0, min(fade_height, height))
+    
+    column = bytearray([int(255 * opacity)]) * (height - fade_height)
+    for y in range(fade_height):
+        column.append(int(255 * opacity * (1 - fade_curve(y / fade_height))))
+    
+    return Image.frombytes('L', (1, height), bytes(column)).resize((width, height), Image.Resampling.NEAREST)
+
+
+class WordSprites:
+    """
+    Process-wide cache of body text words rasterized as L-mode coverage masks
+    
+    Keyed by (word, font file, size) - no color, so every theme shares them and
+    draws them with its own fill. Least recently used masks are evicted once the
+    cache holds more than max_bytes; hits, misses and evictions are counted.
+    """
+    
+    def __init__(self, max_bytes=WORD_SPRITE_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._sprites = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, word, font):
+        """(coverage mask, bbox offset) of word as ImageDraw.text() would draw it at (0, 0)"""
+        key = (word, getattr(font, 'path', None) or id(font), getattr(font, 'index', 0), font.size)
+        with self._lock:
+            sprite = self._sprites.get(key)
+            if sprite is not None:
+                self._sprites.move_to_end(key)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+        
+        left, top, right, bottom = font.getbbox(word)
+        mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), word, fill=255, font=font)
+        sprite = (mask, (left, top))
+        
+        with self._lock:
+            if key not in self._sprites:
+                self._sprites[key] = sprite
+                self.bytes += mask.width * mask.height
+                while self.bytes > self.max_bytes and len(self._sprites) > 1:
+                    _, (old_mask, _) = self._sprites.popitem(last=False)
+                    self.bytes -= old_mask.width * old_mask.height
+                    self.evictions += 1
+        return sprite
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'sprites': len(self._sprites),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+WORD_SPRITES = WordSprites()
+
+
+class ColorMasks:
+    """
+    Drop-in for ImageDraw.text() / bitmap() that draws each fill color's text into
+    its own L-mode coverage mask (tracking its ink box), so the text can be
+    composited with a shadow in one step
+    """
+    
+    def __init__(self, size):
+        self.size = size
+        self.masks = {}
+        self.boxes = {}
+        self._draws = {}
+    
+    def _draw(self, fill):
+        key = tuple(fill) if isinstance(fill, list) else fill
+        draw = self._draws.get(key)
+        if draw is None:
+            self.masks[key] = Image.new('L', self.size, 0)
+            draw = self._draws[key] = ImageDraw.Draw(self.masks[key])
+        return key, draw
+    
+    def _add_box(self, key, box):
+        if key in self.boxes:
+            old = self.boxes[key]
+            box = (min(old[0], box[0]), min(old[1], box[1]), max(old[2], box[2]), max(old[3], box[3]))
+        self.boxes[key] = box
+    
+    def bitmap(self, xy, bitmap, fill):
+        key, draw = self._draw(fill)
+        draw.bitmap(xy, bitmap, fill=255)
+        x, y = int(xy[0]), int(xy[1])
+        self._add_box(key, (x, y, x + bitmap.width, y + bitmap.height))
+    
+    def text(self, xy, text, fill, font):
+        key, draw = self._draw(fill)
+        draw.text(xy, text, fill=255, font=font)
+        
+        # Conservative box from the cached advance and the font metrics (font.getbbox would
+        # lay the text out again); the margin covers overhangs, marks and sub-pixel starts
+        ascent, descent = font.getmetrics()
+        margin = font.size // 4 + 1
+        x, y = int(xy[0]), int(xy[1])
+        self._add_box(key, (x - margin, y - margin, x + int(get_measurer(font).text_width(text)) + margin,
+                            y + ascent + descent + margin))
+
+
+# File extension for each slide encoding (see OUTPUT_IMAGE_FORMAT)
+IMAGE_EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}
+
+
+def job_image_format(job):
+    """Encoding of a slide job: its image_format, else JPEG in memory, else OUTPUT_IMAGE_FORMAT"""
+    return job.get('image_format') or ('jpeg' if job.get('in_memory') else OUTPUT_IMAGE_FORMAT)
+
+
+def image_filename(filename, image_format):
+    """filename with the extension of image_format (None stays None)"""
+    return os.path.splitext(filename)[0] + IMAGE_EXTENSIONS[image_format] if filename else filename
+
+
+def with_image_format(job):
+    """Copy of a slide job naming its encoding, filename extension to match the bytes"""
+    image_format = job_image_format(job)
+    return dict(job, image_format=image_format, filename=image_filename(job.get('filename'), image_format))
+
+
+def _encode(img, image_format, quality=None, fast=False):
+    buffer = io.BytesIO()
+    if image_format == 'jpeg' and fast:
+        img.save(buffer, 'JPEG', quality=quality)
+    elif image_format == 'jpeg':
+        img.save(buffer, 'JPEG', quality=quality, optimize=True,
+                 progressive=JPEG_PROGRESSIVE, subsampling=JPEG_SUBSAMPLING)
+    elif image_format == 'webp':
+        img.save(buffer, 'WEBP', quality=quality, method=4)
+    else:
+        img.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def encode_image(img, image_format="png", budget_kb=SLIDE_BYTE_BUDGET_KB, preview=False):
+    """
+    Encode a rendered slide for saving or uploading, returns the file bytes
+
+    JPEG/WebP use the configured quality; with budget_kb, the highest quality whose
+    file fits is found by bisection (a few encodes, not one per quality step).
+    PNG is lossless and ignores the budget. Previews are a quick baseline JPEG.
+    """
+    if preview:
+        return _encode(img, 'jpeg', PREVIEW_JPEG_QUALITY, fast=True)
+    if image_format not in ('jpeg', 'webp'):
+        return _encode(img, 'png')
+    
+    quality = JPEG_QUALITY if image_format == 'jpeg' else WEBP_QUALITY
+    data = _encode(img, image_format, quality)
+    if not budget_kb or len(data) <= budget_kb * 1024:
+        return data
+    
+    best = None
+    low, high = MIN_ENCODE_QUALITY, quality - 1
+    while low <= high:
+        mid = (low + high) // 2
+        candidate = _encode(img, image_format, mid)
+        if len(candidate) <= budget_kb * 1024:
+            best, low = candidate, mid + 1
+        else:
+            high = mid - 1
+    
+    if best is None:
+        best = _encode(img, image_format, MIN_ENCODE_QUALITY)
+        print(f"⚠️  Slide is {len(best) // 1024} KB at quality {MIN_ENCODE_QUALITY} (budget {budget_kb} KB)")
+    return best
+
+
+def scale_layout(layout, scale):
+    """
+    Copy of a display list with every position and font size scaled (preview tier)
+    Lines are not re-wrapped, so text breaks and slide counts match the full render
+    """
+    def scaled(item):
+        item = dict(item)
+        for key in ('x', 'y'):
+            if key in item:
+                item[key] = round(item[key] * scale)
+        if 'size' in item:
+            item['size'] = max(1, round(item['size'] * scale))
+        if item['type'] == 'image':
+            item['scale'] = scale
+        return item
+    
+    result = dict(layout, width=round(layout['width'] * scale), height=round(layout['height'] * scale),
+                  chrome=[scaled(item) for item in layout['chrome']],
+                  content=[scaled(item) for item in layout['content']])
+    if layout.get('shadow'):
+        shadow = layout['shadow']
+        result['shadow'] = dict(shadow, offset=[round(v * scale) for v in shadow['offset']],
+                                blur=shadow.get('blur', 0) * scale)
+    return result
+
+
+def make_preview_job(job):
+    """Preview variant of a slide job: same layout at PREVIEW_SCALE, quick JPEG, *_preview.jpg"""
+    base = os.path.splitext(job['filename'])[0] if job.get('filename') else None
+    return dict(job, preview_scale=PREVIEW_SCALE, image_format='jpeg', budget_kb=None, in_memory=False,
+                filename=f"{base}_preview.jpg" if base else None)
+
+
+def make_theme_job(job, theme_name):
+    """
+    Slide job rasterized in another theme (display lists only name color roles,
+    so the layout is shared); the theme name goes into the filename
+    """
+    root, ext = os.path.splitext(job['filename'])
+    suffix = f"_slide{job['slide_num']}" if job['kind'] == 'carousel' else ''
+    root = root[:len(root) - len(suffix)]
+    return dict(job, theme_name=theme_name, filename=f"{root}_{theme_name}{suffix}{ext}")
 
 
 class HadithPostGenerator:
-    def __init__(self, theme_name=DEFAULT_THEME):
-        self.theme = THEMES.get(theme_name, THEMES[DEFAULT_THEME])
+    def __init__(self, theme_name=DEFAULT_THEME, load_data=True):
+        """
+        Args:
+            theme_name: Key in THEMES (falls back to DEFAULT_THEME)
+            load_data: Load the hadith corpus and tracking files. Render-only
+                       generators (e.g. pool workers) skip this.
+        """
+        self.theme_name = theme_name if theme_name in THEMES else DEFAULT_THEME
+        self.theme = THEMES[self.theme_name]
         self.posted_file = "posted_hadiths.json"
         self.image_usage_file = "image_usage.json"
-        self.hadiths = get_sahih_hadiths()  # Only use validated Sahih hadiths
-        self.load_posted_hadiths()
-        self.load_image_usage()
+        self._chrome_layers = OrderedDict()  # Rendered display list chrome (see rasterize_layout)
+        self._text_sprites = OrderedDict()  # Rendered chrome/heading text (see text_sprite)
+        self._text_area_heights = {}  # Canvas height -> text area height (see text_area_height)
+        self.exports = {}  # {format: [files or JPEG bytes]} from the last generate_post()
+        self.skipped_ids = set()  # Hadiths passed over this run (too many slides)
+        
+        if load_data:
+            self.hadiths = get_sahih_hadiths()  # Only use validated Sahih hadiths
+            self.load_posted_hadiths()
+            self.load_image_usage()
+        else:
+            self.hadiths = []
+            self.posted_ids = set()
+            self.posted_metadata = {}
+            self.image_usage = {}
         
     def load_posted_hadiths(self):
         """Load list of already posted hadith unique IDs to avoid repeats"""
@@ -127,6 +598,11 @@ class HadithPostGenerator:
         with open(self.image_usage_file, 'w') as f:
             json.dump(self.image_usage, f)
     
+    def record_image_usage(self, image_path):
+        """Count one use of an image and save the tracking file"""
+        self.image_usage[image_path] = self.image_usage.get(image_path, 0) + 1
+        self.save_image_usage()
+    
     def save_posted_hadith(self, hadith: dict):
         """
         Stage hadith as posted using its unique base_id (doesn't save to disk yet)
@@ -204,7 +680,7 @@ class HadithPostGenerator:
 
         print(f"🔄 Rolled back changes for {base_id}")
     
-    def get_next_hadith(self, prefer_short=False):
+    def get_next_hadith(self, prefer_short=False, auto_fit=AUTO_FIT_FONT, max_slides=AUTO_FIT_MAX_SLIDES):
         """
         Get next unposted Sahih hadith with rotation across books
         
@@ -213,6 +689,8 @@ class HadithPostGenerator:
         
         Args:
             prefer_short: If True, prefer hadiths that will fit in <=10 slides (Instagram limit)
+            auto_fit, max_slides: The run's auto-fit option - prefer_short judges the slide
+                count the hadith will actually be rendered with
         
         Returns:
             Tuple of (hadith_dict, index) or (None, None) if all posted
@@ -221,7 +699,7 @@ class HadithPostGenerator:
         available = []
         for i, hadith in enumerate(self.hadiths):
             base_id = hadith['base_id']
-            if base_id not in self.posted_ids:
+            if base_id not in self.posted_ids and base_id not in self.skipped_ids:
                 available.append((i, hadith))
         
         if not available:
@@ -237,12 +715,13 @@ class HadithPostGenerator:
             collection = base_id.split(':')[0]
             posted_books[collection] = posted_books.get(collection, 0) + 1
         
-        # If prefer_short, filter to hadiths <=800 chars (roughly 10 slides max)
+        # If prefer_short, keep hadiths the layout index says fit the carousel limit
         if prefer_short:
-            short_available = [(i, h) for i, h in available if len(h['text']) <= 800]
+            index = build_layout_index(self.hadiths, auto_fit=auto_fit, max_slides=max_slides)
+            short_available = [(i, h) for i, h in available if index.get(h)['fits']]
             if short_available:
                 available = short_available
-                print(f"📊 Filtering to {len(available)} short hadiths (<=10 slides)")
+                print(f"📊 Filtering to {len(available)} hadiths that fit in <={MAX_CAROUSEL_SLIDES} slides")
         
         # Pick from least-posted book for variety, with randomness
         import random
@@ -278,32 +757,28 @@ class HadithPostGenerator:
         if not validate_hadith_authenticity(hadith):
             print(f"⚠️  WARNING: Hadith {hadith['unique_id']} failed validation, skipping...")
             self.save_posted_hadith(hadith)
-            return self.get_next_hadith(prefer_short=prefer_short)
+            return self.get_next_hadith(prefer_short, auto_fit, max_slides)
         
         return hadith, index
     
-    def create_gradient_background(self):
-        """Create a smooth gradient background"""
-        img = Image.new('RGB', (IMAGE_WIDTH, IMAGE_HEIGHT))
-        draw = ImageDraw.Draw(img)
-        
-        # Parse colors
-        color1 = self.hex_to_rgb(self.theme['bg_colors'][0])
-        color2 = self.hex_to_rgb(self.theme['bg_colors'][1])
-        
-        # Create vertical gradient
-        for y in range(IMAGE_HEIGHT):
-            # Calculate interpolation factor
-            factor = y / IMAGE_HEIGHT
-            
-            # Interpolate between colors
-            r = int(color1[0] * (1 - factor) + color2[0] * factor)
-            g = int(color1[1] * (1 - factor) + color2[1] * factor)
-            b = int(color1[2] * (1 - factor) + color2[2] * factor)
-            
-            draw.line([(0, y), (IMAGE_WIDTH, y)], fill=(r, g, b))
+    def create_gradient_background(self, width=IMAGE_WIDTH, height=IMAGE_HEIGHT):
+        """
+        Create a smooth gradient background
+        Built once per (theme colors, size) and copied for every later slide
+        """
+        colors = tuple(self.theme['bg_colors'])
+        stops = tuple(self.theme.get('bg_stops') or ())
+        key = (colors, stops, width, height)
+        
+        background = _GRADIENT_CACHE.get(key)
+        if background is None:
+            background = build_gradient(
+                [self.hex_to_rgb(color) for color in colors],
+                width, height, stops or None
+            )
+            _GRADIENT_CACHE[key] = background
         
-        return img
+        return background.copy()
     
     def hex_to_rgb(self, hex_color):
         """Convert hex color to RGB tuple"""
@@ -314,70 +789,12 @@ class HadithPostGenerator:
         """
         Get font with proper Unicode support for Arabic symbols
         ROOT FIX: GeezaPro for symbols, Product Sans for text
+        Fonts come from the process-wide FONT_REGISTRY (loaded once, shared by all generators)
         """
         if size is None:
             size = FONTS[font_type]['size']
         
-        # Special handling for Arabic/symbol fonts ONLY for 'symbol' type
-        if font_type == 'symbol':
-            # GeezaPro is the best font for ﷺ symbol on macOS
-            # Noto fonts are best for Linux/GitHub Actions
-            # Priority order based on availability and rendering quality
-            unicode_fonts = [
-                '/System/Library/Fonts/GeezaPro.ttc',  # PRIMARY - Best rendering (macOS)
-                '/System/Library/Fonts/Supplemental/GeezaPro.ttc',
-                '/System/Library/Fonts/Supplemental/Baghdad.ttc',
-                '/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf',  # Linux/GitHub Actions
-                '/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf',
-                '/usr/share/fonts/noto/NotoSansArabic-Regular.ttf',
-                '/Library/Fonts/Arial Unicode.ttf',
-                '/System/Library/Fonts/Supplemental/Arial Unicode.ttf',
-            ]
-            
-            for font_path in unicode_fonts:
-                if not os.path.exists(font_path):
-                    continue
-                    
-                try:
-                    font = ImageFont.truetype(font_path, size)
-                    # Verify font can render the symbol
-                    bbox = font.getbbox('ﷺ')
-                    if bbox[2] - bbox[0] > 0:  # Has actual width
-                        font_name = os.path.basename(font_path)
-                        return font
-                except Exception as e:
-                    continue
-            
-            # Fallback warning
-            print("⚠️  WARNING: No suitable Arabic font found for ﷺ symbol!")
-            print("   Symbol may render as box. Install GeezaPro font.")
-            
-        # For all other font types (heading, main_text, source), use Product Sans
-        product_sans_path = FONT_PATHS['product_sans_bold'] if bold else FONT_PATHS['product_sans_regular']
-        try:
-            if os.path.exists(product_sans_path):
-                return ImageFont.truetype(product_sans_path, size)
-        except:
-            pass
-        
-        # Fallback to clean system fonts
-        font_options = [
-            '/System/Library/Fonts/Supplemental/Arial.ttf',
-            '/System/Library/Fonts/SFNS.ttf',  # San Francisco (macOS)
-            '/System/Library/Fonts/Helvetica.ttc',
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Linux
-            'Arial.ttf',
-        ]
-        
-        for font_path in font_options:
-            try:
-                if os.path.exists(font_path):
-                    return ImageFont.truetype(font_path, size)
-            except:
-                continue
-        
-        # Last resort
-        return ImageFont.load_default()
+        return FONT_REGISTRY.get_font(font_type, int(size), bold)
     
     def draw_text_with_symbol(self, draw, x, y, text_before, symbol, text_after, font, symbol_font, color, symbol_color=None):
         """Draw text with special symbol handling for proper baseline alignment"""
@@ -416,30 +833,35 @@ class HadithPostGenerator:
         return (text_bbox[2] - text_bbox[0]) + (symbol_bbox[2] - symbol_bbox[0]) + (after_bbox[2] - after_bbox[0]) + 4
     
     def wrap_text(self, text, font, max_width):
-        """Wrap text to fit within max width"""
-        lines = []
-        paragraphs = text.split('\n')
-        
-        for paragraph in paragraphs:
-            words = paragraph.split()
-            current_line = []
-            
-            for word in words:
-                test_line = ' '.join(current_line + [word])
-                bbox = font.getbbox(test_line)
-                width = bbox[2] - bbox[0]
-                
-                if width <= max_width:
-                    current_line.append(word)
-                else:
-                    if current_line:
-                        lines.append(' '.join(current_line))
-                    current_line = [word]
-            
-            if current_line:
-                lines.append(' '.join(current_line))
+        """Wrap text to fit within max width (linear time, cached word widths)"""
+        return [line for line, _ in get_measurer(font).wrap(text, max_width, measure=False)]
+    
+    def wrap_text_measured(self, text, font, max_width):
+        """Wrap text and return (line, exact width) pairs so callers don't re-measure lines"""
+        return get_measurer(font).wrap(text, max_width)
+    
+    def tokenize_text(self, text):
+        """Split text into styled runs (highlighted terms, ﷺ, regular text) - see text_layout"""
+        highlight_terms = HIGHLIGHT_TERMS if 'HIGHLIGHT_TERMS' in globals() else []
+        return get_tokenizer(tuple(highlight_terms), HIGHLIGHT_RELIGIOUS_TERMS).tokenize(text)
+    
+    def get_run_measurer(self, main_font):
+        """Width measurement for styled runs drawn at main_font's size (see draw_text_runs)"""
+        size = int(main_font.size)
+        return get_run_measurer(
+            main_font,
+            self.get_font('main_text', size=size, bold=True),
+            self.get_font('symbol', size=size)
+        )
+    
+    def layout_text_lines(self, text, font, max_width):
+        """
+        Tokenize text once and wrap it by true rendered width (bold highlights included)
         
-        return lines
+        Returns:
+            List of (line, width) tuples, each line a list of (text, style) runs
+        """
+        return self.get_run_measurer(font).wrap(self.tokenize_text(text), max_width)
     
     def draw_text_with_arabic_symbols(self, draw, x, y, text, main_font, symbol_font, color):
         """
@@ -449,196 +871,117 @@ class HadithPostGenerator:
         - Uses GeezaPro font for ﷺ symbol, Product Sans for text
         - Configurable via HIGHLIGHT_RELIGIOUS_TERMS and HIGHLIGHT_TERMS in config
         """
+        self.draw_text_runs(draw, x, y, self.tokenize_text(text), main_font, symbol_font, color)
+    
+    def draw_text_runs(self, draw, x, y, runs, main_font, symbol_font, color):
+        """
+        Draw one line of styled runs (from tokenize_text / layout_text_lines)
+        Regular runs use color, highlighted runs the theme's accent color
+        """
         # Use NEW dedicated accent_color for religious terms (distinct and aesthetic!)
         accent_color = self.theme.get('accent_color', self.theme['heading_color'])
-        symbol = 'ﷺ'
-        
-        # Check if highlighting is enabled
-        if not HIGHLIGHT_RELIGIOUS_TERMS:
-            # No highlighting - just render with proper symbol font
-            if symbol not in text:
-                draw.text((x, y), text, fill=color, font=main_font)
-                return
-            
-            # Handle symbol without highlighting
-            parts = text.split(symbol)
-            current_x = x
-            for i, part in enumerate(parts):
-                if part:
-                    draw.text((current_x, y), part, fill=color, font=main_font)
-                    bbox = main_font.getbbox(part)
-                    current_x += bbox[2] - bbox[0]
-                
-                if i < len(parts) - 1:
-                    symbol_font_sized = self.get_font('symbol', size=int(main_font.size))
-                    text_bbox = main_font.getbbox('A')
-                    symbol_bbox = symbol_font_sized.getbbox(symbol)
-                    text_ascent = abs(text_bbox[1])
-                    symbol_ascent = abs(symbol_bbox[1])
-                    y_offset = text_ascent - symbol_ascent
-                    draw.text((current_x, y + y_offset), symbol, fill=color, font=symbol_font_sized)
-                    current_x += symbol_bbox[2] - symbol_bbox[0] + 2
-            return
-        
-        # Get highlight terms from config
-        highlight_terms = HIGHLIGHT_TERMS if 'HIGHLIGHT_TERMS' in globals() else []
-        
-        # Separate multi-word phrases and single words
-        highlight_phrases = [term for term in highlight_terms if ' ' in term]
-        highlight_words = [term for term in highlight_terms if ' ' not in term]
-        
+        # Without highlighting the symbol keeps the text color
+        symbol_color = accent_color if HIGHLIGHT_RELIGIOUS_TERMS else color
+        run_measurer = self.get_run_measurer(main_font)
         current_x = x
-        remaining_text = text
         
-        while remaining_text:
-            # Find the earliest occurrence of any highlight phrase, word, or symbol pattern
-            earliest_pos = len(remaining_text)
-            found_phrase = None
-            found_type = None  # 'phrase', 'word', or 'symbol'
-            
-            # Check for multi-word phrases FIRST (to avoid breaking them into single words)
-            for phrase in highlight_phrases:
-                pos = remaining_text.find(phrase)
-                if pos != -1 and pos < earliest_pos:
-                    earliest_pos = pos
-                    found_phrase = phrase
-                    found_type = 'phrase'
-            
-            # Check for (ﷺ) pattern - symbol with brackets
-            symbol_with_brackets = f"({symbol})"
-            pos = remaining_text.find(symbol_with_brackets)
-            if pos != -1 and pos < earliest_pos:
-                earliest_pos = pos
-                found_phrase = symbol_with_brackets
-                found_type = 'symbol_brackets'
-            
-            # Check for standalone symbol
-            pos = remaining_text.find(symbol)
-            if pos != -1 and pos < earliest_pos:
-                earliest_pos = pos
-                found_phrase = symbol
-                found_type = 'symbol'
-            
-            # Check for single highlight words (if no phrase/symbol found earlier)
-            if found_type is None or earliest_pos > 0:
-                for word in highlight_words:
-                    # Find word boundaries to avoid partial matches
-                    pos = 0
-                    while pos < len(remaining_text):
-                        pos = remaining_text.find(word, pos)
-                        if pos == -1:
-                            break
-                        
-                        # Check if it's a whole word (not part of another word)
-                        before_ok = pos == 0 or remaining_text[pos-1] in ' \n\t.,;:!?\'"'
-                        after_ok = (pos + len(word) >= len(remaining_text) or 
-                                   remaining_text[pos + len(word)] in ' \n\t.,;:!?\'"\'s')
-                        
-                        if before_ok and after_ok and pos < earliest_pos:
-                            earliest_pos = pos
-                            found_phrase = word
-                            found_type = 'word'
-                            break
-                        pos += 1
-            
-            # Draw text before the highlight
-            if earliest_pos > 0:
-                before_text = remaining_text[:earliest_pos]
-                draw.text((current_x, y), before_text, fill=color, font=main_font)
-                bbox = main_font.getbbox(before_text)
-                current_x += bbox[2] - bbox[0]
-            
-            # No more highlights found
-            if earliest_pos >= len(remaining_text):
-                break
-            
-            # Draw the highlighted phrase, word, or symbol
-            if found_type in ['phrase', 'word']:
+        for run_text, style in runs:
+            if style == ACCENT:
                 # Highlight phrase/word in accent color with bold font
                 bold_font = self.get_font('main_text', size=int(main_font.size), bold=True)
-                draw.text((current_x, y), found_phrase, fill=accent_color, font=bold_font)
-                bbox = bold_font.getbbox(found_phrase)
-                current_x += bbox[2] - bbox[0]
-                remaining_text = remaining_text[earliest_pos + len(found_phrase):]
+                self.draw_words(draw, (current_x, y), run_text, accent_color, bold_font)
+                current_x += run_measurer.run_width(run_text, style)
                 
-            elif found_type == 'symbol_brackets':
+            elif style == BRACKETED_SYMBOL:
                 # Highlight (ﷺ) with brackets in accent color with bold font
                 bold_font = self.get_font('main_text', size=int(main_font.size), bold=True)
+                bold_measurer = get_measurer(bold_font)
                 
                 # Draw opening bracket in bold
-                draw.text((current_x, y), "(", fill=accent_color, font=bold_font)
-                bracket_bbox = bold_font.getbbox("(")
-                current_x += bracket_bbox[2] - bracket_bbox[0]
+                self.draw_words(draw, (current_x, y), "(", accent_color, bold_font)
+                current_x += bold_measurer.text_width("(")
                 
                 # Draw symbol with proper font
                 symbol_font_sized = self.get_font('symbol', size=int(main_font.size))
                 text_bbox = bold_font.getbbox('A')
-                symbol_bbox = symbol_font_sized.getbbox(symbol)
-                text_ascent = abs(text_bbox[1])
-                symbol_ascent = abs(symbol_bbox[1])
-                y_offset = text_ascent - symbol_ascent
+                symbol_bbox = symbol_font_sized.getbbox(ARABIC_SYMBOL)
+                y_offset = abs(text_bbox[1]) - abs(symbol_bbox[1])
                 
-                draw.text((current_x, y + y_offset), symbol, fill=accent_color, font=symbol_font_sized)
+                self.draw_words(draw, (current_x, y + y_offset), ARABIC_SYMBOL, accent_color, symbol_font_sized)
                 current_x += symbol_bbox[2] - symbol_bbox[0]
                 
                 # Draw closing bracket in bold
-                draw.text((current_x, y), ")", fill=accent_color, font=bold_font)
-                bracket_bbox = bold_font.getbbox(")")
-                current_x += bracket_bbox[2] - bracket_bbox[0] + 2
+                self.draw_words(draw, (current_x, y), ")", accent_color, bold_font)
+                current_x += bold_measurer.text_width(")") + SYMBOL_SPACING
                 
-                remaining_text = remaining_text[earliest_pos + len(symbol_with_brackets):]
-                
-            elif found_type == 'symbol':
-                # Draw standalone symbol with proper font in accent color
+            elif style == SYMBOL:
+                # Draw standalone symbol with proper font, aligned to the text baseline
                 symbol_font_sized = self.get_font('symbol', size=int(main_font.size))
                 text_bbox = main_font.getbbox('A')
-                symbol_bbox = symbol_font_sized.getbbox(symbol)
-                text_ascent = abs(text_bbox[1])
-                symbol_ascent = abs(symbol_bbox[1])
-                y_offset = text_ascent - symbol_ascent
+                symbol_bbox = symbol_font_sized.getbbox(ARABIC_SYMBOL)
+                y_offset = abs(text_bbox[1]) - abs(symbol_bbox[1])
+                
+                self.draw_words(draw, (current_x, y + y_offset), ARABIC_SYMBOL, symbol_color, symbol_font_sized)
+                current_x += symbol_bbox[2] - symbol_bbox[0] + SYMBOL_SPACING
                 
-                draw.text((current_x, y + y_offset), symbol, fill=accent_color, font=symbol_font_sized)
-                current_x += symbol_bbox[2] - symbol_bbox[0] + 2
-                remaining_text = remaining_text[earliest_pos + len(symbol):]
+            else:
+                self.draw_words(draw, (current_x, y), run_text, color, main_font)
+                current_x += run_measurer.run_width(run_text, style)
+    
+    def draw_words(self, draw, xy, text, fill, font):
+        """
+        draw.text() for body text, word by word from WORD_SPRITES
+        
+        Each word is rasterized once per font and size, then composited with
+        draw.bitmap() (what draw.text() ends in) at its cached advance - hinted
+        advances are whole pixels, so the result matches drawing the whole run
+        """
+        if not USE_WORD_SPRITES:
+            draw.text(xy, text, fill=fill, font=font)
+            return
+        
+        x, y = xy
+        measurer = get_measurer(font)
+        for word in text.split(' '):
+            if word:
+                mask, (left, top) = WORD_SPRITES.get(word, font)
+                draw.bitmap((x + left, y + top), mask, fill=fill)
+                x += measurer.advance(word)
+            x += measurer.space_advance
     
     def get_text_width_with_symbols(self, text, main_font, symbol_font):
         """
         Calculate actual width of text including properly rendered symbols and highlighted phrases
-        This needs to match the rendering logic in draw_text_with_arabic_symbols
+        Measured from the same styled runs draw_text_with_arabic_symbols draws (bold highlights,
+        symbol font), so it matches the rendering exactly
         """
-        symbol = 'ﷺ'
-        
-        # Simple approximation: calculate width treating all text with main font
-        # and symbols with symbol font
-        total_width = 0
-        remaining = text
-        
-        while symbol in remaining:
-            parts = remaining.split(symbol, 1)
-            # Width of text before symbol
-            if parts[0]:
-                bbox = main_font.getbbox(parts[0])
-                total_width += bbox[2] - bbox[0]
-            
-            # Width of symbol
-            symbol_bbox = symbol_font.getbbox(symbol)
-            total_width += symbol_bbox[2] - symbol_bbox[0] + 2
-            
-            # Continue with rest
-            remaining = parts[1] if len(parts) > 1 else ""
-        
-        # Add remaining text
-        if remaining:
-            bbox = main_font.getbbox(remaining)
-            total_width += bbox[2] - bbox[0]
-        
-        return total_width
+        return self.get_run_measurer(main_font).line_width(self.tokenize_text(text))
     
-    def load_local_image(self, image_path):
-        """Load image from local filesystem - ROOT FIX: no timeouts, guaranteed halal"""
+    def load_local_image(self, image_path, cover_size=None):
+        """
+        Load image from local filesystem - ROOT FIX: no timeouts, guaranteed halal
+        
+        Args:
+            cover_size: Optional (width, height) the image will be resized to cover.
+                Large JPEGs are then decoded at the smallest DCT scale (1/2, 1/4, 1/8)
+                that still covers it, other formats box-reduced right after decoding,
+                so big photos cost little time and memory. The file is closed on return.
+        """
         try:
             if os.path.exists(image_path):
-                img = Image.open(image_path)
+                with Image.open(image_path) as img:
+                    if cover_size:
+                        scale = max(cover_size[0] / img.width, cover_size[1] / img.height)
+                        needed = (math.ceil(img.width * scale), math.ceil(img.height * scale))
+                        img.draft(img.mode, needed)  # JPEG only - no-op for other formats
+                    img.load()
+                if cover_size:
+                    factor = min(img.width // needed[0], img.height // needed[1])
+                    if factor >= 2:
+                        if img.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+                            # reduce() can't average palette, bilevel or 16-bit pixels
+                            img = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+                        img = img.reduce(factor)
                 return img
             else:
                 print(f"⚠️  Local image not found: {image_path}")
@@ -667,8 +1010,11 @@ class HadithPostGenerator:
         
         return all_images
     
-    def select_least_used_image(self, category):
-        """Select image that has been used least recently - all real nature photos"""
+    def select_least_used_image(self, category, record=True):
+        """
+        Select image that has been used least recently - all real nature photos
+        record=False picks the same way without counting the use (dry runs)
+        """
         all_images = self.get_all_available_images()
         
         if not all_images:
@@ -682,27 +1028,35 @@ class HadithPostGenerator:
         selected = random.choice(candidates)
         
         # Update usage count
-        self.image_usage[selected] = self.image_usage.get(selected, 0) + 1
-        self.save_image_usage()
+        if record:
+            self.record_image_usage(selected)
         
         return selected
     
-    def add_image_overlay(self, base_img, category):
-        """Add halal nature/pattern image from LOCAL storage (no network calls)"""
-        if not USE_IMAGES:
-            return base_img
-        
-        # Get least used image to prevent repetition
-        image_path = self.select_least_used_image(category)
-        
-        # Load local image - NO network calls, NO timeouts, NO inappropriate content
-        overlay_img = self.load_local_image(image_path)
-        if not overlay_img:
-            return base_img
-        
+    def prepare_overlay(self, image_path, scale=1):
+        """
+        Get the ready-to-paste RGBA strip for a local image (resampled by scale for previews)
+        Served from the on-disk overlay cache when USE_OVERLAY_CACHE is enabled
+        """
+        if USE_OVERLAY_CACHE:
+            return OVERLAY_CACHE.get(image_path, self.build_overlay, scale=scale)
+        overlay_img = self.build_overlay(image_path)
+        if overlay_img and scale != 1:
+            overlay_img = OVERLAY_CACHE.scale_strip(overlay_img, scale)
+        return overlay_img
+    
+    def build_overlay(self, image_path):
+        """
+        Resize, center-crop and fade a local image into a ready-to-paste RGBA strip
+        Returns None if the image cannot be loaded
+        """
         # Calculate dimensions
         overlay_height = int(IMAGE_HEIGHT * IMAGE_HEIGHT_RATIO)
         
+        overlay_img = self.load_local_image(image_path, cover_size=(IMAGE_WIDTH, overlay_height))
+        if not overlay_img:
+            return None
+        
         # Resize and crop image to fit width
         aspect_ratio = overlay_img.width / overlay_img.height
         new_width = IMAGE_WIDTH
@@ -719,360 +1073,283 @@ class HadithPostGenerator:
         top = (new_height - overlay_height) // 2
         overlay_img = overlay_img.crop((left, top, left + IMAGE_WIDTH, top + overlay_height))
         
-        # Apply opacity
-        overlay_img = overlay_img.convert('RGBA')
-        alpha = overlay_img.split()[3]
-        alpha = alpha.point(lambda p: int(p * IMAGE_OPACITY))
-        overlay_img.putalpha(alpha)
-        
-        # Create a gradient fade at bottom of image
-        fade_height = 60
-        for y in range(fade_height):
-            alpha_value = int(255 * IMAGE_OPACITY * (1 - y / fade_height))
-            for x in range(IMAGE_WIDTH):
-                if y < overlay_height:
-                    pixel = overlay_img.getpixel((x, overlay_height - fade_height + y))
-                    overlay_img.putpixel((x, overlay_height - fade_height + y), 
-                                        (pixel[0], pixel[1], pixel[2], alpha_value))
+        # Apply opacity and the gradient fade at bottom in one mask operation
+        fade_mask = build_fade_mask(IMAGE_WIDTH, overlay_height)
+        if overlay_img.mode == 'RGBA':
+            overlay_img.putalpha(ImageChops.multiply(overlay_img.getchannel('A'), fade_mask))
+        else:
+            overlay_img = overlay_img.convert('RGBA')
+            overlay_img.putalpha(fade_mask)
+        
+        return overlay_img
+    
+    def add_image_overlay(self, base_img, category):
+        """Add halal nature/pattern image from LOCAL storage (no network calls)"""
+        if not USE_IMAGES:
+            return base_img
+        
+        # Get least used image to prevent repetition
+        image_path = self.select_least_used_image(category)
+        
+        # Load local image - NO network calls, NO timeouts, NO inappropriate content
+        overlay_img = self.prepare_overlay(image_path)
+        if not overlay_img:
+            return base_img
         
         # Paste onto base image
         base_img.paste(overlay_img, (0, 0), overlay_img)
         
         return base_img
     
-    def generate_single_slide(self, hadith, text_chunk, slide_num, total_slides, index, output_path, is_continuation=False, selected_image_path=None):
-        """Generate a single slide for multi-slide carousel"""
-        # Create background
-        img = self.create_gradient_background()
+    def split_text_balanced(self, text, font, max_height, max_width):
+        """
+        Split text into balanced chunks that fit within max_height
+        Thin wrapper over paginate_text() for callers that only need the chunk texts
+        """
+        pages = self.paginate_text(text, font, max_height, max_width)
+        return [' '.join(line_text(line) for line, _ in page['lines']) for page in pages] or [text]
+    
+    def paginate_text(self, text, font, max_height, max_width):
+        """
+        Wrap text once and split the lines into carousel pages (see text_layout.paginate_lines)
         
-        # Add category image if enabled (use the SAME image for all slides)
-        if selected_image_path:
-            overlay_img = self.load_local_image(selected_image_path)
-            if overlay_img:
-                # Apply the same overlay logic
-                overlay_height = int(IMAGE_HEIGHT * IMAGE_HEIGHT_RATIO)
-                aspect_ratio = overlay_img.width / overlay_img.height
-                new_width = IMAGE_WIDTH
-                new_height = int(new_width / aspect_ratio)
-                
-                if new_height < overlay_height:
-                    new_height = overlay_height
-                    new_width = int(new_height * aspect_ratio)
-                
-                overlay_img = overlay_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                
-                # Center crop
-                left = (new_width - IMAGE_WIDTH) // 2
-                top = (new_height - overlay_height) // 2
-                overlay_img = overlay_img.crop((left, top, left + IMAGE_WIDTH, top + overlay_height))
-                
-                # Apply opacity
-                overlay_img = overlay_img.convert('RGBA')
-                alpha = overlay_img.split()[3]
-                alpha = alpha.point(lambda p: int(p * IMAGE_OPACITY))
-                overlay_img.putalpha(alpha)
-                
-                # Create gradient fade
-                fade_height = 60
-                for y in range(fade_height):
-                    alpha_value = int(255 * IMAGE_OPACITY * (1 - y / fade_height))
-                    for x in range(IMAGE_WIDTH):
-                        if y < overlay_height:
-                            pixel = overlay_img.getpixel((x, overlay_height - fade_height + y))
-                            overlay_img.putpixel((x, overlay_height - fade_height + y), 
-                                                (pixel[0], pixel[1], pixel[2], alpha_value))
-                
-                # Paste onto base image
-                img.paste(overlay_img, (0, 0), overlay_img)
+        CRITICAL: max_height should be the ACTUAL available space considering:
+        - Space after heading/content start
+        - Space before reference (with proper margin)
+        - Space for watermark if present
         
-        draw = ImageDraw.Draw(img)
+        Returns:
+            List of pages: {'lines': [(styled runs, width)], 'height'}, drawn by the slides as-is
+        """
+        lines = self.layout_text_lines(text, font, max_width)
+        line_height = font.getbbox('A')[3] * LINE_SPACING
+        # Only fill PAGE_FILL_RATIO of the height to keep comfortable spacing
+        return paginate_lines(lines, line_height, max_height * PAGE_FILL_RATIO)
+    
+    def plan_post(self, output_path="output", specific_index=None, prefer_short=False, filename_tag=None, formats=None,
+                  image_path=None, auto_fit=AUTO_FIT_FONT, max_slides=AUTO_FIT_MAX_SLIDES, track_images=True):
+        """
+        Select a hadith, paginate it and pick its image WITHOUT rendering anything
         
-        # Load fonts
-        heading_font = self.get_font('heading', bold=True)
-        symbol_font = self.get_font('symbol')
-        main_font = self.get_font('main_text')
-        source_font = self.get_font('source', bold=True)
+        Everything that touches tracking state (hadith selection, image usage) happens
+        here in the calling process; the returned slide jobs are plain picklable dicts
+        holding each slide's display list (see layout_slide) that render_slide_jobs()
+        can rasterize serially or in a process pool.
         
-        # Calculate starting position - more space for content (no heading)
-        if USE_IMAGES:
-            y_pos = int(IMAGE_HEIGHT * IMAGE_HEIGHT_RATIO) + PADDING_TOP
-        else:
-            y_pos = PADDING_TOP
+        The text is wrapped once and re-paginated per export format (see EXPORT_FORMATS);
+        feed slides come first, each other format's files get a "_<format>" suffix.
         
-        # Optional heading display (configurable)
-        if slide_num == 1 and SHOW_HEADING_FIRST_SLIDE:
-            text_before = "Hadith of the Day"
-            symbol = ""
-            text_after = ":"
-            
-            if HEADING_ALIGNMENT == "center":
-                temp_bbox = heading_font.getbbox(text_before + text_after)
-                symbol_bbox = symbol_font.getbbox(symbol)
-                total_width = (temp_bbox[2] - temp_bbox[0]) + (symbol_bbox[2] - symbol_bbox[0]) + 5
-                heading_x = (IMAGE_WIDTH - total_width) // 2
-            else:
-                heading_x = CONTENT_LEFT_MARGIN
-            
-            self.draw_text_with_symbol(
-                draw, heading_x, y_pos,
-                text_before, symbol, text_after,
-                heading_font, symbol_font,
-                self.theme['heading_color'],
-                self.theme['heading_color']
-            )
-            y_pos += max(heading_font.getbbox("A")[3], symbol_font.getbbox(symbol)[3]) + HEADING_TO_CONTENT_GAP
-        elif slide_num > 1 and SHOW_HEADING_CONTINUATION_SLIDES:
-            continuation_text = "Continuation:"
-            cont_bbox = heading_font.getbbox(continuation_text)
-            
-            if HEADING_ALIGNMENT == "center":
-                cont_width = cont_bbox[2] - cont_bbox[0]
-                cont_x = (IMAGE_WIDTH - cont_width) // 2
-            else:
-                cont_x = CONTENT_LEFT_MARGIN
-            
-            draw.text((cont_x, y_pos), continuation_text, fill=self.theme['heading_color'], font=heading_font)
-            y_pos += heading_font.getbbox("A")[3] + HEADING_TO_CONTENT_GAP
-        
-        # Draw hadith text chunk (add "..." at end if not the last slide)
-        if slide_num < total_slides:
-            text_to_display = text_chunk + "..."
-        else:
-            # Last slide: ensure text ends with fullstop
-            text_to_display = text_chunk.rstrip()
-            if not text_to_display.endswith(('.', '!', '?', '।')):
-                text_to_display += "."
-        
-        # Wrap text with proper width
-        wrapped_lines = self.wrap_text(text_to_display, main_font, MAX_TEXT_WIDTH)
-        line_height = main_font.getbbox('A')[3] * LINE_SPACING
-        total_text_height = len(wrapped_lines) * line_height
-        
-        # Calculate available vertical space for content
-        content_start_y = y_pos  # Where content should start
-        
-        # Calculate where reference will be placed
-        source_bbox = source_font.getbbox(f"{hadith['primary_source']} (Sahih)")
-        reference_y = IMAGE_HEIGHT - PADDING_BOTTOM - source_bbox[3] - 10  # Add extra margin
-        
-        # If watermark exists, adjust reference position higher
-        if WATERMARK:
-            watermark_font = self.get_font('source', WATERMARK_SIZE)
-            watermark_bbox = watermark_font.getbbox(WATERMARK)
-            reference_y = IMAGE_HEIGHT - PADDING_BOTTOM - source_bbox[3] - watermark_bbox[3] - 25  # Space for watermark
-        
-        # Calculate available space and center content vertically
-        available_height = reference_y - content_start_y
-        vertical_offset = (available_height - total_text_height) // 2
-        y_pos = content_start_y + max(0, vertical_offset)  # Ensure it's not negative
-        
-        # Draw each line with proper alignment and symbol handling
-        for line in wrapped_lines:
-            # Calculate x position based on alignment
-            if TEXT_ALIGNMENT == "left":
-                line_x = CONTENT_LEFT_MARGIN
-            elif TEXT_ALIGNMENT == "right":
-                line_width = self.get_text_width_with_symbols(line, main_font, symbol_font)
-                line_x = IMAGE_WIDTH - CONTENT_RIGHT_MARGIN - line_width
-            else:  # center
-                line_width = self.get_text_width_with_symbols(line, main_font, symbol_font)
-                line_x = (IMAGE_WIDTH - line_width) // 2
-            
-            # Draw with proper symbol handling
-            if TEXT_SHADOW:
-                shadow_offset = 2
-                self.draw_text_with_arabic_symbols(
-                    draw, line_x + shadow_offset, y_pos + shadow_offset, 
-                    line, main_font, symbol_font, (0, 0, 0, 30)
-                )
-            
-            self.draw_text_with_arabic_symbols(
-                draw, line_x, y_pos, line, main_font, symbol_font, 
-                self.theme['text_color']
-            )
-            
-            y_pos += line_height
-        
-        # Draw reference (on all slides) - REMOVED verification line
-        # Draw reference (on all slides)
-        source_text = f"{hadith['primary_source']} (Sahih)"
-        source_bbox = source_font.getbbox(source_text)
-        source_width = source_bbox[2] - source_bbox[0]
-        source_x = (IMAGE_WIDTH - source_width) // 2
-        source_y = IMAGE_HEIGHT - PADDING - 90  # Moved up since we removed verification line
-        
-        # Calculate watermark position first to avoid overlap
-        watermark_y = None
-        watermark_height = 0
-        if WATERMARK:
-            watermark_font = self.get_font('source', WATERMARK_SIZE)
-            watermark_bbox = watermark_font.getbbox(WATERMARK)
-            watermark_height = watermark_bbox[3] - watermark_bbox[1]
-            watermark_y = IMAGE_HEIGHT - PADDING_BOTTOM - watermark_height
+        Args:
+            filename_tag: Optional suffix for output filenames (e.g. theme name for samples)
+            formats: Export format names to lay out (default OUTPUT_FORMATS, feed always included)
+            image_path: Use this image instead of the least used one (no usage tracking)
+            auto_fit: Pick the main text size so the feed needs at most max_slides slides
+                (see fit_main_text_size)
+            track_images: Count the picked image in image_usage.json (False for previews)
         
-        draw.text((source_x, source_y), source_text, fill=self.theme['source_color'], font=source_font)
-        # Position reference ABOVE watermark with proper spacing
-        if WATERMARK:
-            source_y = watermark_y - source_bbox[3] - 20  # 20px gap between reference and watermark
+        Returns:
+            Dict with hadith, index and ordered slide jobs (each tagged with its 'format'),
+            or None if all hadiths posted
+        """
+        # Get hadith
+        if specific_index is not None:
+            index = specific_index
+            hadith = self.hadiths[index]
+            # Validate even for specific index
+            if not validate_hadith_authenticity(hadith):
+                raise ValueError(f"Hadith at index {index} is not Sahih or not properly verified!")
         else:
-            source_y = IMAGE_HEIGHT - PADDING_BOTTOM - source_bbox[3] - 10
+            hadith, index = self.get_next_hadith(prefer_short, auto_fit, max_slides)
+            if hadith is None:
+                return None  # All hadiths posted
         
-        # Position based on alignment setting
-        if REFERENCE_ALIGNMENT == "left":
-            source_x = CONTENT_LEFT_MARGIN
-        elif REFERENCE_ALIGNMENT == "right":
-            source_x = IMAGE_WIDTH - CONTENT_RIGHT_MARGIN - source_width
-        else:  # center
-            source_x = (IMAGE_WIDTH - source_width) // 2
+        formats = ['feed'] + [name for name in (formats or OUTPUT_FORMATS) if name != 'feed']
         
-        draw.text((source_x, source_y), source_text, fill=self.theme['source_color'], font=source_font)
+        runs = self.tokenize_text(self.post_text(hadith['text']))
+        main_size = FONTS['main_text']['size']
+        if auto_fit:
+            main_size, slide_count = self.fit_main_text_size(runs, max_slides)
+            print(f"🔠 Auto-fit: main text {main_size}px ({slide_count} slide(s), target <= {max_slides})")
+        format_pages = self.paginate_formats(runs, formats, self.get_font('main_text', main_size))
         
-        # Watermark (draw AFTER reference)
-        if WATERMARK:
-            watermark_font = self.get_font('source', WATERMARK_SIZE)
-            watermark_bbox = watermark_font.getbbox(WATERMARK)
-            watermark_width = watermark_bbox[2] - watermark_bbox[0]
-            watermark_x = (IMAGE_WIDTH - watermark_width) // 2
-            
-            watermark_color = self.hex_to_rgb(self.theme['source_color'])
-            watermark_color = (*watermark_color[:3], WATERMARK_OPACITY)
+        kind, pages = format_pages['feed']
+        if kind == 'carousel':
+            # ⚠️ INSTAGRAM LIMIT: Max 10 slides per carousel
+            if len(pages) > MAX_CAROUSEL_SLIDES:
+                if specific_index is not None:
+                    # Never swap an explicitly requested hadith for another one
+                    raise ValueError(f"Hadith at index {index} requires {len(pages)} slides "
+                                     f"(Instagram limit: {MAX_CAROUSEL_SLIDES}) - try --auto-fit")
+                print(f"\n⚠️  WARNING: Hadith requires {len(pages)} slides (Instagram limit: {MAX_CAROUSEL_SLIDES})")
+                print(f"📏 Text length: {len(hadith['text'])} characters")
+                print(f"💡 Options:")
+                print(f"   1. Skip this hadith and use '--prefer-short' flag for automatic selection")
+                print(f"   2. Post only first {MAX_CAROUSEL_SLIDES} slides (truncated)")
+                print(f"   3. Split into 2 separate posts")
+                print(f"\n⏭️  Skipping to next shorter hadith...\n")
+                
+                # Skip this hadith (for this run only) and get a shorter one
+                self.skipped_ids.add(hadith['base_id'])
+                return self.plan_post(output_path, specific_index=None, prefer_short=prefer_short,
+                                      filename_tag=filename_tag, formats=formats, image_path=image_path,
+                                      auto_fit=auto_fit, max_slides=max_slides, track_images=track_images)
             
-            draw.text((watermark_x, watermark_y), WATERMARK, fill=watermark_color, font=watermark_font)
+            print(f"📖 Long hadith detected! Creating {len(pages)} slides...")
         
-        # Add swipe indicator (except on last slide) - ADD AFTER WATERMARK
-        if slide_num < total_slides:
-            swipe_indicator = self.create_swipe_indicator(slide_num, total_slides)
-            img = img.convert('RGBA')
-            img.alpha_composite(swipe_indicator, (0, IMAGE_HEIGHT - PADDING - 20))
-            img = img.convert('RGB')
+        # Select ONE image for ALL slides in the carousel
+        selected_image_path = None
+        if USE_IMAGES and image_path:
+            selected_image_path = image_path
+        elif USE_IMAGES and 'category' in hadith:
+            selected_image_path = self.select_least_used_image(hadith['category'], record=track_images)
         
-        # Save slide
+        # Filenames are fixed here so parallel rendering stays deterministic
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{output_path}/hadith_{index}_{timestamp}_slide{slide_num}.png"
-        img.save(filename, quality=95)
+        base_name = f"{output_path}/hadith_{index}_{timestamp}"
+        if filename_tag:
+            base_name += f"_{filename_tag}"
+        
+        job = {
+            'theme_name': self.theme_name,
+            'hadith': hadith,
+            'index': index,
+            'selected_image_path': selected_image_path,
+        }
         
-        return filename
+        # Lay out every slide of every format once; rendering (any theme, any retry) only rasterizes
+        jobs = []
+        for name in formats:
+            kind, pages = format_pages[name]
+            total_pages = len(pages)
+            if EXPORT_FORMATS[name].get('teaser'):
+                # Stories can't be swiped: only the first page, pointing to the post for the rest
+                kind, pages = 'single', pages[:1]
+            format_base = base_name if name == 'feed' else f"{base_name}_{name}"
+            for slide_num, page in enumerate(pages, 1):
+                jobs.append(dict(
+                    job, format=name, kind=kind, slide_num=slide_num, total_slides=len(pages),
+                    text_chunk=' '.join(line_text(line) for line, _ in page['lines']),
+                    layout=self.layout_slide(hadith, page['lines'], slide_num, total_pages,
+                                             selected_image_path, export_format=name, main_size=main_size),
+                    image_format=OUTPUT_IMAGE_FORMAT,
+                    filename=image_filename(f"{format_base}.png" if kind == 'single'
+                                            else f"{format_base}_slide{slide_num}.png", OUTPUT_IMAGE_FORMAT)
+                ))
+        
+        return {'hadith': hadith, 'index': index, 'jobs': jobs}
     
-    def split_text_balanced(self, text, font, max_height, max_width):
+    def post_text(self, text):
+        """Hadith text as laid out on the slides (always ends with a fullstop)"""
+        text = text.rstrip()
+        if not text.endswith(('.', '!', '?', '।')):
+            text += "."
+        return text
+    
+    def measure_layout(self, text, auto_fit=AUTO_FIT_FONT, max_slides=AUTO_FIT_MAX_SLIDES):
         """
-        Split text into balanced chunks that fit within max_height
-        Ensures no slide has too few words (min 5 words per slide)
-        Based on NectarFromQuran's balanced chunking algorithm
-        
-        CRITICAL: max_height should be the ACTUAL available space considering:
-        - Space after heading/content start
-        - Space before reference (with proper margin)
-        - Space for watermark if present
+        Layout index entry for a hadith text, as plan_post() paginates it with the
+        same auto_fit/max_slides: feed slide count, line count, main text size and
+        whether it fits the carousel limit
         """
-        words = text.split()
+        runs = self.tokenize_text(self.post_text(text))
+        size = FONTS['main_text']['size']
+        if auto_fit:
+            size, _ = self.fit_main_text_size(runs, max_slides)
+        _, pages = self.paginate_formats(runs, ['feed'], self.get_font('main_text', size))['feed']
+        return {
+            'slides': len(pages),
+            'lines': sum(len(page['lines']) for page in pages),
+            'size': size,
+            'fits': len(pages) <= MAX_CAROUSEL_SLIDES,
+        }
+    
+    def paginate_formats(self, runs, formats, main_font, run_measurer=None):
+        """
+        Paginate tokenized text for each export format at main_font's size
         
-        if len(words) <= 8:  # Short hadith, no need to split
-            return [text]
+        The text is wrapped once per text width (every format as wide as the feed
+        shares the feed's lines) and split into balanced pages per format height.
         
-        chunks = []
-        current_chunk = []
+        Args:
+            run_measurer: Width source for wrapping (default: exact, at main_font's size)
         
-        for word in words:
-            test_chunk = ' '.join(current_chunk + [word])
-            wrapped_lines = self.wrap_text(test_chunk, font, max_width)
-            
-            # Calculate height with proper line spacing
-            line_height = font.getbbox('A')[3] * LINE_SPACING
-            test_height = len(wrapped_lines) * line_height
+        Returns:
+            {format: ('single' | 'carousel', pages)}
+        """
+        run_measurer = run_measurer or self.get_run_measurer(main_font)
+        line_height = main_font.getbbox('A')[3] * LINE_SPACING
+        wrapped_by_width = {}
+        format_pages = {}
+        for name in formats:
+            width, height = EXPORT_FORMATS[name]['size']
+            text_width = width - CONTENT_LEFT_MARGIN - CONTENT_RIGHT_MARGIN - 60
+            if text_width not in wrapped_by_width:
+                wrapped_by_width[text_width] = run_measurer.wrap(runs, text_width)
+            wrapped_lines = wrapped_by_width[text_width]
             
-            # Use 85% of max_height to ensure comfortable spacing
-            if test_height <= (max_height * 0.85):
-                current_chunk.append(word)
+            # Check if hadith text fits in one slide of this format
+            max_text_height = self.text_area_height(height - EXPORT_FORMATS[name].get('bottom_inset', 0))
+            total_text_height = len(wrapped_lines) * line_height
+            if total_text_height > max_text_height:
+                # Split text into balanced pages, reusing the wrapped lines
+                format_pages[name] = ('carousel', paginate_lines(wrapped_lines, line_height,
+                                                                 max_text_height * PAGE_FILL_RATIO))
             else:
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                current_chunk = [word]
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        # Balance chunks: if last chunk has very few words (<5) and there are multiple chunks,
-        # redistribute words from previous chunk
-        if len(chunks) >= 2:
-            last_chunk_words = chunks[-1].split()
-            if len(last_chunk_words) < 5:  # Too few words in last chunk
-                prev_chunk_words = chunks[-2].split()
-                
-                if len(prev_chunk_words) >= 8:  # Previous chunk is large enough
-                    # Calculate how many words to move
-                    total_words = len(prev_chunk_words) + len(last_chunk_words)
-                    words_to_move = (total_words // 2) - len(last_chunk_words)
-                    
-                    if words_to_move > 0 and words_to_move <= len(prev_chunk_words) // 2:
-                        # Move words
-                        moved_words = prev_chunk_words[-words_to_move:]
-                        prev_chunk_words = prev_chunk_words[:-words_to_move]
-                        last_chunk_words = moved_words + last_chunk_words
-                        
-                        # Update chunks
-                        chunks[-2] = ' '.join(prev_chunk_words)
-                        chunks[-1] = ' '.join(last_chunk_words)
-        
-        return chunks if chunks else [text]
+                format_pages[name] = ('single', [{'lines': wrapped_lines, 'height': total_text_height}])
+        return format_pages
     
-    def create_swipe_indicator(self, current_slide, total_slides):
-        """Create subtle 'Swipe →' text at bottom right"""
-        indicator_img = Image.new('RGBA', (IMAGE_WIDTH, 50), (0, 0, 0, 0))
-        draw = ImageDraw.Draw(indicator_img)
-        
-        # Get smaller, subtle font
-        indicator_font = self.get_font('source', size=22)
-        
-        # Simple swipe text with right arrow
-        swipe_text = "Swipe →"
-        bbox = indicator_font.getbbox(swipe_text)
-        text_width = bbox[2] - bbox[0]
-        
-        # Position at bottom right with padding
-        text_x = IMAGE_WIDTH - text_width - 60
-        text_y = 15
+    def fit_main_text_size(self, runs, max_slides=AUTO_FIT_MAX_SLIDES, sizes=AUTO_FIT_FONT_SIZES):
+        """
+        Largest main text size within sizes (smallest, largest) whose feed pagination
+        needs at most max_slides slides - the smallest size if none does
         
-        # Subtle color matching theme (no outline, keep it minimal)
-        text_color = self.hex_to_rgb(self.theme['source_color'])
-        text_color = (*text_color, 150)  # Semi-transparent for subtlety
+        Binary search over whole pixel sizes. The text is tokenized once by the caller
+        and each probe only re-wraps it: widths are the default size's cached word
+        measurements, scaled (ScaledRunMeasurer). The chosen size is then paginated
+        exactly, stepping down if the estimate was off by a line.
         
-        draw.text((text_x, text_y), swipe_text, font=indicator_font, fill=text_color)
+        Returns:
+            (size, feed slide count)
+        """
+        smallest, largest = sizes
+        base_font = self.get_font('main_text')
+        base_measurer = self.get_run_measurer(base_font)
+        
+        def slide_count(size, exact=False):
+            main_font = self.get_font('main_text', size)
+            measurer = None if exact else ScaledRunMeasurer(base_measurer, size / base_font.size)
+            _, pages = self.paginate_formats(runs, ['feed'], main_font, measurer)['feed']
+            return len(pages)
+        
+        size = smallest
+        if slide_count(largest) <= max_slides:
+            size = largest
+        else:
+            low, high = smallest, largest - 1
+            while low <= high:
+                probe = (low + high) // 2
+                if slide_count(probe) <= max_slides:
+                    size, low = probe, probe + 1
+                else:
+                    high = probe - 1
         
-        return indicator_img
+        count = slide_count(size, exact=True)
+        while count > max_slides and size > smallest:
+            size -= 1
+            count = slide_count(size, exact=True)
+        return size, count
     
-    def generate_post(self, output_path="output", specific_index=None, prefer_short=False):
+    def text_area_height(self, height):
         """
-        Generate a hadith post (single or multi-slide carousel)
-        
-        Args:
-            output_path: Directory to save generated images
-            specific_index: Use specific hadith index (overrides prefer_short)
-            prefer_short: Prefer hadiths that fit in <=10 slides (Instagram limit)
+        Height available for hadith text on a slide of the given canvas height
+        (between the content start and the reference/watermark block)
+        Measured once per canvas height - pagination and auto-fit probes ask repeatedly
         """
-        # Create output directory if it doesn't exist
-        os.makedirs(output_path, exist_ok=True)
-        
-        # Get hadith
-        if specific_index is not None:
-            index = specific_index
-            hadith = self.hadiths[index]
-            # Validate even for specific index
-            if not validate_hadith_authenticity(hadith):
-                raise ValueError(f"Hadith at index {index} is not Sahih or not properly verified!")
-        else:
-            hadith, index = self.get_next_hadith(prefer_short=prefer_short)
-            if hadith is None:
-                return None  # All hadiths posted
-        
-        # Create background
-        img = self.create_gradient_background()
+        if height in self._text_area_heights:
+            return self._text_area_heights[height]
         
-        draw = ImageDraw.Draw(img)
-        
-        # Load fonts
         heading_font = self.get_font('heading', bold=True)
         symbol_font = self.get_font('symbol')  # Special font for ﷺ
-        main_font = self.get_font('main_text')
         source_font = self.get_font('source', bold=True)  # Make source bold like heading
         
         # Calculate starting position (lower if image is present)
@@ -1093,7 +1370,7 @@ class HadithPostGenerator:
         
         # Calculate bottom position (reference + watermark + spacing)
         bottom_reserved = PADDING_BOTTOM + watermark_height + reference_height + 30  # 30px spacing
-        reference_top = IMAGE_HEIGHT - bottom_reserved
+        reference_top = height - bottom_reserved
         
         # If showing heading on first slide, account for it
         heading_height = 0
@@ -1101,227 +1378,831 @@ class HadithPostGenerator:
             heading_height = max(heading_font.getbbox("A")[3], symbol_font.getbbox("ﷺ")[3]) + HEADING_TO_CONTENT_GAP
         
         # Calculate actual available height for text
-        max_text_height = reference_top - content_start_y - heading_height - 40  # 40px safety margin
+        available = reference_top - content_start_y - heading_height - 40  # 40px safety margin
+        self._text_area_heights[height] = available
+        return available
+    
+    def layout_slide(self, hadith, lines, slide_num=1, total_slides=1, selected_image_path=None, export_format="feed",
+                     main_size=None):
+        """
+        Lay out one slide as a display list (a plain, JSON-serializable dict)
         
-        # Ensure hadith text ends with fullstop
-        hadith_text = hadith['text'].rstrip()
-        if not hadith_text.endswith(('.', '!', '?', '।')):
-            hadith_text += "."
+        All positions, fonts and wrapped text are fixed here. Colors are theme roles
+        (e.g. 'text_color') resolved by rasterize_layout(), so one layout can be drawn
+        in any theme, re-drawn without re-measuring, saved as JSON and diffed.
         
-        # Check if hadith text fits in one slide
-        wrapped_lines = self.wrap_text(hadith_text, main_font, MAX_TEXT_WIDTH - 60)
-        line_height = main_font.getbbox('A')[3] * LINE_SPACING
-        total_text_height = len(wrapped_lines) * line_height
+        Args:
+            lines: This slide's (styled runs, width) lines from paginate_text()
+            export_format: Name in EXPORT_FORMATS giving the canvas size and bottom inset
+            main_size: Main text size the lines were wrapped at (default FONTS['main_text'])
         
-        # Determine if we need multiple slides
-        needs_multiple_slides = total_text_height > max_text_height
+        Returns:
+            {'width', 'height', 'chrome': [items], 'content': [items]}
+            chrome (background, image, reference, watermark, swipe or tap note) is shared by all
+            slides of a carousel; content (heading, text) is per slide
+        """
+        heading_font = self.get_font('heading', bold=True)
+        symbol_font = self.get_font('symbol')
+        main_font = self.get_font('main_text', main_size)
+        source_font = self.get_font('source', bold=True)
+        width, height = EXPORT_FORMATS[export_format]['size']
+        bottom = height - EXPORT_FORMATS[export_format].get('bottom_inset', 0)
+        teaser = EXPORT_FORMATS[export_format].get('teaser', False)
         
-        if needs_multiple_slides:
-            # Split text into balanced chunks (using text with fullstop)
-            text_chunks = self.split_text_balanced(hadith_text, main_font, max_text_height, MAX_TEXT_WIDTH - 60)
-            
-            # ⚠️ INSTAGRAM LIMIT: Max 10 slides per carousel
-            if len(text_chunks) > 10:
-                print(f"\n⚠️  WARNING: Hadith requires {len(text_chunks)} slides (Instagram limit: 10)")
-                print(f"📏 Text length: {len(hadith['text'])} characters")
-                print(f"💡 Options:")
-                print(f"   1. Skip this hadith and use '--prefer-short' flag for automatic selection")
-                print(f"   2. Post only first 10 slides (truncated)")
-                print(f"   3. Split into 2 separate posts")
-                print(f"\n⏭️  Skipping to next shorter hadith...\n")
-                
-                # Skip this hadith and get a shorter one
-                self.posted_indices.append(index)
-                return self.generate_post(output_path, specific_index=None)
-            
-            print(f"📖 Long hadith detected! Creating {len(text_chunks)} slides...")
-            
-            # Select ONE image for ALL slides in the carousel
-            selected_image_path = None
-            if USE_IMAGES and 'category' in hadith:
-                selected_image_path = self.select_least_used_image(hadith['category'])
-            
-            # Generate multiple slides with the SAME image
-            slide_files = []
-            for slide_num, chunk in enumerate(text_chunks, 1):
-                slide_img = self.generate_single_slide(
-                    hadith, chunk, slide_num, len(text_chunks),
-                    index, output_path, is_continuation=(slide_num > 1),
-                    selected_image_path=selected_image_path
-                )
-                slide_files.append(slide_img)
-            
-            # Mark as posted (staged, not committed yet)
-            if specific_index is None:
-                self.save_posted_hadith(hadith)
-            
-            print(f"✅ Generated {len(slide_files)} slides for hadith {index + 1}")
-            return slide_files, index, hadith
+        chrome = [{'type': 'background'}]
+        if selected_image_path:
+            chrome.append({'type': 'image', 'path': selected_image_path, 'x': 0, 'y': 0})
         
+        # Reference sits ABOVE the watermark with proper spacing
+        source_text = f"{hadith['primary_source']} (Sahih)"
+        source_bbox = source_font.getbbox(source_text)
+        source_width = source_bbox[2] - source_bbox[0]
+        watermark_y = None
+        if WATERMARK:
+            watermark_font = self.get_font('source', WATERMARK_SIZE)
+            watermark_bbox = watermark_font.getbbox(WATERMARK)
+            watermark_y = bottom - PADDING_BOTTOM - (watermark_bbox[3] - watermark_bbox[1])
+            reference_y = watermark_y - source_bbox[3] - 20  # 20px gap
         else:
-            # Single slide - add image overlay using the standard method
-            if USE_IMAGES and 'category' in hadith:
-                img = self.add_image_overlay(img, hadith['category'])
-            
-            # Initialize starting position for single slide
-            if USE_IMAGES:
-                y_pos = int(IMAGE_HEIGHT * IMAGE_HEIGHT_RATIO) + PADDING_TOP
+            reference_y = bottom - PADDING_BOTTOM - source_bbox[3] - 10
+        
+        if REFERENCE_ALIGNMENT == "left":
+            source_x = CONTENT_LEFT_MARGIN
+        elif REFERENCE_ALIGNMENT == "right":
+            source_x = width - CONTENT_RIGHT_MARGIN - source_width
+        else:  # center
+            source_x = (width - source_width) // 2
+        chrome.append(self._text_item(source_text, source_x, reference_y, 'source', source_font, True, 'source_color'))
+        
+        # Watermark (drawn AFTER reference)
+        if WATERMARK:
+            watermark_width = watermark_bbox[2] - watermark_bbox[0]
+            watermark_x = (width - watermark_width) // 2
+            chrome.append(self._text_item(WATERMARK, watermark_x, watermark_y, 'source', watermark_font, False, 'watermark'))
+        
+        # Subtle 'Swipe →' at the bottom right of every slide but the last
+        # (teasers can't be swiped - they point to the post instead)
+        if slide_num < total_slides:
+            indicator_font = self.get_font('source', size=22)
+            if teaser:
+                # Centred under the watermark, still above the bottom inset
+                swipe_text = "Tap to view the full hadith →"
+                bbox = indicator_font.getbbox(swipe_text)
+                swipe_x, swipe_y = (width - (bbox[2] - bbox[0])) // 2, bottom - PADDING_BOTTOM + 25
             else:
-                y_pos = PADDING_TOP
+                swipe_text = "Swipe →"
+                bbox = indicator_font.getbbox(swipe_text)
+                swipe_x, swipe_y = width - (bbox[2] - bbox[0]) - 60, bottom - PADDING - 5
+            item = self._text_item(swipe_text, swipe_x, swipe_y, 'source', indicator_font, False, 'swipe')
+            item['blend'] = True  # Semi-transparent, blended onto the background
+            chrome.append(item)
+        
+        content = []
+        
+        # Calculate starting position (lower if image is present)
+        if USE_IMAGES:
+            y_pos = int(IMAGE_HEIGHT * IMAGE_HEIGHT_RATIO) + PADDING_TOP
+        else:
+            y_pos = PADDING_TOP
+        
+        # Optional heading display (configurable)
+        if slide_num == 1 and SHOW_HEADING_FIRST_SLIDE:
+            text_before = "Hadith of the Day"
+            symbol = ""
+            text_after = ":"
             
-            # Optional: Draw heading with proper ﷺ symbol (only if enabled in config)
-            if SHOW_HEADING_FIRST_SLIDE:
-                text_before = "Hadith of the Day"
-                symbol = ""  # Unicode symbol
-                text_after = ":"
-                
-                # Calculate total width for centering
+            before_bbox = heading_font.getbbox(text_before)
+            symbol_font_large = self.get_font('symbol', size=int(symbol_font.size * 1.1))
+            symbol_bbox = symbol_font_large.getbbox(symbol)
+            if HEADING_ALIGNMENT == "center":
                 temp_bbox = heading_font.getbbox(text_before + text_after)
-                symbol_bbox = symbol_font.getbbox(symbol)
-                total_width = (temp_bbox[2] - temp_bbox[0]) + (symbol_bbox[2] - symbol_bbox[0]) + 5
-                heading_x = (IMAGE_WIDTH - total_width) // 2
-                
-                # Draw with special symbol handling
-                self.draw_text_with_symbol(
-                    draw, heading_x, y_pos,
-                    text_before, symbol, text_after,
-                    heading_font, symbol_font,
-                    self.theme['heading_color'],
-                    self.theme['heading_color']
-                )
-                
-                y_pos += max(heading_font.getbbox("A")[3], symbol_font.getbbox(symbol)[3]) + HEADING_TO_CONTENT_GAP
-            
-            # Calculate where reference will be placed
-            source_bbox = source_font.getbbox(f"{hadith['primary_source']} (Sahih)")
-            
-            # Calculate watermark position if present
-            watermark_y = None
-            watermark_height = 0
-            if WATERMARK:
-                watermark_font = self.get_font('source', WATERMARK_SIZE)
-                watermark_bbox = watermark_font.getbbox(WATERMARK)
-                watermark_height = watermark_bbox[3] - watermark_bbox[1]
-                watermark_y = IMAGE_HEIGHT - PADDING_BOTTOM - watermark_height
-            
-            # Position reference ABOVE watermark with proper spacing
-            if WATERMARK:
-                reference_y = watermark_y - source_bbox[3] - 20  # 20px gap
+                total_width = (temp_bbox[2] - temp_bbox[0]) + (symbol_font.getbbox(symbol)[2] - symbol_font.getbbox(symbol)[0]) + 5
+                heading_x = (width - total_width) // 2
             else:
-                reference_y = IMAGE_HEIGHT - PADDING_BOTTOM - source_bbox[3] - 10
-            
-            # Calculate available space and center content vertically
-            available_height = reference_y - y_pos
-            vertical_offset = (available_height - total_text_height) // 2
-            y_pos = y_pos + max(0, vertical_offset)
-            
-            # Draw text with proper alignment and symbol handling
-            for line in wrapped_lines:
-                # Calculate x position based on alignment
-                if TEXT_ALIGNMENT == "left":
-                    line_x = CONTENT_LEFT_MARGIN
-                elif TEXT_ALIGNMENT == "right":
-                    line_width = self.get_text_width_with_symbols(line, main_font, symbol_font)
-                    line_x = IMAGE_WIDTH - CONTENT_RIGHT_MARGIN - line_width
-                else:  # center
-                    line_width = self.get_text_width_with_symbols(line, main_font, symbol_font)
-                    line_x = (IMAGE_WIDTH - line_width) // 2
-                
-                # Draw with proper symbol handling
-                if TEXT_SHADOW:
-                    shadow_offset = 2
-                    self.draw_text_with_arabic_symbols(
-                        draw, line_x + shadow_offset, y_pos + shadow_offset, 
-                        line, main_font, symbol_font, (0, 0, 0, 30)
-                    )
-                
-                self.draw_text_with_arabic_symbols(
-                    draw, line_x, y_pos, line, main_font, symbol_font, 
-                    self.theme['text_color']
-                )
-                
-                y_pos += line_height
+                heading_x = CONTENT_LEFT_MARGIN
             
-            # Draw reference (same logic as multi-slide)
-            source_text = f"{hadith['primary_source']} (Sahih)"
-            source_bbox = source_font.getbbox(source_text)
-            source_width = source_bbox[2] - source_bbox[0]
+            # Symbol aligned to the text baseline (slightly raised), small gaps around it
+            current_x = heading_x
+            content.append(self._text_item(text_before, current_x, y_pos, 'heading', heading_font, True, 'heading_color'))
+            current_x += before_bbox[2] - before_bbox[0] + 2
+            if symbol:
+                baseline_offset = abs(before_bbox[1]) - abs(symbol_bbox[1]) - 10
+                content.append(self._text_item(symbol, current_x, y_pos + baseline_offset, 'symbol',
+                                               symbol_font_large, False, 'heading_color'))
+            current_x += symbol_bbox[2] - symbol_bbox[0] + 2
+            content.append(self._text_item(text_after, current_x, y_pos, 'heading', heading_font, True, 'heading_color'))
             
-            # Position based on alignment setting
-            if REFERENCE_ALIGNMENT == "left":
-                source_x = CONTENT_LEFT_MARGIN
-            elif REFERENCE_ALIGNMENT == "right":
-                source_x = IMAGE_WIDTH - CONTENT_RIGHT_MARGIN - source_width
+            y_pos += max(heading_font.getbbox("A")[3], symbol_font.getbbox(symbol)[3]) + HEADING_TO_CONTENT_GAP
+        elif slide_num > 1 and SHOW_HEADING_CONTINUATION_SLIDES:
+            continuation_text = "Continuation:"
+            cont_bbox = heading_font.getbbox(continuation_text)
+            if HEADING_ALIGNMENT == "center":
+                cont_x = (width - (cont_bbox[2] - cont_bbox[0])) // 2
+            else:
+                cont_x = CONTENT_LEFT_MARGIN
+            content.append(self._text_item(continuation_text, cont_x, y_pos, 'heading', heading_font, True, 'heading_color'))
+            y_pos += heading_font.getbbox("A")[3] + HEADING_TO_CONTENT_GAP
+        
+        # "..." at the end of every slide but the last (not on teasers), fullstop at the very end
+        lines = list(lines)
+        last_line = lines[-1][0]
+        if slide_num < total_slides:
+            if not teaser:
+                last_line = append_text(last_line, "...")
+        elif not line_text(last_line).rstrip().endswith(('.', '!', '?', '।')):
+            last_line = append_text(last_line, ".")
+        lines[-1] = (last_line, self.get_run_measurer(main_font).line_width(last_line))
+        
+        # Center the text vertically between heading and reference
+        line_height = main_font.getbbox('A')[3] * LINE_SPACING
+        total_text_height = len(lines) * line_height
+        vertical_offset = (reference_y - y_pos - total_text_height) // 2
+        y_pos = y_pos + max(0, vertical_offset)
+        
+        for line, line_width in lines:
+            # Calculate x position based on alignment (widths come with the wrapped lines)
+            if TEXT_ALIGNMENT == "left":
+                line_x = CONTENT_LEFT_MARGIN
+            elif TEXT_ALIGNMENT == "right":
+                line_x = width - CONTENT_RIGHT_MARGIN - line_width
             else:  # center
-                source_x = (IMAGE_WIDTH - source_width) // 2
-            
-            # Use the calculated reference_y from above
-            draw.text((source_x, reference_y), source_text, fill=self.theme['source_color'], font=source_font)
+                line_x = (width - line_width) // 2
             
-            # Watermark (draw AFTER reference)
-            if WATERMARK:
-                watermark_font = self.get_font('source', WATERMARK_SIZE)
-                watermark_bbox = watermark_font.getbbox(WATERMARK)
-                watermark_width = watermark_bbox[2] - watermark_bbox[0]
-                watermark_x = (IMAGE_WIDTH - watermark_width) // 2
-                # Use the watermark_y calculated above
-                
-                # Create semi-transparent watermark
-                watermark_color = self.hex_to_rgb(self.theme['source_color'])
-                watermark_color = (*watermark_color[:3], WATERMARK_OPACITY)
-                
-                draw.text(
-                    (watermark_x, watermark_y),
-                    WATERMARK,
-                    fill=watermark_color,
-                    font=watermark_font
-                )
-            
-            # Save image
+            runs = [list(run) for run in line]
+            content.append({'type': 'runs', 'runs': runs, 'x': line_x, 'y': y_pos,
+                            'size': main_font.size, 'color': 'text_color'})
+            y_pos += line_height
+        
+        layout = {'width': width, 'height': height, 'chrome': chrome, 'content': content}
+        if TEXT_SHADOW:
+            # Derived from the text coverage at raster time (see draw_layout_items)
+            layout['shadow'] = {'offset': list(TEXT_SHADOW_OFFSET), 'blur': TEXT_SHADOW_BLUR, 'color': 'shadow'}
+        return layout
+    
+    def _text_item(self, text, x, y, font_type, font, bold, color):
+        """Display list entry for a single-font text"""
+        return {'type': 'text', 'text': text, 'x': x, 'y': y, 'font': font_type,
+                'size': font.size, 'bold': bold, 'color': color}
+    
+    def resolve_color(self, role):
+        """Theme color for a display list color role"""
+        if role == 'watermark':
+            return (*self.hex_to_rgb(self.theme['source_color'])[:3], WATERMARK_OPACITY)
+        if role == 'swipe':
+            return (*self.hex_to_rgb(self.theme['source_color']), 150)  # Semi-transparent for subtlety
+        if role == 'shadow':
+            return TEXT_SHADOW_COLOR
+        if role == 'accent_color':
+            return self.theme.get('accent_color', self.theme['heading_color'])
+        return self.theme[role]
+    
+    def rasterize_layout(self, layout):
+        """
+        Draw a display list from layout_slide() in this generator's theme, returns RGB image
+        The chrome layers are rendered once and reused by every slide that shares them
+        """
+        key = json.dumps(layout['chrome'], sort_keys=True)
+        chrome = self._chrome_layers.get(key)
+        if chrome is None:
+            chrome = self.draw_layout_items(None, layout['chrome'], (layout['width'], layout['height']))
+            self._chrome_layers[key] = chrome
+            while len(self._chrome_layers) > CHROME_LAYER_CACHE_SIZE:
+                self._chrome_layers.popitem(last=False)
+        else:
+            self._chrome_layers.move_to_end(key)
+        
+        return self.draw_layout_items(chrome.copy(), layout['content'], chrome.size, layout.get('shadow'))
+    
+    def draw_layout_items(self, img, items, size, shadow=None):
+        """
+        Draw display list items onto img (a 'background' item starts a new image)
+        
+        With a shadow spec ({'offset', 'blur', 'color'}), text lines are drawn once into
+        per-color coverage masks; the shadow is derived from their union and both are
+        composited at the end (see composite_text_masks)
+        """
+        draw = ImageDraw.Draw(img) if img is not None else None
+        symbol_font = self.get_font('symbol')
+        text_masks = ColorMasks(size) if shadow else None
+        
+        for item in items:
+            kind = item['type']
+            if kind == 'background':
+                img = self.create_gradient_background(*size)
+                draw = ImageDraw.Draw(img)
+            elif kind == 'image':
+                # Preview tier: the strip resampled once per scale, shared by every theme
+                overlay_img = self.prepare_overlay(item['path'], item.get('scale', 1))
+                if overlay_img:
+                    img.paste(overlay_img, (item['x'], item['y']), overlay_img)
+            elif kind == 'runs':
+                main_font = self.get_font('main_text', item['size'])
+                self.draw_text_runs(text_masks or draw, item['x'], item['y'], item['runs'], main_font,
+                                    symbol_font, self.resolve_color(item['color']))
+            elif kind == 'text':
+                mask, (left, top), color = self.text_sprite(item)
+                img.paste(color, (item['x'] + left, item['y'] + top), mask)
+        
+        if text_masks is not None:
+            self.composite_text_masks(img, text_masks, shadow)
+        return img
+    
+    def composite_text_masks(self, img, text_masks, shadow):
+        """
+        Composite text drawn into ColorMasks onto img, with its shadow underneath
+        
+        The shadow is the union of the text coverage, shifted by the offset, optionally
+        blurred and scaled by the shadow color's alpha. All work is limited to the text's
+        bounding box (plus blur margin) - the slide itself is never converted or blurred.
+        """
+        masks, boxes = text_masks.masks, text_masks.boxes
+        if not masks:
+            return
+        
+        dx, dy = shadow['offset']
+        blur = shadow.get('blur') or 0
+        color = self.resolve_color(shadow['color'])
+        if isinstance(color, str):
+            color = ImageColor.getrgb(color)
+        alpha = color[3] if len(color) == 4 else 255
+        
+        # Union of the ink boxes, padded by ~3 sigma so a blur has room to spread
+        pad = int(blur * 3 + 0.5)
+        box = (
+            max(0, min(b[0] for b in boxes.values()) - pad), max(0, min(b[1] for b in boxes.values()) - pad),
+            min(img.width, max(b[2] for b in boxes.values()) + pad),
+            min(img.height, max(b[3] for b in boxes.values()) + pad),
+        )
+        
+        if alpha:
+            shadow_mask = None
+            for mask in masks.values():
+                region = mask.crop(box)
+                shadow_mask = region if shadow_mask is None else ImageChops.lighter(shadow_mask, region)
+            if blur:
+                shadow_mask = shadow_mask.filter(ImageFilter.GaussianBlur(blur))
+            if alpha < 255:
+                shadow_mask = shadow_mask.point([round(v * alpha / 255) for v in range(256)])
+            img.paste(tuple(color[:3]), (box[0] + dx, box[1] + dy), shadow_mask)
+        
+        for key, mask in masks.items():
+            fill = ImageColor.getrgb(key) if isinstance(key, str) else key
+            ink_box = boxes[key]
+            img.paste(tuple(fill[:3]), ink_box[:2], mask.crop(ink_box))
+    
+    def text_sprite(self, item):
+        """
+        Pre-rendered sprite for a display list text item: (coverage mask, bbox offset, RGB color)
+        
+        Reference, watermark, swipe and heading text repeat across slides, formats and
+        posts, so each is rasterized once per theme and composited over its bounding box
+        with one masked paste (no RGBA layer, no mode conversion of the slide).
+        Blended items (e.g. the swipe indicator) carry their alpha in the mask.
+        """
+        key = (item['text'], item['font'], item['size'], item['bold'], item['color'], bool(item.get('blend')))
+        sprite = self._text_sprites.get(key)
+        if sprite is not None:
+            self._text_sprites.move_to_end(key)
+            return sprite
+        
+        font = self.get_font(item['font'], item['size'], item['bold'])
+        color = self.resolve_color(item['color'])
+        if isinstance(color, str):
+            color = ImageColor.getrgb(color)
+        left, top, right, bottom = font.getbbox(item['text'])
+        mask = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), item['text'], fill=255, font=font)
+        if item.get('blend') and len(color) == 4:
+            # Semi-transparent text: scale the coverage by the color's alpha
+            mask = mask.point([round(v * color[3] / 255) for v in range(256)])
+        
+        # draw.text ignores alpha on RGB slides, so unblended items stay opaque as before
+        sprite = (mask, (left, top), tuple(color[:3]))
+        self._text_sprites[key] = sprite
+        while len(self._text_sprites) > TEXT_SPRITE_CACHE_SIZE:
+            self._text_sprites.popitem(last=False)
+        return sprite
+    
+    def render_slide_job(self, job):
+        """
+        Rasterize one slide job from plan_post()
+        
+        The slide is encoded once, as job['image_format'] (default OUTPUT_IMAGE_FORMAT,
+        JPEG for in-memory jobs). Returns the saved filename, or for in-memory jobs the
+        encoded bytes (also written as-is to job['filename'] when an archive copy is wanted)
+        """
+        job = with_image_format(job)
+        scale = job.get('preview_scale')
+        img = self.rasterize_layout(scale_layout(job['layout'], scale) if scale else job['layout'])
+        filename = job['filename']
+        
+        image_format = job['image_format']
+        data = encode_image(img, image_format, job.get('budget_kb', SLIDE_BYTE_BUDGET_KB), preview=bool(scale))
+        if filename:
+            with open(filename, 'wb') as f:
+                f.write(data)
+        
+        if filename and job.get('save_layout'):
+            with open(os.path.splitext(filename)[0] + '.json', 'w', encoding='utf-8') as f:
+                json.dump(job['layout'], f, indent=2, ensure_ascii=False)
+        
+        return data if job.get('in_memory') else filename
+    
+    def generate_single_slide(self, hadith, text_chunk, slide_num, total_slides, index, output_path, selected_image_path=None, filename=None):
+        """
+        Lay out, rasterize and save one slide of a carousel from its text chunk
+        (plan_post() + render_slide_job() do this for whole posts)
+        """
+        lines = self.layout_text_lines(text_chunk, self.get_font('main_text'), MAX_TEXT_WIDTH - 60)
+        layout = self.layout_slide(hadith, lines, slide_num, total_slides, selected_image_path)
+        if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{output_path}/hadith_{index}_{timestamp}.png"
-            img.save(filename, quality=95)
+            filename = f"{output_path}/hadith_{index}_{timestamp}_slide{slide_num}.png"
+        return self.render_slide_job({'layout': layout, 'filename': filename})
+    
+    def generate_post(self, output_path="output", specific_index=None, prefer_short=False, workers=RENDER_WORKERS,
+                      save_layout=False, formats=None, in_memory=False, archive=True, use_cache=USE_RENDER_CACHE,
+                      image_format=OUTPUT_IMAGE_FORMAT, budget_kb=SLIDE_BYTE_BUDGET_KB, preview=False,
+                      auto_fit=AUTO_FIT_FONT, max_slides=AUTO_FIT_MAX_SLIDES):
+        """
+        Generate a hadith post (single or multi-slide carousel)
         
-            # Mark as posted (staged, not committed yet)
-            if specific_index is None:
-                self.save_posted_hadith(hadith)
-            
-            print(f"✅ Generated: {filename}")
-            print(f"📖 Hadith {index + 1}/{len(self.hadiths)}")
-            print(f"📚 Book: {hadith['book']}")
-            print(f"✓ Grade: {hadith['grade']} (Verified)")
-            print(f"🎨 Theme: {self.theme['name']}")
-            print(f"📝 Text: {hadith['text'][:50]}...")
-            
-            return [filename], index, hadith  # Return as list for consistency
+        Args:
+            output_path: Directory to save generated images
+            specific_index: Use specific hadith index (overrides prefer_short)
+            prefer_short: Prefer hadiths that fit in <=10 slides (Instagram limit)
+            workers: Number of processes rendering slides in parallel (1 = serial)
+            save_layout: Also write each slide's display list as JSON next to the image
+            formats: Export formats to render (default OUTPUT_FORMATS); the feed slides are
+                returned, every format's slides are kept in self.exports ({format: [slides]})
+            in_memory: Return each slide as encoded JPEG bytes (ready for InstagramPoster)
+                instead of PNG filenames - no decode/re-encode before uploading
+            archive: With in_memory, also write the JPEG bytes to output_path as-is
+            use_cache: Reuse unchanged slides from the render cache (e.g. when retrying a post)
+            image_format: Slide file encoding - "png", "jpeg" or "webp" (in_memory is always JPEG)
+            budget_kb: Optional JPEG/WebP size limit per slide (see encode_image)
+            preview: Dry run at PREVIEW_SCALE (*_preview.jpg) - same pagination and line
+                breaks as the full render; the hadith is not staged as posted
+            auto_fit: Shrink the main text (within AUTO_FIT_FONT_SIZES) to fit max_slides slides
+        """
+        # Create output directory if it doesn't exist
+        if archive or not in_memory:
+            os.makedirs(output_path, exist_ok=True)
+        
+        plan = self.plan_post(output_path, specific_index, prefer_short, formats=formats,
+                              auto_fit=auto_fit, max_slides=max_slides, track_images=not preview)
+        if plan is None:
+            return None  # All hadiths posted
+        
+        hadith, index = plan['hadith'], plan['index']
+        if in_memory:
+            image_format = 'jpeg'
+        for job in plan['jobs']:
+            job['save_layout'] = save_layout
+            job['image_format'] = image_format
+            job['budget_kb'] = budget_kb
+            job['filename'] = image_filename(job['filename'], image_format)
+            if in_memory:
+                job['in_memory'] = True
+                if not archive:
+                    job['filename'] = None
+        if preview:
+            plan['jobs'] = [make_preview_job(job) for job in plan['jobs']]
+            print(f"👀 Preview: {PREVIEW_SCALE:.0%} scale, quick JPEG")
+        filenames = render_slide_jobs(plan['jobs'], workers, generator=self, use_cache=use_cache)
+        
+        self.exports = {}
+        for job, filename in zip(plan['jobs'], filenames):
+            self.exports.setdefault(job['format'], []).append(filename)
+        slide_files = self.exports['feed']
+        for name, files in self.exports.items():
+            if name != 'feed':
+                width, height = EXPORT_FORMATS[name]['size']
+                print(f"🖼️  {name.title()} ({width}x{height}): {len(files)} image(s)")
+        
+        # Mark as posted (staged, not committed yet)
+        if specific_index is None and not preview:
+            self.save_posted_hadith(hadith)
+        
+        if len(slide_files) > 1:
+            print(f"✅ Generated {len(slide_files)} slides for hadith {index + 1}")
+            return slide_files, index, hadith
+        
+        if in_memory and not preview:
+            print(f"✅ Rendered in memory ({len(slide_files[0]) // 1024} KB JPEG)")
+        else:
+            print(f"✅ Generated: {slide_files[0]}")
+        print(f"📖 Hadith {index + 1}/{len(self.hadiths)}")
+        print(f"📚 Book: {hadith['book']}")
+        print(f"✓ Grade: {hadith['grade']} (Verified)")
+        print(f"🎨 Theme: {self.theme['name']}")
+        print(f"📝 Text: {hadith['text'][:50]}...")
+        
+        return slide_files, index, hadith  # Return as list for consistency
+    
+    def prerender_posts(self, count, prefer_short=False, workers=BACKLOG_WORKERS, formats=None,
+                        image_format=OUTPUT_IMAGE_FORMAT, budget_kb=SLIDE_BYTE_BUDGET_KB, auto_fit=AUTO_FIT_FONT,
+                        max_slides=AUTO_FIT_MAX_SLIDES, in_memory=False, backlog=None):
+        """
+        Render the next posts ahead of time into the backlog (see post_backlog.py)
+        
+        Hadiths are selected as consecutive --post runs would pick them: each pick is
+        staged so the rotation moves on, and all of them are unstaged afterwards
+        (nothing is marked as posted). Image picks rotate the same way in memory;
+        image_usage.json only counts an image once take_backlog_post() posts it.
+        The slides of every post are rendered as one batch across workers.
+        
+        Args:
+            count: Number of ready posts the backlog should hold (ready ones count)
+            workers: Number of processes (None = all cores)
+            formats, image_format, budget_kb, auto_fit, max_slides: As for generate_post()
+            in_memory: Render for --post --in-memory runs (slides encoded as JPEG)
+            backlog: PostBacklog to fill (default POST_BACKLOG)
+        
+        Only --post runs with the same options (see backlog_options) take these items.
+        
+        Returns:
+            Ready backlog items in posting order
+        """
+        backlog = backlog or POST_BACKLOG
+        options = backlog_options(formats, image_format, budget_kb, auto_fit, max_slides, in_memory)
+        image_format = options['image_format']
+        fingerprint = backlog_fingerprint(self.theme_name, options)
+        ready = backlog.prune(fingerprint, self.posted_ids, self.hadiths)
+        if len(ready) >= count:
+            print(f"📦 Backlog already holds {len(ready)} ready post(s)")
+            return ready
+        
+        os.makedirs(backlog.backlog_dir, exist_ok=True)
+        hadiths_by_id = {hadith['unique_id']: hadith for hadith in self.hadiths}
+        posted_ids, posted_metadata = set(self.posted_ids), dict(self.posted_metadata)
+        image_usage = dict(self.image_usage)
+        plans = []
+        try:
+            # Posts already in the backlog go out first
+            for item in ready:
+                self.save_posted_hadith(hadiths_by_id[item['unique_id']])
+                self._stage_image_usage(item['image'])
+            while len(ready) + len(plans) < count:
+                plan = self.plan_post(backlog.backlog_dir, prefer_short=prefer_short, formats=formats,
+                                      auto_fit=auto_fit, max_slides=max_slides, track_images=False)
+                if plan is None:
+                    break  # All hadiths posted or queued
+                self.save_posted_hadith(plan['hadith'])
+                self._stage_image_usage(plan['jobs'][0]['selected_image_path'])
+                plans.append(plan)
+        finally:
+            self.posted_ids, self.posted_metadata = posted_ids, posted_metadata
+            self.image_usage = image_usage
+        
+        jobs = []
+        for plan in plans:
+            for job in plan['jobs']:
+                job['image_format'] = image_format
+                job['budget_kb'] = budget_kb
+                job['filename'] = image_filename(job['filename'], image_format)
+            jobs.extend(plan['jobs'])
+        print(f"🖨️  Pre-rendering {len(plans)} post(s), {len(jobs)} slide(s)...")
+        filenames = iter(render_slide_jobs(jobs, workers or os.cpu_count() or 1, generator=self))
+        
+        for plan in plans:
+            files = {}
+            for job in plan['jobs']:
+                files.setdefault(job['format'], []).append(next(filenames))
+            ready.append(backlog.make_item(plan['hadith'], plan['index'], self.theme_name, fingerprint,
+                                           plan['jobs'][0]['selected_image_path'], files))
+        backlog.save(ready)
+        return ready
+    
+    def _stage_image_usage(self, image_path):
+        """Count an image in memory only, so the next pick rotates past it (prerender_posts)"""
+        if image_path:
+            self.image_usage[image_path] = self.image_usage.get(image_path, 0) + 1
+    
+    def take_backlog_post(self, formats=None, image_format=OUTPUT_IMAGE_FORMAT, budget_kb=SLIDE_BYTE_BUDGET_KB,
+                          auto_fit=AUTO_FIT_FONT, max_slides=AUTO_FIT_MAX_SLIDES, in_memory=False, backlog=None):
+        """
+        Next ready pre-rendered post, staged as posted like generate_post() does
+        (self.exports is set from its files)
+        
+        Args:
+            formats, image_format, budget_kb, auto_fit, max_slides, in_memory: This run's
+                options - only items pre-rendered with the same ones are taken
+        
+        Returns:
+            (backlog item, feed slide files, index, hadith), or None when nothing is ready
+            for this theme and configuration - render live instead
+        """
+        backlog = backlog or POST_BACKLOG
+        formats = ['feed'] + [name for name in (formats or OUTPUT_FORMATS) if name != 'feed']
+        options = backlog_options(formats, image_format, budget_kb, auto_fit, max_slides, in_memory)
+        fingerprint = backlog_fingerprint(self.theme_name, options)
+        # Items for another theme or config stay queued (e.g. a one-off manual run)
+        ready = backlog.prune(None, self.posted_ids, self.hadiths)
+        item = next((item for item in ready if item['fingerprint'] == fingerprint
+                     and all(name in item['files'] for name in formats)), None)
+        if item is None:
+            return None
+        
+        index, hadith = next((i, h) for i, h in enumerate(self.hadiths) if h['unique_id'] == item['unique_id'])
+        self.exports = {name: list(files) for name, files in item['files'].items()}
+        self.save_posted_hadith(hadith)
+        # Counted now rather than when pre-rendered, like a live post's image pick
+        if item['image']:
+            self.record_image_usage(item['image'])
+        print(f"📦 Using pre-rendered post {item['unique_id']} "
+              f"({len(item['files']['feed'])} slide(s), rendered {item['rendered']})")
+        return item, self.exports['feed'], index, hadith
+
+
+# Generators owned by this process for rendering slide jobs (one per theme)
+_RENDER_GENERATORS = {}
+
+
+def _get_render_generator(theme_name):
+    """Lightweight generator (no corpus/tracking files) for rendering slide jobs"""
+    generator = _RENDER_GENERATORS.get(theme_name)
+    if generator is None:
+        generator = HadithPostGenerator(theme_name, load_data=False)
+        _RENDER_GENERATORS[theme_name] = generator
+    return generator
+
+
+def _init_render_worker():
+    """Process pool initializer: resolve fonts once per worker instead of once per slide"""
+    FONT_REGISTRY.resolve_symbol_font_path()
+    FONT_REGISTRY.resolve_text_font_path(bold=False)
+    FONT_REGISTRY.resolve_text_font_path(bold=True)
+
 
+def _render_slide_job(job):
+    """Process pool entry point (must be module-level to be picklable)"""
+    return _get_render_generator(job['theme_name']).render_slide_job(job)
 
-def generate_theme_samples():
-    """Generate sample posts for all themes to help you choose"""
+
+def _font_paths():
+    """Font files slides are drawn with (text, bold text, symbol)"""
+    return [
+        FONT_REGISTRY.resolve_text_font_path(bold=False),
+        FONT_REGISTRY.resolve_text_font_path(bold=True),
+        FONT_REGISTRY.resolve_symbol_font_path(),
+    ]
+
+
+def render_cache_key(job):
+    """RENDER_CACHE key for a slide job (theme and resolved font files included)"""
+    return RENDER_CACHE.cache_key(job, THEMES[job['theme_name']], _font_paths())
+
+
+def backlog_options(formats=None, image_format=OUTPUT_IMAGE_FORMAT, budget_kb=SLIDE_BYTE_BUDGET_KB,
+                    auto_fit=AUTO_FIT_FONT, max_slides=AUTO_FIT_MAX_SLIDES, in_memory=False):
+    """Per-run options that change a post's slides, normalized for backlog_fingerprint()"""
+    return {
+        'formats': ['feed'] + sorted(set(formats or OUTPUT_FORMATS) - {'feed'}),
+        'image_format': 'jpeg' if in_memory else image_format,  # in_memory is always JPEG
+        'budget_kb': budget_kb,
+        'auto_fit': bool(auto_fit),
+        'max_slides': max_slides if auto_fit else None,
+        'in_memory': bool(in_memory),
+    }
+
+
+def backlog_fingerprint(theme_name, options=None):
+    """POST_BACKLOG fingerprint of the current settings, theme, font files and run options"""
+    return POST_BACKLOG.fingerprint(theme_name, [RENDER_CACHE.file_digest(path) for path in _font_paths()],
+                                    options or backlog_options())
+
+
+def _measure_layouts(texts, fit_slides=None):
+    """Process pool entry point: layout index entries for a chunk of hadith texts"""
+    generator = _get_render_generator(DEFAULT_THEME)
+    return [generator.measure_layout(text, fit_slides is not None, fit_slides) for text in texts]
+
+
+def layout_index_for(auto_fit=AUTO_FIT_FONT, max_slides=AUTO_FIT_MAX_SLIDES):
+    """LayoutIndex for a run's auto-fit option: LAYOUT_INDEX, or one file per auto-fit slide target"""
+    if not auto_fit:
+        return LAYOUT_INDEX
+    index = _FIT_LAYOUT_INDEXES.get(max_slides)
+    if index is None:
+        root, ext = os.path.splitext(LAYOUT_INDEX_FILE)
+        index = _FIT_LAYOUT_INDEXES[max_slides] = LayoutIndex(f"{root}_fit{max_slides}{ext}")
+    return index
+
+
+def build_layout_index(hadiths, workers=LAYOUT_INDEX_WORKERS, index=None, auto_fit=AUTO_FIT_FONT,
+                       max_slides=AUTO_FIT_MAX_SLIDES):
+    """
+    Bring the layout index up to date for a corpus, returns the LayoutIndex
+    
+    Entries measured under the current layout settings and fonts are reused; only
+    new or edited hadiths are laid out, in a process pool when there are enough.
+    
+    Args:
+        hadiths: The corpus (entries for hadiths no longer in it are dropped)
+        workers: Number of processes (None = all cores)
+        index: LayoutIndex to update (default layout_index_for(auto_fit, max_slides))
+        auto_fit, max_slides: Measure slide counts as plan_post() renders them with these
+    """
+    index = index or layout_index_for(auto_fit, max_slides)
+    fit_slides = max_slides if auto_fit else None
+    fingerprint = index.layout_fingerprint((RENDER_CACHE.file_digest(path) for path in _font_paths()), fit_slides)
+    if index.fingerprint != fingerprint:
+        index.load(fingerprint)
+    
+    texts = index.missing(hadiths)
+    if not texts:
+        return index
+    
+    # A worker only pays off with a few dozen hadiths to lay out
+    workers = min(workers or os.cpu_count() or 1, len(texts) // 16)
+    print(f"📐 Measuring layout of {len(texts)} hadith(s)"
+          f"{f' with {workers} worker processes' if workers > 1 else ''}...")
+    if workers <= 1:
+        entries = _measure_layouts(texts, fit_slides)
+    else:
+        chunks = [texts[i::workers * 4] for i in range(workers * 4)]
+        entries = [None] * len(texts)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+            measured = executor.map(_measure_layouts, chunks, [fit_slides] * len(chunks))
+            for offset, chunk_entries in enumerate(measured):
+                entries[offset::workers * 4] = chunk_entries
+    
+    index.update(texts, entries)
+    index.save(hadiths)
+    return index
+
+
+def render_slide_jobs(jobs, workers=1, generator=None, use_cache=USE_RENDER_CACHE):
+    """
+    Render slide jobs from one or many plan_post() calls, returns filenames in job order
+    
+    Args:
+        jobs: List of slide job dicts (may mix hadiths and themes)
+        workers: Number of processes (1 = render serially in this process)
+        generator: Optional generator to reuse for serial jobs of its own theme
+        use_cache: Serve unchanged slides from RENDER_CACHE; only misses are rendered
+    """
+    jobs = [with_image_format(job) for job in jobs]
+    results = [None] * len(jobs)
+    keys = {}
+    pending = []
+    for i, job in enumerate(jobs):
+        if use_cache:
+            keys[i] = render_cache_key(job)
+            results[i] = RENDER_CACHE.fetch(keys[i], job)
+            if results[i] is not None:
+                if job.get('save_layout') and job.get('filename'):
+                    with open(os.path.splitext(job['filename'])[0] + '.json', 'w', encoding='utf-8') as f:
+                        json.dump(job['layout'], f, indent=2, ensure_ascii=False)
+                continue
+        pending.append(i)
+    
+    if use_cache and len(pending) < len(jobs):
+        print(f"♻️  {len(jobs) - len(pending)}/{len(jobs)} slides served from the render cache")
+    
+    workers = min(workers or 1, len(pending))
+    if workers <= 1:
+        for i in pending:
+            job = jobs[i]
+            if generator is not None and generator.theme_name == job['theme_name']:
+                results[i] = generator.render_slide_job(job)
+            else:
+                results[i] = _render_slide_job(job)
+    else:
+        print(f"⚡ Rendering {len(pending)} slides with {workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+            # Slides go to workers in chunks so each worker reuses its rendered chrome layers
+            chunksize = max(1, len(pending) // (workers * 2))
+            rendered = executor.map(_render_slide_job, [jobs[i] for i in pending], chunksize=chunksize)
+            for i, result in zip(pending, rendered):
+                results[i] = result
+    
+    if use_cache:
+        for i in pending:
+            RENDER_CACHE.store(keys[i], jobs[i], results[i])
+        RENDER_CACHE.evict()
+        RENDER_CACHE.record()
+    
+    return results
+
+
+def build_contact_sheet(rows, labels, column_names, thumb_width=CONTACT_SHEET_THUMB_WIDTH):
+    """
+    Side-by-side comparison image: one labelled row per sample, one column per theme
+    
+    Args:
+        rows: Rendered slide files, one list (a file per column) per row
+        labels: Caption above each row
+        column_names: Header of each column
+    """
+    font = _get_render_generator(DEFAULT_THEME).get_font('source', 22)
+    padding, header_height, label_height = 12, 40, 30
+    with Image.open(rows[0][0]) as img:
+        thumb_height = round(img.height * thumb_width / img.width)
+    
+    columns = len(column_names)
+    sheet = Image.new('RGB', (padding + columns * (thumb_width + padding),
+                              header_height + len(rows) * (label_height + thumb_height + padding)), 'white')
+    draw = ImageDraw.Draw(sheet)
+    for column, name in enumerate(column_names):
+        draw.text((padding + column * (thumb_width + padding), padding), name, fill='#333333', font=font)
+    
+    y = header_height
+    for files, label in zip(rows, labels):
+        draw.text((padding, y + 4), label, fill='#777777', font=font)
+        y += label_height
+        for column, path in enumerate(files):
+            with Image.open(path) as img:
+                img.draft('RGB', (thumb_width, 1))  # JPEGs decode at reduced scale
+                thumb = img.convert('RGB')
+            if thumb.size != (thumb_width, thumb_height):
+                thumb = thumb.resize((thumb_width, thumb_height), Image.Resampling.BILINEAR)
+            sheet.paste(thumb, (padding + column * (thumb_width + padding), y))
+        y += thumb_height + padding
+    return sheet
+
+
+def generate_theme_samples(workers=THEME_SAMPLE_WORKERS, preview=False, samples=1, output_path="theme_samples",
+                           contact_sheet=True):
+    """
+    Generate sample posts for all themes to help you choose
+    
+    The corpus is loaded once and each sample hadith is laid out once; its slides are
+    then rasterized in every theme as one batch across workers. With preview, slides
+    are rendered at PREVIEW_SCALE as quick JPEGs (same pagination as the full render)
+    
+    Args:
+        workers: Number of processes (None = all cores)
+        samples: Number of sample hadiths, spread evenly over the corpus (first one first)
+        contact_sheet: Also write contact_sheet.jpg comparing the themes side by side
+    
+    Returns:
+        Dict with the rendered files ({theme: [files]}) and the contact sheet path (or None)
+    """
     print("🎨 Generating theme samples...\n")
     
-    os.makedirs("theme_samples", exist_ok=True)
+    os.makedirs(output_path, exist_ok=True)
+    
+    generator = HadithPostGenerator(DEFAULT_THEME, load_data=False)
+    generator.hadiths = get_sahih_hadiths()
+    samples = min(samples, len(generator.hadiths))
+    sample_indices = sorted({i * len(generator.hadiths) // samples for i in range(samples)})
+    
+    plans = []
+    for sample_index in sample_indices:
+        # Same image for every theme so samples compare fairly (and re-runs hit the render cache)
+        sample_image = LOCAL_IMAGES.get(generator.hadiths[sample_index].get('category'), LOCAL_IMAGES['default'])
+        try:
+            plans.append(generator.plan_post(output_path, specific_index=sample_index, formats=["feed"],
+                                             image_path=sample_image))
+        except ValueError as e:
+            print(f"⏭️  Skipping sample: {e}")
+    
+    theme_names = list(THEMES)
+    print(f"\n🖌️  {len(plans)} sample hadith(s) in {len(theme_names)} themes: "
+          f"{', '.join(THEMES[name]['name'] for name in theme_names)}")
+    # Hadith by hadith, so consecutive slides share the overlay strip and words
+    jobs = [make_theme_job(job, theme_name) for plan in plans for theme_name in theme_names for job in plan['jobs']]
+    if preview:
+        jobs = [make_preview_job(job) for job in jobs]
+    filenames = render_slide_jobs(jobs, workers or os.cpu_count() or 1)
+    
+    files = {}
+    for job, filename in zip(jobs, filenames):
+        files.setdefault(job['theme_name'], []).append(filename)
     
-    # Use the first hadith as sample for all themes
-    sample_index = 0
-    hadiths = get_sahih_hadiths()
+    sheet_path = None
+    if contact_sheet and plans:
+        first_slides = {}
+        for job, filename in zip(jobs, filenames):
+            if job['slide_num'] == 1:
+                first_slides[(job['index'], job['theme_name'])] = filename
+        rows = [[first_slides[(plan['index'], name)] for name in theme_names] for plan in plans]
+        labels = [f"#{plan['index']} {plan['hadith']['unique_id']} ({len(plan['jobs'])} slide(s))" for plan in plans]
+        sheet = build_contact_sheet(rows, labels, [THEMES[name]['name'] for name in theme_names])
+        sheet_path = os.path.join(output_path, "contact_sheet.jpg")
+        sheet.save(sheet_path, 'JPEG', quality=PREVIEW_JPEG_QUALITY)
+        print(f"🗂️  Contact sheet: {sheet_path} ({sheet.width}x{sheet.height})")
     
-    for theme_name, theme_config in THEMES.items():
-        print(f"Creating sample for: {theme_config['name']}")
-        generator = HadithPostGenerator(theme_name)
-        output_path = generator.generate_post("theme_samples", specific_index=sample_index)
-        print()
+    sprite_stats = WORD_SPRITES.stats()
+    if sprite_stats['hits'] or sprite_stats['misses']:
+        print(f"🔤 Word sprites: {sprite_stats['sprites']} cached ({sprite_stats['bytes'] / 1024 / 1024:.1f} MB), "
+              f"{sprite_stats['hit_rate']:.0%} hit rate, {sprite_stats['evictions']} evicted")
     
-    print("✅ All theme samples generated in 'theme_samples' folder!")
+    print(f"✅ All theme samples generated in '{output_path}' folder! ({len(filenames)} images)")
     print("📂 Review them and choose your favorite theme")
-    print(f"📚 Using {len(hadiths)} authenticated Sahih hadiths")
+    print(f"📚 Using {len(generator.hadiths)} authenticated Sahih hadiths")
+    return {'files': files, 'contact_sheet': sheet_path}
 
 
 if __name__ == "__main__":
     # Uncomment ONE of the options below:
     
-    # Option 1: Generate theme samples to choose from
-    generate_theme_samples()
+    # Option 1: Generate theme samples to choose from (--preview for quick low-res samples,
+    # --samples N to compare the themes on N hadiths)
+    samples = int(sys.argv[sys.argv.index('--samples') + 1]) if '--samples' in sys.argv else 1
+    generate_theme_samples(preview='--preview' in sys.argv, samples=samples)
     
     # Option 2: Generate a single post with default theme
     # generator = HadithPostGenerator()
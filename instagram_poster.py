@@ -6,9 +6,13 @@ Posts generated hadith images to Instagram automatically
 ✅ Exact implementation from NectarFromQuran
 """
 
+import io
 import os
+import shutil
+import tempfile
 import time
 import random
+from contextlib import contextmanager
 from instagrapi import Client
 from instagrapi.exceptions import LoginRequired, TwoFactorRequired, ChallengeRequired, PhotoNotUpload
 from instagrapi.types import StoryLink
@@ -20,6 +24,24 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Files Instagram rejects - converted to JPEG before every upload
+CONVERT_SUFFIXES = ('.png', '.webp')
+
+
+def _is_upload_ready(image):
+    """True for a file path Instagram accepts as-is (anything but PNG/WebP)"""
+    return isinstance(image, (str, Path)) and Path(image).suffix.lower() not in CONVERT_SUFFIXES
+
+
+def _to_rgb(img):
+    """RGB copy of img for JPEG, transparent areas flattened onto white"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.split()[-1])
+        return rgb_img
+    return img.convert('RGB')
+
 class InstagramPoster:
     def __init__(self):
         self.username = os.getenv('INSTAGRAM_USERNAME')
@@ -97,29 +119,36 @@ class InstagramPoster:
             print(f"❌ Login failed: {e}")
             raise
     
-    def post_image(self, image_paths, caption, hashtags=None, share_to_story=True):
+    def post_image(self, image_paths, caption, hashtags=None, share_to_story=True, story_path=None):
         """
         Post image(s) to Instagram as single post or carousel
         Automatically shares to story with link if share_to_story=True
         
         Args:
-            image_paths: Single path or list of paths for carousel
+            image_paths: Single image or list for carousel - file paths, encoded JPEG
+                bytes or PIL Images (e.g. generate_post(in_memory=True) output)
             caption: Post caption
             hashtags: Optional hashtags list
             share_to_story: Whether to auto-share to story with link
+            story_path: Pre-rendered 1080x1920 story image (default: build one from the first slide)
         
         Returns:
             media object with .code attribute for URL
         """
         # Handle both single image and list
-        if isinstance(image_paths, str):
+        if isinstance(image_paths, (str, Path, bytes, Image.Image)):
             image_paths = [image_paths]
         
         # Verify all files exist
         for path in image_paths:
-            if not os.path.exists(path):
+            if isinstance(path, (str, Path)) and not os.path.exists(path):
                 raise FileNotFoundError(f"❌ Image not found: {path}")
         
+        # Instagram only takes JPEG: in-memory slides and PNG/WebP files are converted once
+        if not all(map(_is_upload_ready, image_paths)):
+            with self._upload_files(image_paths) as paths:
+                return self.post_image(paths, caption, hashtags, share_to_story, story_path)
+        
         # Build full caption with hashtags
         full_caption = caption
         if hashtags:
@@ -156,7 +185,7 @@ class InstagramPoster:
             if share_to_story:
                 print(f"\n📱 Sharing to story with link...")
                 self._human_delay(self.delay_before_story)
-                self.share_to_story(image_paths[0], post_url)
+                self.share_to_story(story_path or image_paths[0], post_url)
             
             return media
             
@@ -164,29 +193,52 @@ class InstagramPoster:
             print(f"❌ Failed to post: {e}")
             raise
     
+    @contextmanager
+    def _upload_files(self, images):
+        """
+        Yield an upload-ready JPEG path for every image: JPEG paths pass through,
+        JPEG bytes are written unchanged, and PNG/WebP files, other encoded bytes
+        and PIL Images are converted once into a temp directory that is removed
+        afterwards
+        
+        Every upload path (single post, carousel, story) goes through here, so
+        slides rendered with --image-format png/webp never reach Instagram as-is.
+        """
+        temp_dir = tempfile.mkdtemp(prefix='hadith_upload_')
+        try:
+            paths = []
+            for n, image in enumerate(images, 1):
+                if _is_upload_ready(image):
+                    paths.append(image)
+                    continue
+                path = os.path.join(temp_dir, f"slide{n}.jpg")
+                if isinstance(image, (str, Path)):
+                    with Image.open(image) as img:
+                        _to_rgb(img).save(path, 'JPEG', quality=95)
+                elif isinstance(image, Image.Image):
+                    _to_rgb(image).save(path, 'JPEG', quality=95)
+                else:
+                    img = Image.open(io.BytesIO(image))
+                    if img.format == 'JPEG':
+                        with open(path, 'wb') as f:
+                            f.write(image)
+                    else:
+                        _to_rgb(img).save(path, 'JPEG', quality=95)
+                paths.append(path)
+            yield paths
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
     def post_carousel(self, image_paths, caption):
         """Post multiple images as carousel"""
+        # Instagram carousels only support JPG - PNG/WebP slides are converted
+        # (slides rendered with --image-format jpeg upload as-is)
+        with self._upload_files(image_paths) as jpg_paths:
+            return self._upload_carousel([Path(path) for path in jpg_paths], caption)
+    
+    def _upload_carousel(self, jpg_paths, caption):
+        """Upload upload-ready JPEG paths as an album, re-logging in once if needed"""
         try:
-            # Convert to Path objects
-            paths = [Path(img) for img in image_paths]
-            
-            # Instagram carousels only support JPG - convert PNG to JPG
-            jpg_paths = []
-            for path in paths:
-                if path.suffix.lower() == '.png':
-                    jpg_path = path.with_suffix('.jpg')
-                    # Convert PNG to JPG
-                    img = Image.open(path)
-                    # Convert RGBA to RGB (remove alpha channel)
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                        rgb_img.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                        img = rgb_img
-                    img.save(jpg_path, 'JPEG', quality=95)
-                    jpg_paths.append(jpg_path)
-                else:
-                    jpg_paths.append(path)
-            
             print(f"📤 Uploading carousel with {len(jpg_paths)} slides...")
             
             # Add slight delay before carousel upload (appears more human)
@@ -204,11 +256,6 @@ class InstagramPoster:
             print(f"✅ Carousel posted successfully!")
             print(f"🔗 Media Code: {media.code}")
             
-            # Cleanup temporary JPG files
-            for orig_path, jpg_path in zip(paths, jpg_paths):
-                if orig_path != jpg_path and jpg_path.exists():
-                    jpg_path.unlink()
-            
             return media
             
         except PhotoNotUpload as e:
@@ -224,11 +271,6 @@ class InstagramPoster:
                     print(f"✅ Carousel posted successfully after re-login!")
                     print(f"🔗 Media Code: {media.code}")
                     
-                    # Cleanup temporary JPG files
-                    for orig_path, jpg_path in zip(paths, jpg_paths):
-                        if orig_path != jpg_path and jpg_path.exists():
-                            jpg_path.unlink()
-                    
                     return media
                 except Exception as retry_e:
                     print(f"❌ Re-login and retry failed: {retry_e}")
@@ -240,15 +282,6 @@ class InstagramPoster:
             print(f"❌ Carousel post failed: {e}")
             import traceback
             traceback.print_exc()
-            
-            # Cleanup temporary JPG files on error
-            try:
-                for orig_path, jpg_path in zip(paths, jpg_paths):
-                    if orig_path != jpg_path and jpg_path.exists():
-                        jpg_path.unlink()
-            except:
-                pass
-            
             raise
     
     def share_to_story(self, image_path, post_url=None):
@@ -257,13 +290,20 @@ class InstagramPoster:
         Optionally add a link sticker to the feed post
         Exact implementation from NectarFromQuran
         
+        A 1080x1920 image (e.g. the generator's "story" export) is uploaded as-is,
+        anything else is centered on a black story canvas with a "Tap to view" note
+        
         Args:
-            image_path: Path to image for story background
+            image_path: Story image or image for story background (path, bytes or PIL Image)
             post_url: URL to feed post (adds link sticker if provided)
         
         Returns:
             Story media pk or None if failed
         """
+        if not isinstance(image_path, (str, Path)):
+            with self._upload_files([image_path]) as paths:
+                return self.share_to_story(paths[0], post_url)
+        
         try:
             image_path = Path(image_path)
             if not image_path.exists():
@@ -275,6 +315,10 @@ class InstagramPoster:
             
             story_width = 1080
             story_height = 1920
+            if carousel_img.size == (story_width, story_height):
+                # Already rendered for stories - upload directly
+                return self._upload_story(str(image_path), post_url)
+            
             story_img = Image.new('RGB', (story_width, story_height), color=(0, 0, 0))
             
             # Center the carousel image vertically on story canvas
@@ -331,29 +375,16 @@ class InstagramPoster:
             draw.text((sub_x, sub_y), sub_text, font=font_small, fill=(200, 200, 200))
             
             # Save story image
-            story_path = str(image_path).replace('.png', '_story.png')
-            story_img.save(story_path)
+            story_path = os.path.splitext(str(image_path))[0] + '_story.jpg'
+            story_img.save(story_path, 'JPEG', quality=95)
             
-            print(f"📤 Uploading to story (1080x1920)...")
-            
-            # Upload to story with link
-            if post_url:
-                link = StoryLink(webUri=post_url)
-                media = self.client.photo_upload_to_story(
-                    path=story_path,
-                    links=[link]
-                )
-            else:
-                media = self.client.photo_upload_to_story(path=story_path)
-            
-            print(f"✅ Story posted successfully!")
-            print(f"🔗 Story PK: {media.pk}")
+            story_pk = self._upload_story(story_path, post_url)
             
             # Cleanup temp file
             if os.path.exists(story_path):
                 os.remove(story_path)
             
-            return media.pk
+            return story_pk
             
         except Exception as e:
             print(f"❌ Story post failed: {e}")
@@ -361,6 +392,29 @@ class InstagramPoster:
             traceback.print_exc()
             return None
     
+    def _upload_story(self, story_path, post_url=None):
+        """Upload a 1080x1920 image to the story, with a link sticker to post_url if given"""
+        if not _is_upload_ready(story_path):
+            # PNG/WebP story exports are converted to JPEG like feed slides
+            with self._upload_files([story_path]) as paths:
+                return self._upload_story(paths[0], post_url)
+        
+        print(f"📤 Uploading to story (1080x1920)...")
+        
+        # Upload to story with link
+        if post_url:
+            link = StoryLink(webUri=post_url)
+            media = self.client.photo_upload_to_story(
+                path=story_path,
+                links=[link]
+            )
+        else:
+            media = self.client.photo_upload_to_story(path=story_path)
+        
+        print(f"✅ Story posted successfully!")
+        print(f"🔗 Story PK: {media.pk}")
+        return media.pk
+    
     def test_connection(self):
         """Test if logged in and working"""
         try:
@@ -0,0 +1,164 @@
+"""
+Hadith Layout Index
+Exact slide count, line count and fit status of every hadith in the corpus,
+so selection can filter on them without laying anything out.
+
+✅ Keyed by the theme-independent layout settings + font files (any theme shares it)
+✅ One index per auto-fit slide target, so --auto-fit runs filter on auto-fitted counts
+✅ Incremental: only new or edited hadiths are laid out after a corpus refresh
+✅ Built in parallel across cores (see build_layout_index in generate_hadith_post.py)
+
+Usage:
+    python3 layout_index.py --audit     # List every hadith that overflows the carousel limit
+    python3 layout_index.py --stats     # Slide count distribution of the corpus
+    python3 layout_index.py --rebuild   # Re-measure the whole corpus
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import PIL
+
+from config import LAYOUT_INDEX_FILE, MAX_CAROUSEL_SLIDES
+from render_cache import settings_fingerprint
+
+# Bump when the layout code changes in a way the fingerprint can't see
+LAYOUT_INDEX_VERSION = 1
+
+# Settings that change colors or encoding but never a line break
+NON_LAYOUT_SETTINGS = {
+    'THEMES', 'DEFAULT_THEME', 'OUTPUT_IMAGE_FORMAT', 'JPEG_QUALITY', 'JPEG_PROGRESSIVE',
+    'JPEG_SUBSAMPLING', 'WEBP_QUALITY', 'SLIDE_BYTE_BUDGET_KB', 'MIN_ENCODE_QUALITY',
+    'PREVIEW_SCALE', 'PREVIEW_JPEG_QUALITY', 'TEXT_SHADOW', 'TEXT_SHADOW_OFFSET',
+    'TEXT_SHADOW_BLUR', 'TEXT_SHADOW_COLOR', 'IMAGE_OPACITY', 'WATERMARK_OPACITY',
+    'CHROME_LAYER_CACHE_SIZE', 'TEXT_SPRITE_CACHE_SIZE',
+}
+
+
+def text_key(text):
+    """Index key for a hadith text (edited hadiths get a new key)"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class LayoutIndex:
+    def __init__(self, path=LAYOUT_INDEX_FILE):
+        self.path = path
+        self.fingerprint = None
+        self.entries = {}
+
+    def layout_fingerprint(self, font_digests, fit_slides=None):
+        """
+        Hash of everything that decides line breaks and pagination (no theme colors)
+
+        Args:
+            fit_slides: Slide count the main text was auto-fitted to (None: configured size)
+        """
+        parts = {
+            'version': LAYOUT_INDEX_VERSION,
+            'pillow': PIL.__version__,
+            'settings': settings_fingerprint(exclude=NON_LAYOUT_SETTINGS),
+            'fonts': list(font_digests),
+            'fit_slides': fit_slides,
+        }
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def load(self, fingerprint):
+        """
+        Read the index file; entries measured under another fingerprint are dropped
+        Returns number of entries still valid
+        """
+        self.fingerprint = fingerprint
+        self.entries = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('fingerprint') == fingerprint:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError):
+            pass
+        return len(self.entries)
+
+    def missing(self, hadiths):
+        """Texts of hadiths without an entry (each text once)"""
+        texts = {}
+        for hadith in hadiths:
+            key = text_key(hadith['text'])
+            if key not in self.entries:
+                texts[key] = hadith['text']
+        return list(texts.values())
+
+    def update(self, texts, entries):
+        for text, entry in zip(texts, entries):
+            self.entries[text_key(text)] = entry
+
+    def get(self, hadith):
+        """{'slides', 'lines', 'size', 'fits'} for a hadith, or None if not measured"""
+        return self.entries.get(text_key(hadith['text']))
+
+    def save(self, hadiths=None):
+        """Write the index atomically, keeping only the given corpus's entries"""
+        if hadiths is not None:
+            keep = {text_key(hadith['text']) for hadith in hadiths}
+            self.entries = {key: entry for key, entry in self.entries.items() if key in keep}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fingerprint': self.fingerprint, 'entries': self.entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  Could not write layout index {self.path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def overflowing(self, hadiths):
+        """(index, hadith, entry) for every hadith needing more than MAX_CAROUSEL_SLIDES slides"""
+        result = []
+        for i, hadith in enumerate(hadiths):
+            entry = self.get(hadith)
+            if entry is not None and not entry['fits']:
+                result.append((i, hadith, entry))
+        return result
+
+
+def main():
+    from generate_hadith_post import build_layout_index
+    from hadith_data import get_sahih_hadiths
+
+    if not any(arg in sys.argv for arg in ('--audit', '--stats', '--rebuild')):
+        print("Usage:")
+        print("  python3 layout_index.py --audit")
+        print("  python3 layout_index.py --stats")
+        print("  python3 layout_index.py --rebuild")
+        return
+
+    hadiths = get_sahih_hadiths()
+    if '--rebuild' in sys.argv and os.path.exists(LAYOUT_INDEX_FILE):
+        os.remove(LAYOUT_INDEX_FILE)
+    index = build_layout_index(hadiths)
+
+    if '--stats' in sys.argv or '--rebuild' in sys.argv:
+        counts = {}
+        for hadith in hadiths:
+            slides = index.get(hadith)['slides']
+            counts[slides] = counts.get(slides, 0) + 1
+        print(f"📐 Layout index: {index.path} ({len(index.entries)} hadiths)")
+        for slides in sorted(counts):
+            print(f"   {slides:>2} slide(s): {counts[slides]} hadith(s)")
+
+    if '--audit' in sys.argv:
+        overflowing = index.overflowing(hadiths)
+        if not overflowing:
+            print(f"✅ Every hadith fits in {MAX_CAROUSEL_SLIDES} slides")
+            return
+        print(f"⚠️  {len(overflowing)} hadith(s) need more than {MAX_CAROUSEL_SLIDES} slides:")
+        for i, hadith, entry in overflowing:
+            print(f"   #{i} {hadith.get('base_id', '?')}: {entry['slides']} slides, {entry['lines']} lines, "
+                  f"{len(hadith['text'])} chars (main text {entry['size']}px)")
+
+
+if __name__ == "__main__":
+    main()
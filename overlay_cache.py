@@ -0,0 +1,239 @@
+"""
+Prepared Overlay Cache
+Stores ready-to-paste RGBA overlay strips (resized, center-cropped, faded)
+for the local images in images/nature and images/patterns.
+
+✅ Cache key = source file content + every config value that shapes the strip
+✅ Automatic invalidation when the image or IMAGE_* settings change
+✅ Compact lossless WebP on disk (PNG if Pillow has no WebP support)
+
+Usage:
+    python3 overlay_cache.py --warm     # Precompute all library images
+    python3 overlay_cache.py --stats    # Show cache size
+    python3 overlay_cache.py --clear    # Delete all cached strips
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from PIL import Image, features
+
+from config import (
+    IMAGE_FADE_CURVE, IMAGE_FADE_HEIGHT, IMAGE_HEIGHT, IMAGE_HEIGHT_RATIO,
+    IMAGE_OPACITY, IMAGE_WIDTH, OVERLAY_CACHE_DIR,
+)
+
+# Bump when the overlay preparation code changes in a way config can't express
+OVERLAY_CACHE_VERSION = 2  # 2: large sources decoded at reduced scale
+
+# Strips kept decoded in memory (per process) on top of the disk cache
+MEMORY_CACHE_SIZE = 8
+
+
+class OverlayCache:
+    def __init__(self, cache_dir=OVERLAY_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.extension = '.webp' if features.check('webp') else '.png'
+        self._digests = {}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def source_digest(self, image_path):
+        """
+        Content hash of the source image
+        Memoized per (path, mtime, size) so unchanged files are hashed once per process
+        and a fresh git checkout (new mtimes, same bytes) still hits the cache
+        """
+        stat = os.stat(image_path)
+        stamp = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(stamp)
+        if digest is None:
+            with open(image_path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            self._digests[stamp] = digest
+        return digest
+
+    def cache_key(self, image_path):
+        """Key covering the source file and all settings that affect the prepared strip"""
+        settings = {
+            'version': OVERLAY_CACHE_VERSION,
+            'source': self.source_digest(image_path),
+            'width': IMAGE_WIDTH,
+            'height': IMAGE_HEIGHT,
+            'height_ratio': IMAGE_HEIGHT_RATIO,
+            'opacity': IMAGE_OPACITY,
+            'fade_height': IMAGE_FADE_HEIGHT,
+            'fade_curve': IMAGE_FADE_CURVE,
+        }
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, key + self.extension)
+
+    def get(self, image_path, builder, compact=False, scale=1):
+        """
+        Return the prepared RGBA strip for image_path
+
+        Args:
+            image_path: Source image in images/nature or images/patterns
+            builder: Function(image_path) -> RGBA strip or None, used on cache miss
+            compact: Spend more time encoding a miss for a smaller file (used by --warm)
+            scale: Preview tier - the full strip resampled (bilinear) by this factor,
+                kept in memory only
+
+        The returned image is shared - paste it, don't modify it.
+        """
+        if not os.path.exists(image_path):
+            strip = builder(image_path)
+            return self.scale_strip(strip, scale) if strip and scale != 1 else strip
+
+        key = self.cache_key(image_path)
+        if scale != 1:
+            with self._lock:
+                strip = self._memory.get((key, scale))
+                if strip is not None:
+                    self._memory.move_to_end((key, scale))
+                    return strip
+            strip = self.get(image_path, builder, compact)
+            if strip is None:
+                return None
+            strip = self.scale_strip(strip, scale)
+            with self._lock:
+                self._memory[(key, scale)] = strip
+                while len(self._memory) > MEMORY_CACHE_SIZE:
+                    self._memory.popitem(last=False)
+            return strip
+
+        with self._lock:
+            strip = self._memory.get(key)
+            if strip is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return strip
+
+        path = self.cache_path(key)
+        strip = None
+        if os.path.exists(path):
+            try:
+                with Image.open(path) as cached:
+                    strip = cached.convert('RGBA')
+                self.hits += 1
+            except Exception as e:
+                print(f"⚠️  Ignoring unreadable overlay cache file {path}: {e}")
+
+        if strip is None:
+            self.misses += 1
+            strip = builder(image_path)
+            if strip is None:
+                return None
+            self.save(path, strip, compact)
+
+        with self._lock:
+            self._memory[key] = strip
+            while len(self._memory) > MEMORY_CACHE_SIZE:
+                self._memory.popitem(last=False)
+        return strip
+
+    def scale_strip(self, strip, scale):
+        """Cheap resample of a prepared strip for the preview tier"""
+        return strip.resize((round(strip.width * scale), round(strip.height * scale)), Image.Resampling.BILINEAR)
+
+    def save(self, path, strip, compact=False):
+        """
+        Write a strip atomically (concurrent cron/parallel renders never see partial files)
+        Live misses use the fastest lossless encoder so a miss costs about as much as
+        building the strip; compact=True trades ~10x encode time for ~15% smaller files
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self.extension == '.webp':
+                if compact:
+                    strip.save(tmp_path, 'WEBP', lossless=True)
+                else:
+                    strip.save(tmp_path, 'WEBP', lossless=True, method=0, quality=0)
+            else:
+                strip.save(tmp_path, 'PNG', compress_level=6 if compact else 1)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️  Could not write overlay cache file {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def warm(self, image_paths, builder):
+        """Precompute strips for all images, returns number newly built"""
+        built = 0
+        for image_path in image_paths:
+            if os.path.exists(self.cache_path(self.cache_key(image_path))):
+                print(f"   ✓ {image_path}")
+                continue
+            if self.get(image_path, builder, compact=True) is not None:
+                built += 1
+                print(f"   ✅ {image_path}")
+        return built
+
+    def stats(self):
+        """Number of cached strips and their total size on disk"""
+        files = self._cache_files()
+        total_bytes = sum(os.path.getsize(f) for f in files)
+        return {'files': len(files), 'bytes': total_bytes}
+
+    def clear(self):
+        """Delete all cached strips, returns number of files removed"""
+        files = self._cache_files()
+        for f in files:
+            os.remove(f)
+        with self._lock:
+            self._memory.clear()
+        return len(files)
+
+    def _cache_files(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(('.webp', '.png'))
+        ]
+
+
+def main():
+    cache = OverlayCache()
+
+    if '--clear' in sys.argv:
+        removed = cache.clear()
+        print(f"🗑️  Removed {removed} cached overlay(s) from {cache.cache_dir}")
+        return
+
+    if '--stats' in sys.argv:
+        stats = cache.stats()
+        print(f"📦 Overlay cache: {cache.cache_dir}")
+        print(f"   Files: {stats['files']}")
+        print(f"   Size: {stats['bytes'] / 1024 / 1024:.1f} MB")
+        return
+
+    if '--warm' in sys.argv:
+        from generate_hadith_post import HadithPostGenerator
+
+        generator = HadithPostGenerator()
+        image_paths = sorted(generator.get_all_available_images())
+        print(f"🔥 Warming overlay cache for {len(image_paths)} images...")
+        built = cache.warm(image_paths, generator.build_overlay)
+        stats = cache.stats()
+        print(f"✅ Built {built} new overlay(s), {stats['files']} cached ({stats['bytes'] / 1024 / 1024:.1f} MB)")
+        return
+
+    print("Usage:")
+    print("  python3 overlay_cache.py --warm")
+    print("  python3 overlay_cache.py --stats")
+    print("  python3 overlay_cache.py --clear")
+
+
+if __name__ == "__main__":
+    main()
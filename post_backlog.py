@@ -0,0 +1,168 @@
+"""
+Pre-rendered Post Backlog
+Upcoming posts rendered ahead of time (python3 create_post.py --prerender N),
+so a scheduled --post run only has to upload.
+
+✅ Manifest of ready posts in scheduled order (hadith, theme, image, slide files)
+✅ Items rendered under other settings, run options, theme or fonts are never posted (--prerender replaces them)
+✅ Hadiths posted (or edited) since pre-rendering are dropped automatically
+
+Usage:
+    python3 post_backlog.py --list      # Show the ready posts
+    python3 post_backlog.py --clear     # Delete the backlog
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+import PIL
+
+from config import BACKLOG_DIR
+from layout_index import text_key
+from render_cache import settings_fingerprint
+
+# Bump when the rendering code changes in a way the fingerprint can't see
+BACKLOG_VERSION = 1
+
+MANIFEST_FILE = 'manifest.json'
+
+
+class PostBacklog:
+    def __init__(self, backlog_dir=BACKLOG_DIR):
+        self.backlog_dir = backlog_dir
+        self.manifest_path = os.path.join(backlog_dir, MANIFEST_FILE)
+
+    def fingerprint(self, theme_name, font_digests, options=None):
+        """
+        Hash of everything a finished post depends on besides its hadith and image
+
+        Args:
+            options: Per-run options the slides were rendered with (formats, encoding,
+                auto-fit - see generate_hadith_post.backlog_options)
+        """
+        parts = {
+            'version': BACKLOG_VERSION,
+            'pillow': PIL.__version__,
+            'settings': settings_fingerprint(),
+            'theme': theme_name,
+            'fonts': list(font_digests),
+            'options': options or {},
+        }
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def load(self):
+        """Backlog items in posting order"""
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f).get('items', [])
+        except (OSError, ValueError):
+            return []
+
+    def save(self, items):
+        os.makedirs(self.backlog_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'items': items}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def make_item(self, hadith, index, theme_name, fingerprint, image_path, files):
+        """
+        Manifest entry for a rendered post
+
+        Args:
+            files: {format: [slide files]} as rendered (feed first)
+        """
+        return {
+            'base_id': hadith['base_id'],
+            'unique_id': hadith['unique_id'],
+            'index': index,
+            'text_key': text_key(hadith['text']),
+            'theme': theme_name,
+            'fingerprint': fingerprint,
+            'image': image_path,
+            'files': files,
+            'rendered': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def stale_reason(self, item, fingerprint, posted_ids, hadiths_by_id):
+        """Why an item can't be posted as rendered, or None if it is ready (fingerprint None: not checked)"""
+        hadith = hadiths_by_id.get(item['unique_id'])
+        if item['base_id'] in posted_ids:
+            return 'already posted'
+        if hadith is None or text_key(hadith['text']) != item['text_key']:
+            return 'hadith changed or removed'
+        if fingerprint is not None and item['fingerprint'] != fingerprint:
+            return 'rendered with other settings, options, theme or fonts'
+        if not all(os.path.exists(path) for files in item['files'].values() for path in files):
+            return 'slide files missing'
+        return None
+
+    def prune(self, fingerprint, posted_ids, hadiths):
+        """
+        Drop (and delete) items that are no longer ready, returns the ready ones
+        With fingerprint None only posted, edited or incomplete items are dropped
+        """
+        hadiths_by_id = {hadith['unique_id']: hadith for hadith in hadiths}
+        items = self.load()
+        ready = []
+        for item in items:
+            reason = self.stale_reason(item, fingerprint, posted_ids, hadiths_by_id)
+            if reason:
+                print(f"🗑️  Backlog: dropping {item['unique_id']} ({reason})")
+                self.delete_files(item)
+            else:
+                ready.append(item)
+        if len(ready) != len(items):
+            self.save(ready)
+        return ready
+
+    def remove(self, item):
+        """Take a posted item out of the backlog and delete its slides"""
+        self.save([other for other in self.load() if other['unique_id'] != item['unique_id']])
+        self.delete_files(item)
+
+    def delete_files(self, item):
+        for files in item['files'].values():
+            for path in files:
+                for sidecar in (path, os.path.splitext(path)[0] + '.json'):
+                    if os.path.exists(sidecar):
+                        os.remove(sidecar)
+
+    def clear(self):
+        """Delete every item and the manifest, returns number of items removed"""
+        items = self.load()
+        for item in items:
+            self.delete_files(item)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        return len(items)
+
+
+def main():
+    backlog = PostBacklog()
+
+    if '--clear' in sys.argv:
+        removed = backlog.clear()
+        print(f"🗑️  Removed {removed} pre-rendered post(s) from {backlog.backlog_dir}")
+        return
+
+    if '--list' in sys.argv:
+        items = backlog.load()
+        print(f"📦 Post backlog: {backlog.backlog_dir} ({len(items)} post(s))")
+        for position, item in enumerate(items, 1):
+            slides = len(item['files'].get('feed', []))
+            print(f"   {position}. {item['unique_id']} - {slides} slide(s), theme {item['theme']}, "
+                  f"rendered {item['rendered']}")
+        return
+
+    print("Usage:")
+    print("  python3 post_backlog.py --list")
+    print("  python3 post_backlog.py --clear")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Finished Slide Cache
+Stores rendered slides so re-runs, posting retries and theme samples
+skip rasterizing slides that have not changed.
+
+✅ Content-addressed: key = hadith + theme + every config.py setting + font files
+   + overlay image + the slide's display list + output encoding, byte budget and preview scale
+✅ Size-bounded on disk, least recently used slides evicted first
+✅ Hit rate persisted across runs (see --stats)
+
+Usage:
+    python3 render_cache.py --stats     # Show hit rate and disk usage
+    python3 render_cache.py --clear     # Delete all cached slides
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+
+import PIL
+
+import config
+from config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB
+
+# Bump when the rendering code changes in a way the cache key can't see
+RENDER_CACHE_VERSION = 2  # 2: large sources decoded at reduced scale (draft/reduce)
+
+# Settings that never change a rendered pixel (kept out of the key)
+NON_RENDER_SETTINGS = {
+    'RENDER_WORKERS', 'USE_OVERLAY_CACHE', 'OVERLAY_CACHE_DIR',
+    'USE_RENDER_CACHE', 'RENDER_CACHE_DIR', 'RENDER_CACHE_MAX_MB', 'OUTPUT_FORMATS',
+    'LAYOUT_INDEX_FILE', 'LAYOUT_INDEX_WORKERS', 'USE_WORD_SPRITES', 'WORD_SPRITE_CACHE_MB',
+    'BACKLOG_DIR', 'BACKLOG_WORKERS', 'THEME_SAMPLE_WORKERS', 'CONTACT_SHEET_THUMB_WIDTH',
+    'RENDER_DAEMON_SOCKET', 'RENDER_DAEMON_MAX_JOBS', 'RENDER_DAEMON_MAX_QUEUE',
+}
+
+STATS_FILE = 'stats.json'
+
+
+def settings_fingerprint(exclude=()):
+    """Hash of every uppercase setting in config.py that can affect rendering (minus exclude)"""
+    settings = {
+        name: value for name, value in vars(config).items()
+        if name.isupper() and name not in NON_RENDER_SETTINGS and name not in exclude
+    }
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, cache_dir=RENDER_CACHE_DIR, max_bytes=RENDER_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._digests = {}
+        self._settings = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def file_digest(self, path):
+        """
+        Content hash of a font or image file
+        Memoized per (path, mtime, size) so unchanged files are hashed once per process
+        """
+        if not path or not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        stamp = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(stamp)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            self._digests[stamp] = digest
+        return digest
+
+    def cache_key(self, job, theme, font_paths):
+        """
+        Key covering everything that shapes one finished slide
+
+        Args:
+            job: Slide job from plan_post() (hadith, layout, selected image, output mode)
+            theme: The job's theme dict
+            font_paths: Font files the slide is drawn with
+        """
+        if self._settings is None:
+            self._settings = settings_fingerprint()
+        hadith = job['hadith']
+        parts = {
+            'version': RENDER_CACHE_VERSION,
+            'pillow': PIL.__version__,
+            'hadith': [hadith.get('unique_id'), hadith.get('text')],
+            'theme': theme,
+            'settings': self._settings,
+            'fonts': [self.file_digest(path) for path in font_paths],
+            'overlay': self.file_digest(job.get('selected_image_path')),
+            'layout': job['layout'],
+            'in_memory': bool(job.get('in_memory')),
+            'encoding': [job.get('image_format'), job.get('budget_kb'), job.get('preview_scale')],
+        }
+        return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def cache_path(self, key, job):
+        """Cached slide file (jobs from render_slide_jobs() always name their image_format)"""
+        return os.path.join(self.cache_dir, f"{key}.{job['image_format']}")
+
+    def fetch(self, key, job):
+        """
+        Serve a cached slide the way render_slide_job() would return it
+        (bytes for in-memory jobs, else the job's filename after copying the slide there)
+        Returns None on a miss
+        """
+        path = self.cache_path(key, job)
+        try:
+            if job.get('in_memory'):
+                with open(path, 'rb') as f:
+                    result = f.read()
+                if job.get('filename'):
+                    with open(job['filename'], 'wb') as f:
+                        f.write(result)
+            else:
+                shutil.copyfile(path, job['filename'])
+                result = job['filename']
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def store(self, key, job, result):
+        """Keep a freshly rendered slide (render_slide_job() result), atomically"""
+        path = self.cache_path(key, job)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if isinstance(result, bytes):
+                with open(tmp_path, 'wb') as f:
+                    f.write(result)
+            else:
+                shutil.copyfile(result, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️  Could not write render cache file {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self):
+        """Delete least recently used slides until the cache fits max_bytes, returns count removed"""
+        files = []
+        for f in self._cache_files():
+            try:
+                files.append((os.path.getmtime(f), os.path.getsize(f), f))
+            except OSError:
+                continue  # Removed by another process or thread meanwhile
+        total_bytes = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, f in sorted(files):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(f)
+            except OSError:
+                continue
+            total_bytes -= size
+            removed += 1
+        return removed
+
+    def record(self):
+        """Add this process's hits/misses to the persisted totals (shown by --stats)"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            self.hits = self.misses = 0
+        if not hits and not misses:
+            return
+
+        totals = self._load_totals()
+        totals['hits'] += hits
+        totals['misses'] += misses
+        os.makedirs(self.cache_dir, exist_ok=True)
+        stats_path = os.path.join(self.cache_dir, STATS_FILE)
+        tmp_path = f"{stats_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(totals, f)
+            os.replace(tmp_path, stats_path)
+        except OSError as e:
+            print(f"⚠️  Could not write render cache stats: {e}")
+
+    def stats(self):
+        """Cached slides, their total size on disk and the recorded hit rate"""
+        files = self._cache_files()
+        totals = self._load_totals()
+        lookups = totals['hits'] + totals['misses']
+        return {
+            'files': len(files),
+            'bytes': sum(os.path.getsize(f) for f in files),
+            'hits': totals['hits'],
+            'misses': totals['misses'],
+            'hit_rate': totals['hits'] / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Delete all cached slides and the recorded stats, returns number of slides removed"""
+        files = self._cache_files()
+        for f in files:
+            os.remove(f)
+        stats_path = os.path.join(self.cache_dir, STATS_FILE)
+        if os.path.exists(stats_path):
+            os.remove(stats_path)
+        return len(files)
+
+    def _load_totals(self):
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE)) as f:
+                totals = json.load(f)
+            return {'hits': int(totals.get('hits', 0)), 'misses': int(totals.get('misses', 0))}
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def _cache_files(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(('.png', '.jpeg', '.webp'))
+        ]
+
+
+def main():
+    cache = RenderCache()
+
+    if '--clear' in sys.argv:
+        removed = cache.clear()
+        print(f"🗑️  Removed {removed} cached slide(s) from {cache.cache_dir}")
+        return
+
+    if '--stats' in sys.argv:
+        stats = cache.stats()
+        print(f"📦 Render cache: {cache.cache_dir}")
+        print(f"   Slides: {stats['files']}")
+        print(f"   Size: {stats['bytes'] / 1024 / 1024:.1f} MB (limit {cache.max_bytes / 1024 / 1024:.0f} MB)")
+        print(f"   Hit rate: {stats['hit_rate']:.0%} ({stats['hits']} hits, {stats['misses']} misses)")
+        return
+
+    print("Usage:")
+    print("  python3 render_cache.py --stats")
+    print("  python3 render_cache.py --clear")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Warm Render Daemon
+Long-running render service over a local Unix socket: the corpus, fonts, prepared
+overlays, word sprites and per-theme generators stay loaded between renders,
+so an interactive preview only pays for drawing (and nothing on a render cache hit).
+
+✅ Render any hadith in any theme/format (paths or JPEG bytes) - never staged or posted
+✅ Concurrency limit: RENDER_DAEMON_MAX_JOBS renders at once, a bounded queue, then "busy"
+✅ Graceful reload: restarts itself once in-flight renders finish when config.py
+   or the hadith database changes
+
+Usage:
+    python3 render_daemon.py --serve                    # Start the daemon (foreground)
+    python3 render_daemon.py --render bukhari:1 --theme sage_green --preview
+    python3 render_daemon.py --render 5 --formats feed,story --bytes
+    python3 render_daemon.py --stats                    # Render counts and timings
+    python3 render_daemon.py --reload                   # Restart after in-flight renders
+    python3 render_daemon.py --stop
+
+Protocol: one JSON request line per connection, one JSON response line back
+({"cmd": "render", "hadith": ..., "theme": ..., "formats": [...], "preview": bool,
+"bytes": bool, "output": dir}); see send_request() for batch tooling.
+"""
+
+import base64
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+from config import RENDER_DAEMON_MAX_JOBS, RENDER_DAEMON_MAX_QUEUE, RENDER_DAEMON_SOCKET, USE_RENDER_CACHE
+
+# Seconds between checks of the watched files (config.py, hadith database)
+RELOAD_POLL_SECONDS = 1.0
+
+# How long a client keeps retrying while the daemon restarts
+CONNECT_RETRY_SECONDS = 10.0
+
+
+def send_request(request, socket_path=RENDER_DAEMON_SOCKET, retry_seconds=CONNECT_RETRY_SECONDS):
+    """
+    Send one request to the daemon, returns its response dict
+    Raises ConnectionError when no daemon answers within retry_seconds
+    """
+    deadline = time.monotonic() + retry_seconds
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            if time.monotonic() >= deadline:
+                raise ConnectionError(f"No render daemon at {socket_path} "
+                                      f"(start one: python3 render_daemon.py --serve)")
+            time.sleep(0.1)  # Restarting after a reload
+
+    with sock:
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            response = {'ok': False, 'error': 'invalid JSON request'}
+        else:
+            response = self.server.render_daemon.handle_request(request)
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+    # server_close() waits for in-flight requests (graceful stop and reload)
+    block_on_close = True
+
+
+class RenderDaemon:
+    def __init__(self, socket_path=RENDER_DAEMON_SOCKET, max_jobs=RENDER_DAEMON_MAX_JOBS,
+                 max_queue=RENDER_DAEMON_MAX_QUEUE, use_cache=USE_RENDER_CACHE):
+        self.socket_path = socket_path
+        self.max_jobs = max_jobs
+        self.max_queue = max_queue
+        self.use_cache = use_cache
+        self.server = None
+        self.reload_requested = False
+        self._lock = threading.Lock()
+        self._plan_lock = threading.Lock()
+        self._stopping = threading.Event()
+        # One set of per-theme generators per render slot (their layer caches aren't shared)
+        self._slots = queue.Queue()
+        for _ in range(max_jobs):
+            self._slots.put({})
+        self._pending = 0
+        self.started = time.time()
+        self.requests = 0
+        self.renders = 0
+        self.errors = 0
+        self.refused = 0
+        self.render_seconds = 0.0
+
+    def warm(self):
+        """Load everything a render needs once: corpus, fonts, generators, overlay strips"""
+        import generate_hadith_post
+        from config import LOCAL_IMAGES, THEMES
+        from hadith_data import DATABASE_FILE
+
+        self.gen = generate_hadith_post
+        self.watched = ['config.py', str(DATABASE_FILE)]
+        self.planner = generate_hadith_post.HadithPostGenerator(load_data=False)
+        self.planner.hadiths = generate_hadith_post.get_sahih_hadiths()
+        generate_hadith_post._init_render_worker()
+        # Build the per-theme generators each render slot renders with
+        slots = [self._slots.get() for _ in range(self.max_jobs)]
+        for slot in slots:
+            for theme_name in THEMES:
+                if theme_name not in slot:
+                    slot[theme_name] = generate_hadith_post.HadithPostGenerator(theme_name, load_data=False)
+            self._slots.put(slot)
+        for image_path in dict.fromkeys(LOCAL_IMAGES.values()):
+            if os.path.exists(image_path):
+                self.planner.prepare_overlay(image_path)
+        self._stamps = self.file_stamps()
+
+    def file_stamps(self):
+        return [os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in self.watched]
+
+    def find_hadith(self, hadith):
+        """Corpus index for an index, unique_id ('muslim:251a') or base_id ('muslim:251')"""
+        hadiths = self.planner.hadiths
+        if isinstance(hadith, int) or str(hadith).isdigit():
+            index = int(hadith)
+            return index if 0 <= index < len(hadiths) else None
+        for key in ('unique_id', 'base_id'):
+            for index, candidate in enumerate(hadiths):
+                if candidate.get(key) == hadith:
+                    return index
+        return None
+
+    def handle_request(self, request):
+        with self._lock:
+            self.requests += 1
+        cmd = request.get('cmd', 'render')
+        if cmd == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+        if cmd == 'stats':
+            return dict(self.stats(), ok=True)
+        if cmd in ('stop', 'reload'):
+            print(f"🛑 {cmd.capitalize()} requested - finishing in-flight renders...")
+            self.stop(reload=cmd == 'reload')
+            return {'ok': True}
+        if cmd != 'render':
+            return {'ok': False, 'error': f"unknown command {cmd!r}"}
+
+        with self._lock:
+            if self._pending >= self.max_jobs + self.max_queue:
+                self.refused += 1
+                return {'ok': False, 'error': 'busy', 'pending': self._pending}
+            self._pending += 1
+        try:
+            slot = self._slots.get()
+            try:
+                return self.render(request, slot)
+            finally:
+                self._slots.put(slot)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"❌ Render failed: {e}")
+            return {'ok': False, 'error': str(e)}
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def render(self, request, slot):
+        """Lay out (shared planner) and rasterize (this slot's generator) one hadith"""
+        from config import DEFAULT_THEME, EXPORT_FORMATS, LOCAL_IMAGES, THEMES
+        gen = self.gen
+        start = time.perf_counter()
+
+        index = self.find_hadith(request.get('hadith', 0))
+        if index is None:
+            return {'ok': False, 'error': f"unknown hadith {request.get('hadith')!r}"}
+        theme_name = request.get('theme') or DEFAULT_THEME
+        if theme_name not in THEMES:
+            return {'ok': False, 'error': f"unknown theme {theme_name!r}"}
+        formats = request.get('formats') or ['feed']
+        unknown = [name for name in formats if name not in EXPORT_FORMATS]
+        if unknown:
+            return {'ok': False, 'error': f"unknown format(s) {', '.join(unknown)}"}
+
+        output_path = request.get('output') or 'output'
+        as_bytes = bool(request.get('bytes'))
+        if not as_bytes:
+            os.makedirs(output_path, exist_ok=True)
+        hadith = self.planner.hadiths[index]
+        # Fixed image per category (no usage tracking), like theme samples
+        image_path = request.get('image') or LOCAL_IMAGES.get(hadith.get('category'), LOCAL_IMAGES['default'])
+        with self._plan_lock:
+            plan = self.planner.plan_post(output_path, specific_index=index, formats=formats, image_path=image_path)
+
+        jobs = [gen.make_theme_job(job, theme_name) for job in plan['jobs']]
+        if request.get('preview'):
+            jobs = [gen.make_preview_job(job) for job in jobs]
+        if as_bytes:
+            jobs = [dict(job, in_memory=True, image_format='jpeg', filename=None) for job in jobs]
+        generator = slot.get(theme_name)
+        if generator is None:
+            generator = slot[theme_name] = gen.HadithPostGenerator(theme_name, load_data=False)
+        results = gen.render_slide_jobs(jobs, 1, generator=generator, use_cache=self.use_cache)
+
+        outputs = {}
+        for job, result in zip(jobs, results):
+            if as_bytes:
+                result = base64.b64encode(result).decode('ascii')
+            outputs.setdefault(job['format'], []).append(result)
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.renders += 1
+            self.render_seconds += elapsed
+        print(f"🖨️  {plan['hadith']['unique_id']} in {theme_name} ({len(jobs)} slide(s)) in {elapsed * 1000:.0f} ms")
+        return {
+            'ok': True,
+            'hadith': plan['hadith']['unique_id'],
+            'index': plan['index'],
+            'theme': theme_name,
+            'data' if as_bytes else 'files': outputs,
+            'ms': round(elapsed * 1000, 1),
+        }
+
+    def stats(self):
+        sprite_stats = self.gen.WORD_SPRITES.stats()
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started),
+            'requests': self.requests,
+            'renders': self.renders,
+            'errors': self.errors,
+            'refused': self.refused,
+            'pending': self._pending,
+            'avg_ms': round(self.render_seconds / self.renders * 1000, 1) if self.renders else None,
+            'word_sprite_hit_rate': round(sprite_stats['hit_rate'], 3),
+        }
+
+    def watch(self):
+        """Reload once a watched file changes (config.py, hadith database)"""
+        while not self._stopping.wait(RELOAD_POLL_SECONDS):
+            if self.file_stamps() != self._stamps:
+                print("🔄 Settings or hadiths changed - reloading after in-flight renders...")
+                self.stop(reload=True)
+                return
+
+    def stop(self, reload=False):
+        self.reload_requested = self.reload_requested or reload
+        self._stopping.set()
+        # shutdown() blocks until serve_forever() returns, so never call it on the serving thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def serve(self):
+        """Serve until stopped; re-executes this process when a reload was requested"""
+        try:
+            send_request({'cmd': 'ping'}, self.socket_path, retry_seconds=0)
+            print(f"⚠️  A render daemon is already listening on {self.socket_path}")
+            return
+        except ConnectionError:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)  # Left behind by a daemon that died
+
+        start = time.perf_counter()
+        self.warm()
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        self.server = _DaemonServer(self.socket_path, _RequestHandler)
+        self.server.render_daemon = self
+        threading.Thread(target=self.watch, daemon=True).start()
+        print(f"🔥 Render daemon warm in {time.perf_counter() - start:.1f}s, listening on {self.socket_path} "
+              f"({self.max_jobs} concurrent render(s), queue {self.max_queue})")
+
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stopping.set()
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+        if self.reload_requested:
+            print("🔄 Restarting render daemon...")
+            sys.stdout.flush()
+            os.execv(sys.executable, [sys.executable] + sys.argv)
+        print("👋 Render daemon stopped")
+
+
+def _arg(name, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+
+def main():
+    if '--serve' in sys.argv:
+        RenderDaemon().serve()
+        return
+
+    try:
+        if '--render' in sys.argv:
+            formats = _arg('--formats')
+            response = send_request({
+                'cmd': 'render',
+                'hadith': _arg('--render'),
+                'theme': _arg('--theme'),
+                'formats': formats.split(',') if formats else None,
+                'preview': '--preview' in sys.argv,
+                'bytes': '--bytes' in sys.argv,
+                'output': _arg('--output'),
+            })
+            if not response['ok']:
+                print(f"❌ {response['error']}")
+                sys.exit(1)
+            print(f"✅ {response['hadith']} in {response['theme']} rendered in {response['ms']} ms")
+            for name, results in response.get('files', {}).items():
+                for path in results:
+                    print(f"   {name}: {path}")
+            for name, results in response.get('data', {}).items():
+                for slide_num, data in enumerate(results, 1):
+                    print(f"   {name} slide {slide_num}: {len(base64.b64decode(data)) / 1024:.0f} KB")
+            return
+
+        for flag in ('--stats', '--reload', '--stop'):
+            if flag in sys.argv:
+                response = send_request({'cmd': flag[2:]}, retry_seconds=0)
+                if flag == '--stats':
+                    print(f"📊 Render daemon (pid {response['pid']}, up {response['uptime']}s)")
+                    for key in ('requests', 'renders', 'errors', 'refused', 'pending', 'avg_ms',
+                                'word_sprite_hit_rate'):
+                        print(f"   {key}: {response[key]}")
+                else:
+                    print(f"✅ Render daemon {flag[2:]} requested")
+                return
+    except ConnectionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print("Usage:")
+    print("  python3 render_daemon.py --serve")
+    print("  python3 render_daemon.py --render HADITH [--theme NAME] [--formats feed,story] "
+          "[--preview] [--bytes] [--output DIR]")
+    print("  python3 render_daemon.py --stats | --reload | --stop")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,927 @@
+#!/usr/bin/env python3
+"""
+Render Pipeline Test Suite
+Checks that the fast rendering helpers produce the same pixels as the
+original per-pixel implementations, and that the caches and tools built
+on them stay consistent:
+1. Gradient backgrounds (vectorized + cached)
+2. Overlay fade mask (replaces getpixel/putpixel loop)
+3. Overlay cache round trip and invalidation, large sources decoded at reduced scale
+4. Cached-width line wrapping (replaces quadratic re-measuring)
+5. Balanced carousel pagination (replaces greedy split_text_balanced)
+6. Highlight tokenizer (replaces the per-term str.find scan)
+7. Styled-run widths and wrapping (bold highlights measured in bold), thread-safe measurer caches
+8. Slide display lists (one layout, rasterized in any theme)
+9. Export formats (feed and story share wrapped lines, one-page story teaser)
+10. Parallel rendering (process pool matches the serial path)
+11. In-memory rendering and encoding (JPEG/WebP, per-slide byte budget)
+12. Text and word sprites, single-pass shadows
+13. Render cache hits and eviction
+14. Previews (reduced scale, same pagination) and auto-fit main text size
+15. Layout index (slide counts for selection, incremental updates, auto-fit)
+16. Pre-rendered post backlog (posting order, stale items, run options)
+17. Theme samples and contact sheet
+18. Render daemon (warm generators, paths and bytes)
+
+Run directly (python3 test_render_pipeline.py) or via pytest.
+"""
+
+import base64
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from config import (
+    EXPORT_FORMATS, HIGHLIGHT_TERMS, IMAGE_OPACITY, LINE_SPACING, PAGE_FILL_RATIO, PREVIEW_SCALE, THEMES,
+)
+import generate_hadith_post
+from generate_hadith_post import (
+    HadithPostGenerator, WordSprites, build_contact_sheet, build_fade_mask, build_gradient, build_layout_index,
+    encode_image, make_preview_job, make_theme_job, render_slide_jobs, scale_layout,
+)
+from hadith_data import get_sahih_hadiths, load_verified_hadiths
+from layout_index import LayoutIndex
+from overlay_cache import OverlayCache
+from post_backlog import PostBacklog
+from render_cache import RenderCache
+from render_daemon import RenderDaemon, send_request
+import text_layout
+from text_layout import HighlightTokenizer, RunMeasurer, TextMeasurer, line_text, paginate_lines
+
+
+def legacy_gradient(color1, color2, width, height):
+    """Original draw.line gradient from create_gradient_background"""
+    img = Image.new('RGB', (width, height))
+    draw = ImageDraw.Draw(img)
+    for y in range(height):
+        factor = y / height
+        r = int(color1[0] * (1 - factor) + color2[0] * factor)
+        g = int(color1[1] * (1 - factor) + color2[1] * factor)
+        b = int(color1[2] * (1 - factor) + color2[2] * factor)
+        draw.line([(0, y), (width, y)], fill=(r, g, b))
+    return img
+
+
+def legacy_fade(overlay_img, width, overlay_height, fade_height=60):
+    """Original opacity + getpixel/putpixel fade from add_image_overlay"""
+    overlay_img = overlay_img.convert('RGBA')
+    alpha = overlay_img.split()[3]
+    alpha = alpha.point(lambda p: int(p * IMAGE_OPACITY))
+    overlay_img.putalpha(alpha)
+    for y in range(fade_height):
+        alpha_value = int(255 * IMAGE_OPACITY * (1 - y / fade_height))
+        for x in range(width):
+            if y < overlay_height:
+                pixel = overlay_img.getpixel((x, overlay_height - fade_height + y))
+                overlay_img.putpixel((x, overlay_height - fade_height + y),
+                                     (pixel[0], pixel[1], pixel[2], alpha_value))
+    return overlay_img
+
+
+def legacy_wrap(text, font, max_width):
+    """Original wrap_text: re-measures the whole growing line for every word"""
+    lines = []
+    for paragraph in text.split('\n'):
+        current_line = []
+        for word in paragraph.split():
+            bbox = font.getbbox(' '.join(current_line + [word]))
+            if bbox[2] - bbox[0] <= max_width:
+                current_line.append(word)
+            else:
+                if current_line:
+                    lines.append(' '.join(current_line))
+                current_line = [word]
+        if current_line:
+            lines.append(' '.join(current_line))
+    return lines
+
+
+def legacy_highlight_runs(text, terms):
+    """Original draw_text_with_arabic_symbols scan, returning the runs it would draw"""
+    symbol = 'ﷺ'
+    phrases = [term for term in terms if ' ' in term]
+    words = [term for term in terms if ' ' not in term]
+    runs = []
+    remaining = text
+    while remaining:
+        earliest_pos, found, found_type = len(remaining), None, None
+        for phrase in phrases:
+            pos = remaining.find(phrase)
+            if pos != -1 and pos < earliest_pos:
+                earliest_pos, found, found_type = pos, phrase, 'accent'
+        for candidate, kind in ((f"({symbol})", 'bracketed_symbol'), (symbol, 'symbol')):
+            pos = remaining.find(candidate)
+            if pos != -1 and pos < earliest_pos:
+                earliest_pos, found, found_type = pos, candidate, kind
+        for word in words:
+            pos = 0
+            while pos < len(remaining):
+                pos = remaining.find(word, pos)
+                if pos == -1:
+                    break
+                before_ok = pos == 0 or remaining[pos-1] in ' \n\t.,;:!?\'"'
+                after_ok = (pos + len(word) >= len(remaining) or
+                            remaining[pos + len(word)] in ' \n\t.,;:!?\'"\'s')
+                if before_ok and after_ok and pos < earliest_pos:
+                    earliest_pos, found, found_type = pos, word, 'accent'
+                    break
+                pos += 1
+        if earliest_pos > 0:
+            runs.append((remaining[:earliest_pos], 'regular'))
+        if earliest_pos >= len(remaining):
+            break
+        runs.append((found, found_type))
+        remaining = remaining[earliest_pos + len(found):]
+    return runs
+
+
+def max_difference(img_a, img_b):
+    """Largest per-channel difference between two images"""
+    diff = ImageChops.difference(img_a, img_b)
+    return max(high for _, high in diff.getextrema())
+
+
+def test_gradient_matches_legacy():
+    generator = HadithPostGenerator(load_data=False)
+    for theme_name, theme in THEMES.items():
+        color1 = generator.hex_to_rgb(theme['bg_colors'][0])
+        color2 = generator.hex_to_rgb(theme['bg_colors'][1])
+        fast = build_gradient([color1, color2], 120, 300)
+        legacy = legacy_gradient(color1, color2, 120, 300)
+        assert max_difference(fast, legacy) == 0, theme_name
+        print(f"   ✅ {theme['name']}: gradient identical")
+
+
+def test_gradient_multi_stop():
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
+    img = build_gradient(colors, 10, 100, [0.0, 0.5, 1.0])
+    assert img.getpixel((0, 0)) == (255, 0, 0)
+    assert img.getpixel((0, 50)) == (0, 255, 0)
+    assert img.getpixel((9, 99))[2] > 240  # last row is 99% of the way to blue
+    print("   ✅ Multi-stop gradient hits every stop")
+
+
+def test_fade_mask_matches_legacy():
+    random.seed(7)
+    width, height = 200, 90
+    source = Image.new('RGB', (width, height))
+    source.putdata([(random.randrange(256), random.randrange(256), random.randrange(256))
+                    for _ in range(width * height)])
+
+    legacy = legacy_fade(source, width, height)
+    fast = source.convert('RGBA')
+    fast.putalpha(build_fade_mask(width, height, IMAGE_OPACITY, 60, 'linear'))
+
+    # Alpha must match within 1 level (float rounding) and colors exactly
+    assert max_difference(fast, legacy) <= 1
+    print("   ✅ Fade mask matches per-pixel fade (±1 alpha)")
+
+
+def test_overlay_cache_roundtrip_and_invalidation():
+    generator = HadithPostGenerator(load_data=False)
+    builds = []
+
+    def builder(path):
+        builds.append(path)
+        return generator.build_overlay(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'photo.png')
+        Image.new('RGB', (400, 300), (10, 120, 200)).save(source)
+
+        cache = OverlayCache(os.path.join(tmp, 'cache'))
+        first = cache.get(source, builder)
+        cache._memory.clear()  # Force the next lookup to read from disk
+        second = cache.get(source, builder)
+        assert len(builds) == 1
+        assert max_difference(first, second) == 0
+        print("   ✅ Cached strip is lossless and reused")
+
+        # Changing the source file must invalidate the entry
+        Image.new('RGB', (400, 300), (200, 40, 10)).save(source)
+        os.utime(source, (0, 0))
+        third = cache.get(source, builder)
+        assert len(builds) == 2
+        assert third.getpixel((0, 0))[:3] == (200, 40, 10)
+        print("   ✅ Edited source image is rebuilt")
+
+
+def test_large_sources_decode_at_reduced_scale():
+    generator = HadithPostGenerator(load_data=False)
+    library = generator.build_overlay('images/nature/alpine_mountain_view.jpg')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        big = Image.open('images/nature/alpine_mountain_view.jpg').resize((4320, 5400))
+        for name in ('big.jpg', 'big.png', 'big_palette.png'):
+            path = os.path.join(tmp, name)
+            source = big.quantize(256) if name == 'big_palette.png' else big  # reduce() can't do palettes
+            source.save(path, quality=95)
+            cover = (library.width, library.height)
+            img = generator.load_local_image(path, cover_size=cover)
+            # Smallest scale that still covers the strip, file already closed
+            assert 1080 <= img.width < 2160 and getattr(img, 'fp', None) is None
+
+            strip = generator.build_overlay(path)
+            assert strip.size == library.size
+            if source is big:
+                assert max_difference(strip, library) < 48
+            else:
+                diff = ImageChops.difference(strip.convert('RGB'), library.convert('RGB'))
+                assert max(ImageStat.Stat(diff).mean) < 8
+    print("   ✅ Large overlay sources decode at reduced scale")
+
+
+def test_wrap_matches_legacy_on_corpus():
+    generator = HadithPostGenerator(load_data=False)
+    font = generator.get_font('main_text')
+    measurer = TextMeasurer(font)
+    # Every other hadith keeps the (quadratic) legacy reference reasonably fast
+    texts = [h['text'] for h in load_verified_hadiths()][::2]
+
+    for max_width in (840, 400):
+        for text in texts:
+            wrapped = measurer.wrap(text, max_width)
+            assert [line for line, _ in wrapped] == legacy_wrap(text, font, max_width)
+            for line, width in wrapped:
+                bbox = font.getbbox(line)
+                assert width == bbox[2] - bbox[0]
+    print(f"   ✅ {len(texts)} hadiths wrap identically at 2 widths")
+
+
+def test_paginate_balances_and_prefers_sentence_ends():
+    # 13 lines, 6 per slide -> 3 slides; greedy would give 6/6/1
+    lines = [(f"line {i} of text", None) for i in range(13)]
+    pages = paginate_lines(lines, 10, 60)
+    assert [len(p['lines']) for p in pages] in ([4, 4, 5], [4, 5, 4], [5, 4, 4])
+    assert sum((p['lines'] for p in pages), []) == lines
+    assert pages[0]['height'] == len(pages[0]['lines']) * 10
+
+    # A sentence end one line off the even split wins over breaking mid-sentence
+    lines = [(f"word {i}", None) for i in range(12)]
+    lines[4] = ("end of a sentence.", None)
+    pages = paginate_lines(lines, 10, 80)
+    assert [len(p['lines']) for p in pages] == [5, 7]
+    print("   ✅ Pages balanced, sentence boundary preferred")
+
+
+def test_paginate_corpus_fits_and_keeps_text():
+    generator = HadithPostGenerator(load_data=False)
+    font = generator.get_font('main_text')
+    line_height = font.getbbox('A')[3] * LINE_SPACING
+    for hadith in load_verified_hadiths():
+        pages = generator.paginate_text(hadith['text'], font, 600, 860)
+        words = sum((line_text(line).split() for p in pages for line, _ in p['lines']), [])
+        assert words == hadith['text'].split()
+        capacity = int(600 * PAGE_FILL_RATIO // line_height)
+        assert all(0 < len(p['lines']) <= capacity for p in pages)
+        # Minimum slide count, and no slide dwarfed by another
+        total = sum(len(p['lines']) for p in pages)
+        assert len(pages) == max(1, -(-total // capacity))
+        sizes = [len(p['lines']) for p in pages]
+        assert max(sizes) - min(sizes) <= max(2, capacity // 2)
+    print("   ✅ Corpus paginated within capacity, no words lost")
+
+
+def test_highlight_tokenizer_matches_legacy():
+    generator = HadithPostGenerator(load_data=False)
+    font = generator.get_font('main_text')
+    tokenizer = HighlightTokenizer(HIGHLIGHT_TERMS)
+    samples = [
+        "The Messenger of Allah (ﷺ) said: Allah's Messenger ﷺ and the Prophet's",
+        "Allahu Akbar, Prophethood; (ﷺ)ﷺAllah.Allah Messengers",
+    ]
+    for hadith in load_verified_hadiths():
+        samples += [line for line, _ in TextMeasurer(font).wrap(hadith['text'], 860, measure=False)]
+
+    for text in samples:
+        assert tokenizer.tokenize(text) == legacy_highlight_runs(text, HIGHLIGHT_TERMS), text
+    print(f"   ✅ {len(samples)} lines tokenized exactly like the legacy scan")
+
+
+def test_run_wrap_uses_true_styled_widths():
+    generator = HadithPostGenerator(load_data=False)
+    font = generator.get_font('main_text')
+    measurer = generator.get_run_measurer(font)
+    # Same wrapper with every candidate line measured exactly
+    exact = RunMeasurer(measurer.main.font, measurer.bold.font, measurer.symbol.font)
+    exact.slack = float('inf')
+
+    for hadith in load_verified_hadiths():
+        runs = generator.tokenize_text(hadith['text'])
+        wrapped = measurer.wrap(runs, 860)
+        assert wrapped == exact.wrap(runs, 860)
+        assert ' '.join(line_text(line) for line, _ in wrapped).split() == hadith['text'].split()
+        for line, width in wrapped:
+            assert width == measurer.line_width(line)
+            assert width <= 860 or len(line_text(line).split()) == 1
+
+    # Lines without highlights break exactly like plain text
+    plain = TextMeasurer(font).wrap("a b c " * 60, 300)
+    assert [line_text(line) for line, _ in measurer.wrap([("a b c " * 60, 'regular')], 300)] == \
+        [line for line, _ in plain]
+
+    # A phrase keeps one run per line, even when the wrap splits it
+    styled = measurer.wrap(generator.tokenize_text("said the Messenger of Allah"), 250)
+    assert all(run == (line_text(line), 'accent') for line, _ in styled[1:] for run in line)
+    print("   ✅ Styled lines wrap by exact width (bold and symbols included)")
+
+
+def test_run_width_matches_drawn_pixels():
+    generator = HadithPostGenerator(load_data=False)
+    main_font = generator.get_font('main_text')
+    symbol_font = generator.get_font('symbol')
+    for text in ["The Messenger of Allah (ﷺ) said: pray", "Allah's Messenger ﷺ", "plain words only"]:
+        runs = generator.tokenize_text(text)
+        width = generator.get_run_measurer(main_font).line_width(runs)
+        img = Image.new('RGBA', (1400, 120), (0, 0, 0, 0))
+        generator.draw_text_runs(ImageDraw.Draw(img), 100, 20, runs, main_font, symbol_font, (0, 0, 0))
+        right_edge = img.getbbox()[2] - 100
+        # Trailing SYMBOL_SPACING is advance, not ink
+        assert abs(right_edge - width) <= 4, (text, right_edge, width)
+    print("   ✅ Run widths match the drawn extent")
+
+
+def test_measurer_caches_are_thread_safe():
+    # Daemon render slots share the measurer caches: hammer tiny LRUs from several threads
+    generator = HadithPostGenerator(load_data=False)
+    font = generator.get_font('main_text')
+    fonts = [generator.get_font('main_text', size) for size in range(30, 46)]
+    words = load_verified_hadiths()[0]['text'].split()[:64]
+    expected = {word: TextMeasurer(font).text_width(word) for word in words}
+    measurer = TextMeasurer(font)
+    errors = []
+
+    def measure(seed):
+        rng = random.Random(seed)
+        try:
+            for word in rng.choices(words, k=2000):
+                if measurer.text_width(word) != expected[word]:
+                    errors.append(word)
+                sized = rng.choice(fonts)
+                if text_layout.get_measurer(sized).font.size != sized.size:
+                    errors.append(sized.size)
+        except Exception as e:
+            errors.append(e)
+
+    cache_sizes = text_layout.MEASURE_CACHE_SIZE, text_layout.MEASURER_CACHE_SIZE
+    switch_interval = sys.getswitchinterval()
+    try:
+        text_layout.MEASURE_CACHE_SIZE = text_layout.MEASURER_CACHE_SIZE = 8
+        sys.setswitchinterval(1e-6)  # switch threads often enough to interleave get/move_to_end
+        workers = [threading.Thread(target=measure, args=(seed,)) for seed in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        text_layout.MEASURE_CACHE_SIZE, text_layout.MEASURER_CACHE_SIZE = cache_sizes
+        sys.setswitchinterval(switch_interval)
+    assert not errors, errors[:3]
+    print("   ✅ Measurer caches stay consistent under concurrent renders")
+
+
+def test_display_list_is_theme_independent_and_serializable():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+    layout = generator.layout_slide(hadith, lines[:5], 1, 2)
+
+    # Colors are roles, never concrete theme values
+    colors = {item['color'] for item in layout['chrome'] + layout['content'] if 'color' in item}
+    assert not any(color.startswith('#') for color in colors)
+    assert any(item.get('blend') for item in layout['chrome'])  # Swipe indicator on slide 1 of 2
+
+    # A JSON round trip rasterizes to the same pixels
+    restored = json.loads(json.dumps(layout))
+    first = generator.rasterize_layout(layout)
+    generator._chrome_layers.clear()
+    assert max_difference(first, generator.rasterize_layout(restored)) == 0
+
+    # The same layout renders in another theme
+    other = HadithPostGenerator(list(THEMES)[1], load_data=False).rasterize_layout(restored)
+    assert other.size == first.size and max_difference(first, other) > 0
+    print("   ✅ Layout serializes to JSON and rasterizes in any theme")
+
+
+def test_export_formats_share_wrapped_lines():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+
+    heights = {}
+    for name, spec in EXPORT_FORMATS.items():
+        layout = generator.layout_slide(hadith, lines[:5], 1, 2, export_format=name)
+        assert (layout['width'], layout['height']) == spec['size']
+        assert generator.rasterize_layout(layout).size == spec['size']
+
+        # Same wrapped runs in every format, only positions move
+        runs = [item['runs'] for item in layout['content'] if item['type'] == 'runs']
+        assert [line_text(line) for line in runs[:4]] == [line_text(line) for line, _ in lines[:4]]
+
+        # Reference, watermark and swipe stay above the bottom inset
+        bottom = spec['size'][1] - spec.get('bottom_inset', 0)
+        assert all(item['y'] < bottom for item in layout['chrome'] if item['type'] == 'text')
+        heights[name] = generator.text_area_height(bottom)
+
+    assert heights['square'] < heights['feed'] < heights['story']
+
+    # Stories can't be swiped: one teaser page of a long hadith, pointing to the post
+    generator.hadiths = [dict(hadith, text=hadith['text'] * 3)]
+    plan = generator.plan_post(specific_index=0, formats=['feed', 'story'],
+                               image_path='images/nature/alpine_mountain_view.jpg')
+    story = [job for job in plan['jobs'] if job['format'] == 'story']
+    assert len(story) == 1 and story[0]['kind'] == 'single' and len(plan['jobs']) > 3
+    notes = [item['text'] for item in story[0]['layout']['chrome'] if item.get('color') == 'swipe']
+    assert notes == ["Tap to view the full hadith →"]
+    last_line = [item['runs'] for item in story[0]['layout']['content'] if item['type'] == 'runs'][-1]
+    assert not line_text(last_line).endswith('...')
+    print("   ✅ Feed, square and story lay out the same wrapped lines; the story is a one-page teaser")
+
+
+def test_text_sprites_match_direct_drawing_and_are_reused():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+    layout = generator.layout_slide(hadith, lines[:5], 1, 2)
+    background = generator.create_gradient_background(layout['width'], layout['height'])
+
+    for item in layout['chrome'] + layout['content']:
+        if item['type'] != 'text' or item.get('blend'):
+            continue
+        expected = background.copy()
+        font = generator.get_font(item['font'], item['size'], item['bold'])
+        ImageDraw.Draw(expected).text((item['x'], item['y']), item['text'],
+                                      fill=generator.resolve_color(item['color']), font=font)
+        drawn = generator.draw_layout_items(background.copy(), [item], background.size)
+        assert max_difference(drawn, expected) == 0, item['text']
+
+    # Other formats and the last slide reuse the same sprites
+    sprites = len(generator._text_sprites)
+    for name in EXPORT_FORMATS:
+        generator.rasterize_layout(generator.layout_slide(hadith, lines[:5], 2, 2, export_format=name))
+    assert len(generator._text_sprites) == sprites + 1  # Only "Continuation:" is new
+    print("   ✅ Text sprites draw like draw.text and are shared across slides")
+
+
+def test_single_pass_shadow_composites_real_alpha():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+    layout = generator.layout_slide(hadith, lines[:5], 1, 2)
+    background = generator.draw_layout_items(None, layout['chrome'], (layout['width'], layout['height']))
+    plain = generator.draw_layout_items(background.copy(), layout['content'], background.size)
+
+    def with_shadow(color, blur=0):
+        generator.resolve_color = lambda role, resolve=HadithPostGenerator.resolve_color: (
+            color if role == 'shadow' else resolve(generator, role))
+        shadow = {'offset': [2, 2], 'blur': blur, 'color': 'shadow'}
+        return generator.draw_layout_items(background.copy(), layout['content'], background.size, shadow)
+
+    # Text drawn through the coverage masks matches direct drawing exactly
+    assert max_difference(with_shadow((0, 0, 0, 0)), plain) == 0
+
+    # Alpha is honored: a faint shadow darkens less than an opaque one
+    faint = ImageChops.difference(with_shadow((0, 0, 0, 30)), plain).getextrema()
+    opaque = ImageChops.difference(with_shadow((0, 0, 0, 255)), plain).getextrema()
+    assert 0 < max(high for _, high in faint) < max(high for _, high in opaque)
+
+    # A blurred shadow spreads beyond the crisp one
+    crisp = ImageChops.difference(with_shadow((0, 0, 0, 255)), plain).convert('L').point(lambda v: v > 0 and 255)
+    soft = ImageChops.difference(with_shadow((0, 0, 0, 255), blur=3), plain).convert('L').point(lambda v: v > 0 and 255)
+    assert soft.histogram()[255] > crisp.histogram()[255]
+    print("   ✅ Shadow derived from one text pass, with real alpha and blur")
+
+
+def test_parallel_render_matches_serial():
+    generator = HadithPostGenerator(load_data=False)
+    generator.hadiths = [dict(hadith, primary_source='Sahih al-Bukhari 1') for hadith in load_verified_hadiths()[:2]]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = []
+        for i, theme_name in enumerate([generator.theme_name, 'sage_green']):
+            plan = generator.plan_post(tmp, specific_index=i, formats=['feed', 'story'],
+                                       image_path='images/nature/alpine_mountain_view.jpg')
+            jobs.extend(make_theme_job(job, theme_name) for job in plan['jobs'])
+        assert len(jobs) > 2
+
+        # Same jobs into two directories, serially and across a process pool (no cache)
+        rendered = {}
+        for workers in (1, 2):
+            out = os.path.join(tmp, f'workers{workers}')
+            os.makedirs(out)
+            worker_jobs = [dict(job, filename=os.path.join(out, os.path.basename(job['filename']))) for job in jobs]
+            filenames = render_slide_jobs(worker_jobs, workers, use_cache=False)
+            assert filenames == [job['filename'] for job in worker_jobs]  # Job order kept
+            rendered[workers] = []
+            for filename in filenames:
+                with open(filename, 'rb') as f:
+                    rendered[workers].append(f.read())
+        assert rendered[1] == rendered[2]
+    print("   ✅ Parallel rendering returns the serial slides, byte for byte and in job order")
+
+
+def test_in_memory_render_matches_disk_render():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+    layout = generator.layout_slide(hadith, lines[:5], 1, 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        png = generator.render_slide_job({'layout': layout, 'filename': os.path.join(tmp, 'slide.png')})
+        data = generator.render_slide_job({'layout': layout, 'filename': None, 'in_memory': True})
+        archived = generator.render_slide_job({'layout': layout, 'filename': os.path.join(tmp, 'slide.jpg'),
+                                               'in_memory': True})
+
+        # Upload-ready JPEG bytes, archived to disk unchanged
+        assert data[:2] == b'\xff\xd8' and archived == data
+        with open(os.path.join(tmp, 'slide.jpg'), 'rb') as f:
+            assert f.read() == data
+
+        decoded = Image.open(io.BytesIO(data))
+        assert decoded.format == 'JPEG'
+        assert max_difference(decoded.convert('RGB'), Image.open(png).convert('RGB')) < 64
+    print("   ✅ In-memory slides are JPEG bytes matching the disk render")
+
+
+def test_encode_image_formats_and_byte_budget():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+    img = generator.rasterize_layout(generator.layout_slide(hadith, lines[:5], 1, 2))
+
+    png = encode_image(img, 'png', budget_kb=1)  # Lossless ignores the budget
+    assert max_difference(Image.open(io.BytesIO(png)).convert('RGB'), img) == 0
+    for image_format in ('jpeg', 'webp'):
+        full = encode_image(img, image_format, budget_kb=None)
+        assert Image.open(io.BytesIO(full)).format == image_format.upper()
+
+        budget_kb = len(full) * 3 // 4 // 1024
+        fitted = encode_image(img, image_format, budget_kb=budget_kb)
+        assert len(fitted) <= budget_kb * 1024
+        assert max_difference(Image.open(io.BytesIO(fitted)).convert('RGB'), img) < 128
+
+    # File names always carry the extension of the bytes inside
+    generator.hadiths = [hadith]
+    output_format = generate_hadith_post.OUTPUT_IMAGE_FORMAT
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            generate_hadith_post.OUTPUT_IMAGE_FORMAT = 'jpeg'
+            plan = generator.plan_post(tmp, specific_index=0, formats=['feed'],
+                                       image_path='images/nature/alpine_mountain_view.jpg')
+            assert all(job['filename'].endswith('.jpg') for job in plan['jobs'])
+            sample = render_slide_jobs([make_theme_job(plan['jobs'][0], 'sage_green')], use_cache=False)[0]
+            single = generator.render_slide_job({'layout': plan['jobs'][0]['layout'],
+                                                 'filename': os.path.join(tmp, 'single.png')})
+        finally:
+            generate_hadith_post.OUTPUT_IMAGE_FORMAT = output_format
+        for path in (sample, single):
+            assert path.endswith('.jpg') and Image.open(path).format == 'JPEG'
+    print("   ✅ Slides encode as PNG/JPEG/WebP within a byte budget, named to match")
+
+
+def test_render_cache_hits_and_evicts():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RenderCache(os.path.join(tmp, 'renders'))
+        job = {'hadith': hadith, 'theme_name': generator.theme_name, 'selected_image_path': None,
+               'layout': generator.layout_slide(hadith, lines[:5], 1, 2), 'filename': os.path.join(tmp, 'a.png'),
+               'image_format': 'png'}
+        theme = THEMES[generator.theme_name]
+        key = cache.cache_key(job, theme, [])
+
+        # Anything that changes the pixels changes the key
+        assert cache.cache_key(dict(job), dict(theme), []) == key
+        assert cache.cache_key(job, THEMES[list(THEMES)[1]], []) != key
+        assert cache.cache_key(dict(job, layout=generator.layout_slide(hadith, lines[:4], 1, 2)), theme, []) != key
+        assert cache.cache_key(dict(job, in_memory=True), theme, []) != key
+
+        assert cache.fetch(key, job) is None
+        cache.store(key, job, generator.render_slide_job(job))
+        retry = dict(job, filename=os.path.join(tmp, 'b.png'))
+        assert cache.fetch(key, retry) == retry['filename']
+        with open(job['filename'], 'rb') as a, open(retry['filename'], 'rb') as b:
+            assert a.read() == b.read()
+
+        cache.record()
+        stats = cache.stats()
+        assert (stats['files'], stats['hits'], stats['misses']) == (1, 1, 1) and stats['hit_rate'] == 0.5
+
+        # Least recently used slides go first once over the size limit
+        cache.store('0' * 40, job, job['filename'])
+        os.utime(cache.cache_path(key, job), (1, 1))
+        cache.max_bytes = stats['bytes']
+        assert cache.evict() == 1
+        assert cache.fetch(key, job) is None and cache.fetch('0' * 40, job) is not None
+    print("   ✅ Render cache keys, hits and LRU eviction")
+
+
+def test_preview_keeps_pagination_at_reduced_scale():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+    layout = generator.layout_slide(hadith, lines[:5], 1, 2, 'images/nature/alpine_mountain_view.jpg')
+
+    # Same lines and runs, only positions and sizes scaled
+    small = scale_layout(layout, PREVIEW_SCALE)
+    runs = [item for item in layout['content'] if item['type'] == 'runs']
+    small_runs = [item for item in small['content'] if item['type'] == 'runs']
+    assert [item['runs'] for item in small_runs] == [item['runs'] for item in runs]
+    assert small_runs[0]['size'] == round(runs[0]['size'] * PREVIEW_SCALE)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        job = {'layout': layout, 'filename': os.path.join(tmp, 'slide.png')}
+        full = Image.open(generator.render_slide_job(job)).convert('RGB')
+        preview_job = make_preview_job(job)
+        assert preview_job['layout'] is layout and preview_job['filename'].endswith('slide_preview.jpg')
+
+        preview = Image.open(generator.render_slide_job(preview_job))
+        assert preview.format == 'JPEG'
+        assert preview.size == (round(full.width * PREVIEW_SCALE), round(full.height * PREVIEW_SCALE))
+        reference = full.resize(preview.size, Image.Resampling.LANCZOS)
+        assert max(ImageStat.Stat(ImageChops.difference(preview.convert('RGB'), reference)).mean) < 12
+
+        # A preview post is a dry run: nothing staged, image rotation untouched
+        generator.hadiths = [dict(hadith, unique_id='bukhari:1', base_id='bukhari:1')]
+        generator.image_usage_file = os.path.join(tmp, 'image_usage.json')
+        files, _, _ = generator.generate_post(tmp, specific_index=0, formats=['feed'], use_cache=False, preview=True)
+        assert all(path.endswith('_preview.jpg') for path in files)
+        assert not generator.image_usage and not os.path.exists(generator.image_usage_file)
+        assert not generator.posted_ids
+    print("   ✅ Previews render the same pagination at reduced scale, as a dry run")
+
+
+def test_auto_fit_reaches_target_slide_count():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(max(load_verified_hadiths(), key=lambda h: len(h['text'])), primary_source='Sahih al-Bukhari 1')
+    generator.hadiths = [hadith]
+    runs = generator.tokenize_text(hadith['text'])
+    default_font = generator.get_font('main_text')
+    default_slides = len(generator.paginate_formats(runs, ['feed'], default_font)['feed'][1])
+
+    # Largest size that reaches the target, verified by an exact re-wrap
+    target = default_slides - 2
+    size, count = generator.fit_main_text_size(runs, target, sizes=(30, default_font.size))
+    assert size < default_font.size and count <= target
+    pages = generator.paginate_formats(runs, ['feed'], generator.get_font('main_text', size))['feed'][1]
+    assert len(pages) == count
+    larger = generator.paginate_formats(runs, ['feed'], generator.get_font('main_text', size + 2))['feed'][1]
+    assert len(larger) > target
+
+    # Already within the target: the largest size is kept
+    assert generator.fit_main_text_size(runs, default_slides)[0] == default_font.size
+
+    plan = generator.plan_post(specific_index=0, formats=['feed'], image_path='images/nature/alpine_mountain_view.jpg',
+                               auto_fit=True, max_slides=target)
+    assert len(plan['jobs']) <= target
+    sizes = {item['size'] for job in plan['jobs'] for item in job['layout']['content'] if item['type'] == 'runs'}
+    assert sizes == {size}
+    print(f"   ✅ Auto-fit: {default_slides} slides at {default_font.size}px -> {count} at {size}px")
+
+
+def test_layout_index_matches_plan_and_updates_incrementally():
+    generator = HadithPostGenerator(load_data=False)
+    generator.hadiths = [dict(hadith, primary_source='Sahih al-Bukhari 1') for hadith in load_verified_hadiths()[:6]]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = build_layout_index(generator.hadiths, workers=1, index=LayoutIndex(os.path.join(tmp, 'index.json')))
+        for i, hadith in enumerate(generator.hadiths):
+            plan = generator.plan_post(specific_index=i, formats=['feed'],
+                                       image_path='images/nature/alpine_mountain_view.jpg')
+            entry = index.get(hadith)
+            assert entry['slides'] == len(plan['jobs']) and entry['fits']
+            assert entry['lines'] == sum(
+                1 for job in plan['jobs'] for item in job['layout']['content'] if item['type'] == 'runs')
+
+        # Reloaded from disk; an edited hadith is the only one measured again
+        reloaded = LayoutIndex(index.path)
+        assert reloaded.load(index.fingerprint) == len(generator.hadiths)
+        edited = generator.hadiths[:5] + [dict(generator.hadiths[5], text=generator.hadiths[5]['text'] * 12)]
+        assert reloaded.missing(edited) == [edited[5]['text']]
+        build_layout_index(edited, workers=1, index=reloaded)
+        assert len(reloaded.entries) == len(edited)
+        assert [i for i, _, _ in reloaded.overflowing(edited)] == [5]
+
+        # An explicitly requested hadith that overflows is an error, not a silent substitute
+        generator.hadiths = edited
+        try:
+            generator.plan_post(tmp, specific_index=5, formats=['feed'],
+                                image_path='images/nature/alpine_mountain_view.jpg')
+            assert False, "overflowing specific index was replaced"
+        except ValueError:
+            pass
+        assert not generator.skipped_ids
+
+        # Other layout settings or fonts: nothing carries over
+        assert reloaded.load('another fingerprint') == 0
+
+        # Auto-fit runs are judged by their auto-fitted slide counts, in an index of their own
+        generator.hadiths = edited[:5]
+        fitted = build_layout_index(generator.hadiths, workers=1, auto_fit=True, max_slides=1,
+                                    index=LayoutIndex(os.path.join(tmp, 'fit1.json')))
+        assert fitted.fingerprint != index.fingerprint
+        for i, hadith in enumerate(generator.hadiths):
+            plan = generator.plan_post(specific_index=i, formats=['feed'], auto_fit=True, max_slides=1,
+                                       image_path='images/nature/alpine_mountain_view.jpg')
+            assert fitted.get(hadith)['slides'] == len(plan['jobs'])
+        assert any(fitted.get(hadith)['slides'] < index.get(hadith)['slides'] for hadith in generator.hadiths)
+        assert generate_hadith_post.layout_index_for(True, 1).path != generate_hadith_post.layout_index_for(False).path
+    print("   ✅ Layout index matches the planned slides and updates incrementally")
+
+
+def test_word_sprites_match_run_drawing_and_evict():
+    generator = HadithPostGenerator(load_data=False)
+    hadith = dict(load_verified_hadiths()[0], primary_source='Sahih al-Bukhari 1')
+    lines = generator.layout_text_lines(hadith['text'], generator.get_font('main_text'), 860)
+    layout = generator.layout_slide(hadith, lines[:5], 1, 2)
+
+    use_word_sprites = generate_hadith_post.USE_WORD_SPRITES
+    try:
+        generate_hadith_post.USE_WORD_SPRITES = False
+        direct = generator.rasterize_layout(layout)
+        generate_hadith_post.USE_WORD_SPRITES = True
+        sprites = generate_hadith_post.WORD_SPRITES
+        hits = sprites.hits
+        assert max_difference(generator.rasterize_layout(layout), direct) == 0
+        # Same words again (any theme): composited from cached masks
+        assert max_difference(generator.rasterize_layout(layout), direct) == 0
+        assert sprites.hits > hits
+    finally:
+        generate_hadith_post.USE_WORD_SPRITES = use_word_sprites
+
+    # Bounded by bytes, least recently used words go first
+    font = generator.get_font('main_text')
+    cache = WordSprites(max_bytes=1)
+    cache.get('Allah', font)
+    cache.get('Messenger', font)
+    stats = cache.stats()
+    assert (stats['sprites'], stats['misses'], stats['evictions']) == (1, 2, 1)
+    assert cache.get('Messenger', font) and cache.stats()['hits'] == 1
+    print("   ✅ Word sprites draw body text pixel-identically, bounded and evicted")
+
+
+def test_prerendered_backlog_posts_and_goes_stale():
+    generator = HadithPostGenerator(load_data=False)
+    generator.hadiths = get_sahih_hadiths()[:4]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        generator.image_usage_file = os.path.join(tmp, 'image_usage.json')
+        backlog = PostBacklog(os.path.join(tmp, 'backlog'))
+        items = generator.prerender_posts(2, workers=1, formats=['feed'], backlog=backlog)
+        assert len(items) == 2 and backlog.load() == items
+        assert not generator.posted_ids  # Selection simulated, nothing staged
+        # Images rotate across the backlog but are only counted once posted
+        assert items[0]['image'] != items[1]['image']
+        assert not generator.image_usage and not os.path.exists(generator.image_usage_file)
+        assert len({item['base_id'] for item in items}) == 2
+        assert all(os.path.exists(path) for item in items for path in item['files']['feed'])
+        # Already full: nothing rendered again
+        assert generator.prerender_posts(2, workers=1, formats=['feed'], backlog=backlog) == items
+
+        # Rendered with other run options: left queued for runs that match
+        assert generator.take_backlog_post(formats=['feed'], image_format='webp', backlog=backlog) is None
+        assert generator.take_backlog_post(formats=['feed'], auto_fit=True, max_slides=3, backlog=backlog) is None
+        assert generator.take_backlog_post(formats=['feed'], in_memory=True, backlog=backlog) is None
+        assert not generator.posted_ids and backlog.load() == items
+
+        # Posted in backlog order and staged like generate_post()
+        item, files, index, hadith = generator.take_backlog_post(formats=['feed'], backlog=backlog)
+        assert item == items[0] and files == item['files']['feed'] and generator.exports['feed'] == files
+        assert hadith['base_id'] in generator.posted_ids and generator.hadiths[index] is hadith
+        with open(generator.image_usage_file) as f:
+            assert json.load(f) == {item['image']: 1}
+        backlog.remove(item)
+        assert backlog.load() == items[1:] and not os.path.exists(files[0])
+
+        # Another theme renders live but leaves the backlog queued
+        other = HadithPostGenerator('sage_green', load_data=False)
+        other.hadiths = generator.hadiths
+        assert other.take_backlog_post(formats=['feed'], backlog=backlog) is None
+        assert backlog.load() == items[1:]
+
+        # An edited hadith is dropped with its slides
+        generator.hadiths = [dict(hadith, text=hadith['text'] + ' (edited)') for hadith in generator.hadiths]
+        assert generator.take_backlog_post(formats=['feed'], backlog=backlog) is None
+        assert backlog.load() == [] and not os.path.exists(items[1]['files']['feed'][0])
+    print("   ✅ Pre-rendered backlog posts in order and drops stale items")
+
+
+def test_theme_jobs_share_one_layout_and_fill_contact_sheet():
+    generator = HadithPostGenerator(load_data=False)
+    generator.hadiths = [dict(hadith, primary_source='Sahih al-Bukhari 1') for hadith in load_verified_hadiths()[:1]]
+    image_path = 'images/nature/alpine_mountain_view.jpg'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plan = generator.plan_post(tmp, specific_index=0, formats=['feed'], image_path=image_path)
+        theme_names = list(THEMES)[:3]
+        rows = []
+        for theme_name in theme_names:
+            jobs = [make_theme_job(job, theme_name) for job in plan['jobs']]
+            assert all(job['filename'].endswith(f"_{theme_name}_slide{job['slide_num']}.png") for job in jobs)
+            # Same slides as planning with the theme's own generator
+            themed = HadithPostGenerator(theme_name, load_data=False)
+            themed.hadiths = generator.hadiths
+            own_plan = themed.plan_post(tmp, specific_index=0, formats=['feed'], image_path=image_path)
+            assert [job['layout'] for job in own_plan['jobs']] == [job['layout'] for job in jobs]
+            filenames = render_slide_jobs(jobs, use_cache=False)
+            with Image.open(filenames[0]) as img:
+                assert max_difference(img, themed.rasterize_layout(own_plan['jobs'][0]['layout'])) == 0
+            rows.append(filenames[0])
+
+        sheet = build_contact_sheet([rows, rows], ['#0', '#0 again'], theme_names, thumb_width=100)
+        thumb_height = round(100 * plan['jobs'][0]['layout']['height'] / plan['jobs'][0]['layout']['width'])
+        assert sheet.width == 12 + 3 * (100 + 12)
+        assert sheet.height == 40 + 2 * (30 + thumb_height + 12)
+    print("   ✅ Theme samples rasterize one shared layout; contact sheet has a row per sample")
+
+
+def test_render_daemon_serves_paths_and_bytes():
+    with tempfile.TemporaryDirectory() as tmp:
+        daemon = RenderDaemon(os.path.join(tmp, 'render.sock'), max_jobs=1, max_queue=0, use_cache=False)
+        thread = threading.Thread(target=daemon.serve)
+        thread.start()
+        try:
+            assert send_request({'cmd': 'ping'}, daemon.socket_path)['ok']
+            # The slot renders with the generators built while warming
+            warmed = dict(daemon._slots.queue[0])
+            assert set(warmed) == set(THEMES)
+            response = send_request({'hadith': 0, 'theme': 'sage_green', 'preview': True, 'output': tmp},
+                                    daemon.socket_path)
+            assert response['ok'] and response['index'] == 0
+            files = response['files']['feed']
+            assert files[0].endswith('_sage_green_slide1_preview.jpg') and all(map(os.path.exists, files))
+
+            # Bytes: same slides, nothing written
+            response = send_request({'hadith': response['hadith'], 'formats': ['feed', 'story'], 'preview': True,
+                                     'bytes': True}, daemon.socket_path)
+            assert len(response['data']['feed']) == len(files) and response['data']['story']
+            img = Image.open(io.BytesIO(base64.b64decode(response['data']['feed'][0])))
+            assert img.format == 'JPEG' and img.width == round(1080 * PREVIEW_SCALE)
+
+            assert send_request({'hadith': 0, 'theme': 'nope'}, daemon.socket_path)['error'] == "unknown theme 'nope'"
+            assert daemon.stats()['renders'] == 2
+            assert daemon._slots.queue[0] == warmed
+        finally:
+            send_request({'cmd': 'stop'}, daemon.socket_path)
+            thread.join(10)
+        assert not thread.is_alive() and not os.path.exists(daemon.socket_path)
+    print("   ✅ Render daemon renders paths and bytes from one warm process")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print(" " * 27 + "RENDER PIPELINE TEST")
+    print("=" * 80 + "\n")
+
+    tests = [
+        test_gradient_matches_legacy,
+        test_gradient_multi_stop,
+        test_fade_mask_matches_legacy,
+        test_overlay_cache_roundtrip_and_invalidation,
+        test_large_sources_decode_at_reduced_scale,
+        test_wrap_matches_legacy_on_corpus,
+        test_paginate_balances_and_prefers_sentence_ends,
+        test_paginate_corpus_fits_and_keeps_text,
+        test_highlight_tokenizer_matches_legacy,
+        test_run_wrap_uses_true_styled_widths,
+        test_run_width_matches_drawn_pixels,
+        test_measurer_caches_are_thread_safe,
+        test_display_list_is_theme_independent_and_serializable,
+        test_export_formats_share_wrapped_lines,
+        test_parallel_render_matches_serial,
+        test_in_memory_render_matches_disk_render,
+        test_encode_image_formats_and_byte_budget,
+        test_text_sprites_match_direct_drawing_and_are_reused,
+        test_single_pass_shadow_composites_real_alpha,
+        test_render_cache_hits_and_evicts,
+        test_preview_keeps_pagination_at_reduced_scale,
+        test_auto_fit_reaches_target_slide_count,
+        test_layout_index_matches_plan_and_updates_incrementally,
+        test_word_sprites_match_run_drawing_and_evict,
+        test_prerendered_backlog_posts_and_goes_stale,
+        test_theme_jobs_share_one_layout_and_fill_contact_sheet,
+        test_render_daemon_serves_paths_and_bytes,
+    ]
+
+    failed = 0
+    for test in tests:
+        print(f"{test.__name__}:")
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"   ❌ FAILED {e}")
+        print()
+
+    if failed:
+        print(f"❌ {failed} test(s) failed")
+        sys.exit(1)
+    print("✅ ALL RENDER PIPELINE TESTS PASSED")
@@ -0,0 +1,493 @@
+"""
+Text Layout Helpers for the Hadith Post Generator
+Measurement and line wrapping shared by the single-slide and carousel renderers
+
+✅ Word widths and space advance cached per (font, size)
+✅ Linear-time wrapping: lines are built by summing cached advances,
+   exact (kerning-correct) measurement only near line boundaries
+✅ Measured line widths returned with the lines (no re-measuring for centering)
+✅ Carousel pagination by dynamic programming over the wrapped lines
+   (fewest slides, then even slide heights, breaking at sentence ends where possible)
+✅ Highlight terms, (ﷺ) and ﷺ compiled into one regex; each hadith is tokenized
+   once into styled runs that the wrapper and the drawer both consume
+✅ Styled runs measured in the font each style is drawn with (bold highlights,
+   symbol font), so lines break and align by their true rendered width
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# Max cached text widths per measurer before the oldest are dropped
+MEASURE_CACHE_SIZE = 4096
+
+# Max measurers kept (one per font/size combination)
+MEASURER_CACHE_SIZE = 32
+
+# Pagination cost of a slide break, in squared lines of imbalance it may outweigh
+CLAUSE_BREAK_PENALTY = 2.0  # Line ends with , ; or :
+MID_SENTENCE_BREAK_PENALTY = 4.0  # Line ends mid-sentence
+
+_SENTENCE_END = re.compile(r'[.!?\u0964]["\'\u201d\u2019)\]]*$')
+_CLAUSE_END = re.compile(r'[,;:]["\'\u201d\u2019)\]]*$')
+
+_WORD = re.compile(r'\S+')
+
+ARABIC_SYMBOL = 'ﷺ'
+
+# Styles of the runs produced by HighlightTokenizer
+REGULAR = 'regular'  # Main font, text color
+ACCENT = 'accent'  # Bold main font, accent color (highlighted phrases and words)
+SYMBOL = 'symbol'  # ﷺ in the symbol font
+BRACKETED_SYMBOL = 'bracketed_symbol'  # (ﷺ): bold accent brackets around the symbol
+
+# Extra horizontal space drawn after ﷺ and (ﷺ)
+SYMBOL_SPACING = 2
+
+# Characters allowed before/after a highlighted word (trailing 's' keeps "Allah's" highlighted)
+WORD_BOUNDARY_BEFORE = ' \n\t.,;:!?\'"'
+WORD_BOUNDARY_AFTER = WORD_BOUNDARY_BEFORE + 's'
+
+
+class TextMeasurer:
+    """
+    Width measurement for one font with cached word advances
+
+    Advances (font.getlength) are summed to estimate a line's width. The estimate
+    and the exact bbox width differ only by side bearings and kerning, which stay
+    well below `slack`; lines are measured exactly only when the estimate falls
+    within that band of the limit, so wrapping matches full re-measurement.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.space_advance = font.getlength(' ')
+        self.slack = max(4, getattr(font, 'size', 10) * 0.5)
+        self._advances = {}
+        self._widths = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_measurements = 0
+
+    def advance(self, word):
+        """Cached horizontal advance of a single word"""
+        advance = self._advances.get(word)
+        if advance is None:
+            advance = self.font.getlength(word)
+            if len(self._advances) >= MEASURE_CACHE_SIZE:
+                self._advances.clear()
+            self._advances[word] = advance
+        return advance
+
+    def text_width(self, text):
+        """Exact rendered width (bbox) of text, cached by string"""
+        with self._lock:
+            width = self._widths.get(text)
+            if width is not None:
+                self._widths.move_to_end(text)
+                return width
+
+        bbox = self.font.getbbox(text)
+        width = bbox[2] - bbox[0]
+        with self._lock:
+            self.exact_measurements += 1
+            self._widths[text] = width
+            if len(self._widths) > MEASURE_CACHE_SIZE:
+                self._widths.popitem(last=False)
+        return width
+
+    def wrap(self, text, max_width, measure=True):
+        """
+        Wrap text to fit within max_width
+
+        Args:
+            text: Text to wrap (newlines start new paragraphs)
+            max_width: Maximum rendered line width in pixels
+            measure: Also return each line's exact width
+
+        Returns:
+            List of (line, width) tuples (width is None when measure=False)
+        """
+        lines = [
+            ' '.join(text[start:end] for start, end in spans)
+            for spans in self._wrap_spans(text, max_width)
+        ]
+        if not measure:
+            return [(line, None) for line in lines]
+        return [(line, self.text_width(line)) for line in lines]
+
+    def _wrap_spans(self, text, max_width):
+        """Greedy line breaking, returns each line as a list of (start, end) word spans"""
+        lines = []
+        current_line = []
+        estimate = 0.0
+        previous_end = 0
+
+        for match in _WORD.finditer(text):
+            word = match.group()
+            word_advance = self.advance(word)
+
+            # Newlines start new paragraphs
+            if current_line and '\n' in text[previous_end:match.start()]:
+                lines.append(current_line)
+                current_line = []
+            previous_end = match.end()
+
+            if not current_line:
+                # First word always starts the line (even if too wide)
+                current_line.append(match.span())
+                estimate = word_advance
+                continue
+
+            candidate = estimate + self.space_advance + word_advance
+            if candidate <= max_width - self.slack:
+                fits = True
+            elif candidate > max_width + self.slack:
+                fits = False
+            else:
+                # Close to the boundary: verify with the real (kerned) width
+                line_text = ' '.join(text[start:end] for start, end in current_line)
+                fits = self.text_width(line_text + ' ' + word) <= max_width
+
+            if fits:
+                current_line.append(match.span())
+                estimate = candidate
+            else:
+                lines.append(current_line)
+                current_line = [match.span()]
+                estimate = word_advance
+
+        if current_line:
+            lines.append(current_line)
+        return lines
+
+
+_MEASURERS = OrderedDict()
+_MEASURERS_LOCK = threading.Lock()  # render daemon threads share the registries
+
+
+def get_measurer(font):
+    """Shared TextMeasurer for a font (keyed by font file and size)"""
+    path = getattr(font, 'path', None)
+    key = (path, font.size, getattr(font, 'index', 0)) if path else ('default', id(font))
+
+    with _MEASURERS_LOCK:
+        measurer = _MEASURERS.get(key)
+        if measurer is None:
+            measurer = TextMeasurer(font)
+            _MEASURERS[key] = measurer
+            while len(_MEASURERS) > MEASURER_CACHE_SIZE:
+                _MEASURERS.popitem(last=False)
+        else:
+            _MEASURERS.move_to_end(key)
+    return measurer
+
+
+class RunMeasurer:
+    """
+    Widths of styled runs (see HighlightTokenizer) as draw_text_runs lays them out
+
+    Regular runs use the main font, accent runs the bold font, symbols the symbol
+    font plus SYMBOL_SPACING. Widths come from the per-font TextMeasurer caches, so
+    each (run text, style, size) is measured once.
+    """
+
+    def __init__(self, main_font, bold_font, symbol_font):
+        self.main = get_measurer(main_font)
+        self.bold = get_measurer(bold_font)
+        self.symbol = get_measurer(symbol_font)
+        self.slack = max(self.main.slack, self.bold.slack)
+
+    def run_width(self, text, style):
+        """Exact horizontal advance of one run"""
+        if style == SYMBOL:
+            return self.symbol.text_width(ARABIC_SYMBOL) + SYMBOL_SPACING
+        if style == BRACKETED_SYMBOL:
+            return (self.bold.text_width('(') + self.symbol.text_width(ARABIC_SYMBOL)
+                    + self.bold.text_width(')') + SYMBOL_SPACING)
+        if style == ACCENT:
+            return self.bold.text_width(text)
+        return self.main.text_width(text)
+
+    def line_width(self, runs):
+        """Exact width of a line of styled runs"""
+        return sum(self.run_width(text, style) for text, style in runs)
+
+    def advance(self, text, style):
+        """Cheap width estimate for a word or word piece"""
+        if style == ACCENT:
+            return self.bold.advance(text)
+        if style == REGULAR:
+            return self.main.advance(text)
+        return self.run_width(text, style)
+
+    def wrap(self, runs, max_width):
+        """
+        Wrap styled runs to fit within max_width by their true rendered width
+
+        Same scheme as TextMeasurer.wrap: widths are estimated from cached advances and
+        measured exactly only near the limit. A space between two words keeps the style
+        of the whitespace it replaces, so a highlighted phrase stays one run while it
+        is on one line.
+
+        Returns:
+            List of (line, width) tuples, each line a list of (text, style) runs
+        """
+        text = ''.join(run_text for run_text, _ in runs)
+        owners = []  # Index of the run each character came from
+        run_starts = []
+        for i, (run_text, _) in enumerate(runs):
+            run_starts.append(len(owners))
+            owners.extend([i] * len(run_text))
+
+        lines = []
+        current_line = []  # (piece, run index) pairs
+        estimate = 0.0
+        previous_end = 0
+
+        for match in _WORD.finditer(text):
+            start, end = match.span()
+            word = []
+            while start < end:
+                owner = owners[start]
+                piece_end = min(end, run_starts[owner] + len(runs[owner][0]))
+                word.append((text[start:piece_end], owner))
+                start = piece_end
+            word_advance = sum(self.advance(piece, runs[owner][1]) for piece, owner in word)
+
+            space = (' ', owners[previous_end]) if current_line else None
+            gap = text[previous_end:match.start()]
+            previous_end = end
+
+            # Newlines start new paragraphs
+            if current_line and '\n' in gap:
+                lines.append(current_line)
+                current_line = []
+
+            if not current_line:
+                # First word always starts the line (even if too wide)
+                current_line = word
+                estimate = word_advance
+                continue
+
+            candidate = estimate + self.advance(' ', runs[space[1]][1]) + word_advance
+            if candidate <= max_width - self.slack:
+                fits = True
+            elif candidate > max_width + self.slack:
+                fits = False
+            else:
+                # Close to the boundary: verify with the real (kerned, styled) width
+                fits = self.line_width(self._merge(current_line + [space] + word, runs)) <= max_width
+
+            if fits:
+                current_line = current_line + [space] + word
+                estimate = candidate
+            else:
+                lines.append(current_line)
+                current_line = word
+                estimate = word_advance
+
+        if current_line:
+            lines.append(current_line)
+
+        styled_lines = [self._merge(line, runs) for line in lines]
+        return [(line, self.line_width(line)) for line in styled_lines]
+
+    @staticmethod
+    def _merge(pieces, runs):
+        """Join consecutive pieces of the same source run into (text, style) runs"""
+        merged = []
+        last_owner = None
+        for piece, owner in pieces:
+            if owner == last_owner:
+                merged[-1] = (merged[-1][0] + piece, merged[-1][1])
+            else:
+                merged.append((piece, runs[owner][1]))
+            last_owner = owner
+        return merged
+
+
+class ScaledRunMeasurer(RunMeasurer):
+    """
+    RunMeasurer estimating widths at another font size from an existing measurer
+
+    Glyph advances scale almost linearly with the font size, so scaling the cached
+    word advances of `measurer` predicts line breaks at the new size without
+    measuring anything. Estimates only (no exact check near the limit): used to
+    probe sizes, the chosen size is then wrapped exactly.
+    """
+
+    def __init__(self, measurer, scale):
+        self.base = measurer
+        self.scale = scale
+        self.slack = 0
+
+    def run_width(self, text, style):
+        if style not in (REGULAR, ACCENT):
+            return self.base.run_width(text, style) * self.scale
+        measurer = self.base.bold if style == ACCENT else self.base.main
+        words = text.split(' ')
+        width = sum(measurer.advance(word) for word in words if word)
+        return (width + measurer.space_advance * (len(words) - 1)) * self.scale
+
+    def advance(self, text, style):
+        return self.base.advance(text, style) * self.scale
+
+
+_RUN_MEASURERS = {}
+
+
+def get_run_measurer(main_font, bold_font, symbol_font):
+    """Shared RunMeasurer for a (main, bold, symbol) font combination"""
+    key = tuple(
+        (getattr(font, 'path', None) or id(font), font.size)
+        for font in (main_font, bold_font, symbol_font)
+    )
+    with _MEASURERS_LOCK:
+        measurer = _RUN_MEASURERS.get(key)
+    if measurer is None:
+        measurer = RunMeasurer(main_font, bold_font, symbol_font)
+        with _MEASURERS_LOCK:
+            if len(_RUN_MEASURERS) >= MEASURER_CACHE_SIZE:
+                _RUN_MEASURERS.clear()
+            _RUN_MEASURERS[key] = measurer
+    return measurer
+
+
+class HighlightTokenizer:
+    """
+    Splits text into styled runs (REGULAR, ACCENT, SYMBOL, BRACKETED_SYMBOL)
+
+    All highlight terms are compiled into one regex alternation. A search returns the
+    leftmost match and, at equal positions, the first alternative: phrases (config
+    order), then (ﷺ), then ﷺ, then whole words (config order) - the precedence of the
+    original per-term str.find scan. Like that scan, the search restarts after each
+    match, so a word right after a highlight counts as starting at a word boundary.
+    """
+
+    def __init__(self, terms=(), highlight=True):
+        phrases = [term for term in terms if ' ' in term] if highlight else []
+        words = [term for term in terms if ' ' not in term] if highlight else []
+
+        alternatives = []
+        if phrases:
+            alternatives.append('(?P<phrase>' + '|'.join(map(re.escape, phrases)) + ')')
+        if highlight:
+            alternatives.append('(?P<bracketed>' + re.escape(f'({ARABIC_SYMBOL})') + ')')
+        alternatives.append('(?P<symbol>' + ARABIC_SYMBOL + ')')
+        if words:
+            alternatives.append(
+                f'(?P<word>(?<![^{re.escape(WORD_BOUNDARY_BEFORE)}])'
+                f'(?:{"|".join(map(re.escape, words))})'
+                f'(?![^{re.escape(WORD_BOUNDARY_AFTER)}]))'
+            )
+        self.pattern = re.compile('|'.join(alternatives))
+
+    def tokenize(self, text):
+        """Styled runs covering text, as a list of (text, style) tuples"""
+        runs = []
+        remaining = text
+        while remaining:
+            match = self.pattern.search(remaining)
+            if match is None:
+                runs.append((remaining, REGULAR))
+                break
+            if match.start():
+                runs.append((remaining[:match.start()], REGULAR))
+            if match.lastgroup == 'symbol':
+                runs.append((match.group(), SYMBOL))
+            elif match.lastgroup == 'bracketed':
+                runs.append((match.group(), BRACKETED_SYMBOL))
+            else:
+                runs.append((match.group(), ACCENT))
+            remaining = remaining[match.end():]
+        return runs
+
+
+@lru_cache(maxsize=8)
+def get_tokenizer(terms=(), highlight=True):
+    """Shared HighlightTokenizer (the regex is compiled once per term list)"""
+    return HighlightTokenizer(tuple(terms), highlight)
+
+
+def line_text(line):
+    """Plain text of a line given as a string or a list of styled runs"""
+    if isinstance(line, str):
+        return line
+    return ''.join(run_text for run_text, _ in line)
+
+
+def append_text(line, text):
+    """Styled line with regular text appended (e.g. "..." on a continued slide)"""
+    if line and line[-1][1] == REGULAR:
+        return line[:-1] + [(line[-1][0] + text, REGULAR)]
+    return line + [(text, REGULAR)]
+
+
+def break_penalty(line):
+    """Cost of ending a slide after this line (0 at the end of a sentence)"""
+    line = line_text(line).rstrip()
+    if _SENTENCE_END.search(line):
+        return 0.0
+    if _CLAUSE_END.search(line):
+        return CLAUSE_BREAK_PENALTY
+    return MID_SENTENCE_BREAK_PENALTY
+
+
+def paginate_lines(lines, line_height, max_height):
+    """
+    Split wrapped lines into slides
+
+    The slide count is the minimum that fits. Among all placements of that many
+    breaks, dynamic programming picks the one with the smallest spread of slide
+    heights (sum of squared deviations from the mean line count) plus
+    break_penalty() for every break that doesn't end a sentence.
+
+    Args:
+        lines: [(line, width)] as returned by TextMeasurer.wrap or RunMeasurer.wrap
+        line_height: Height of one line in pixels
+        max_height: Text height one slide may fill
+
+    Returns:
+        List of pages, each {'lines': [(line, width)], 'height': px}
+    """
+    capacity = max(1, int(max_height // line_height))
+    total = len(lines)
+    page_count = max(1, math.ceil(total / capacity))
+
+    breaks = [0, total]
+    if page_count > 1:
+        target = total / page_count
+        penalties = [break_penalty(line) for line, _ in lines]
+        inf = float('inf')
+
+        # cost[j][i]: best cost of the first i lines on j slides; choice[j][i]: start of slide j
+        cost = [[inf] * (total + 1) for _ in range(page_count + 1)]
+        choice = [[0] * (total + 1) for _ in range(page_count + 1)]
+        cost[0][0] = 0.0
+        for j in range(1, page_count + 1):
+            # Leave at least one line for each remaining slide
+            for i in range(j, total - (page_count - j) + 1):
+                end_penalty = 0.0 if i == total else penalties[i - 1]
+                for start in range(max(j - 1, i - capacity), i):
+                    previous = cost[j - 1][start]
+                    if previous == inf:
+                        continue
+                    candidate = previous + (i - start - target) ** 2 + end_penalty
+                    if candidate < cost[j][i]:
+                        cost[j][i] = candidate
+                        choice[j][i] = start
+
+        breaks = [total]
+        for j in range(page_count, 0, -1):
+            breaks.append(choice[j][breaks[-1]])
+        breaks.reverse()
+
+    pages = []
+    for start, end in zip(breaks, breaks[1:]):
+        pages.append({
+            'lines': lines[start:end],
+            'height': (end - start) * line_height,
+        })
+    return pages